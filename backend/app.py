@@ -1,4 +1,4 @@
-from flask import Flask, jsonify
+from flask import Flask, Request, jsonify, current_app
 from flask_socketio import SocketIO
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
@@ -6,20 +6,35 @@ from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 import os
 import logging
+import tempfile
 from logging.handlers import RotatingFileHandler
+from datetime import datetime, timedelta
 
 from config import get_config
-from models import db
+from models import db, Blob, Execution, Message
 from routes.auth import auth_bp
 from routes.room import room_bp
 from routes.execution import execution_bp
 from routes.chat import chat_bp
 from routes.users import users_bp
 from sockets import create_socket_handlers
+from services.local_executor import get_local_executor
+from services.message_search import MessageSearch
+from services.message_archive import MessageArchive
+from services.message_service import MessageService
+from services.room_stats import RoomStatsService
+from services.trending import get_trending_tracker
+
+class SpooledRequest(Request):
+    """Request whose uploaded files stay in memory only up to UPLOAD_SPOOL_THRESHOLD"""
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=current_app.config['UPLOAD_SPOOL_THRESHOLD'])
 
 def create_app(config_name=None):
     """Application factory"""
     app = Flask(__name__)
+    app.request_class = SpooledRequest
     
     # Load configuration
     config_class = get_config(config_name)
@@ -72,6 +87,10 @@ def create_app(config_name=None):
         db.session.rollback()
         return jsonify({'error': 'Internal server error'}), 500
     
+    @app.errorhandler(413)
+    def request_too_large(error):
+        return jsonify({'error': 'Request too large'}), 413
+    
     @app.errorhandler(429)
     def ratelimit_handler(e):
         return jsonify({'error': 'Rate limit exceeded'}), 429
@@ -123,10 +142,55 @@ def create_app(config_name=None):
             ]
         })
     
+    @app.cli.command('gc-blobs')
+    def gc_blobs():
+        """Delete stored sources and outputs no execution references any more"""
+        print(f"Removed {Blob.collect_garbage()} unreferenced blobs")
+    
+    @app.cli.command('migrate-execution-blobs')
+    def migrate_execution_blobs():
+        """One-off: move execution texts stored before blob storage into the blobs table"""
+        print(f"Moved {Execution.migrate_text_columns()} executions into blobs")
+    
+    @app.cli.command('archive-messages')
+    def archive_messages():
+        """Move old chat messages, and those of inactive rooms, into the compressed archive"""
+        cutoff = datetime.utcnow() - timedelta(days=app.config['CHAT_ARCHIVE_AFTER_DAYS'])
+        segments, archived = MessageArchive.archive(cutoff, app.config['CHAT_ARCHIVE_SEGMENT_SIZE'])
+        print(f"Archived {archived} messages into {segments} segments")
+    
+    @app.cli.command('refresh-message-authors')
+    def refresh_message_authors():
+        """Rebuild the author name and picture stored on every chat message"""
+        print(f"Updated {Message.refresh_authors()} messages")
+    
+    @app.cli.command('rebuild-message-threads')
+    def rebuild_message_threads():
+        """Recompute the thread root and reply count of every chat message"""
+        print(f"Updated {MessageService.rebuild_threads()} replies")
+    
+    @app.cli.command('build-message-search-index')
+    def build_message_search_index():
+        """Build the chat full-text index (FTS5 on SQLite, FULLTEXT on MySQL); rerun after a SQLite VACUUM"""
+        MessageSearch.build_index()
+        print('Message search index is ready')
+    
+    @app.cli.command('reconcile-room-stats')
+    def reconcile_room_stats():
+        """Recount every room's stats counters and participant count, fixing any drift"""
+        print(f"Corrected {RoomStatsService.reconcile()} rooms")
+    
     # Database initialization
     with app.app_context():
         """Create database tables on app startup"""
         db.create_all()
+        # Replay recent activity now rather than on the first chat message
+        get_trending_tracker()
+    
+    # Pre-fork interpreter workers so the first local run is already warm
+    if app.config['EXECUTION_BACKEND'] == 'local':
+        with app.app_context():
+            get_local_executor()
     
     # Logging setup
     if not app.debug and not app.testing:
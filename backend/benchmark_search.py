@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark chat message search: ILIKE scan vs the full-text index
+
+Fills one room with generated messages in a throwaway SQLite database
+(or the database in SQLALCHEMY_DATABASE_URI with --use-configured-db)
+and times both search paths for a few queries.
+
+    python benchmark_search.py --messages 1000000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+backend_dir = Path(__file__).parent
+sys.path.insert(0, str(backend_dir))
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--messages', type=int, default=1000000, help='messages to generate in the room')
+parser.add_argument('--repeat', type=int, default=5, help='timed runs per query')
+parser.add_argument('--use-configured-db', action='store_true', help='benchmark SQLALCHEMY_DATABASE_URI instead of a temp SQLite file')
+args = parser.parse_args()
+
+if not args.use_configured_db:
+    database = os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{database}'
+
+from app import app
+from models import db, Message, Room, User
+from services.message_search import MessageSearch
+
+WORDS = [f'word{i}' for i in range(5000)] + ['deadlock', 'segfault', 'recursion', 'binary', 'search']
+QUERIES = ['deadlock', 'binary search', '"binary search"', 'word42 word43', 'word4999', 'word1']
+BATCH_SIZE = 10000
+
+def make_content(rng):
+    # Zipf-like: a few very common words, a long tail of rare ones
+    return ' '.join(WORDS[min(int(rng.paretovariate(1.1)) - 1, len(WORDS) - 1)] if rng.random() < 0.9
+                    else rng.choice(WORDS) for _ in range(rng.randint(4, 24)))
+
+def populate():
+    rng = random.Random(42)
+    user = User(auth0_id=f'benchmark|{uuid.uuid4()}', email=f'{uuid.uuid4()}@benchmark.local', name='Benchmark')
+    db.session.add(user)
+    db.session.flush()
+    room = Room(name='Search benchmark', created_by=user.id, language='python', current_content='')
+    db.session.add(room)
+    db.session.commit()
+
+    started = time.perf_counter()
+    created_at = datetime.utcnow() - timedelta(seconds=args.messages)
+    for offset in range(0, args.messages, BATCH_SIZE):
+        rows = [{
+            'id': str(uuid.uuid4()),
+            'room_id': room.id,
+            'user_id': user.id,
+            'content': make_content(rng),
+            'message_type': 'text',
+            'is_edited': False,
+            'created_at': created_at + timedelta(seconds=offset + index)
+        } for index in range(min(BATCH_SIZE, args.messages - offset))]
+        db.session.execute(Message.__table__.insert(), rows)
+        db.session.commit()
+    print(f"Inserted {args.messages} messages in {time.perf_counter() - started:.1f}s")
+    return room.id
+
+def ilike_search(room_id, query):
+    """The previous implementation of search_messages"""
+    page = Message.query.filter(
+        Message.room_id == room_id,
+        Message.content.ilike(f'%{query}%')
+    ).order_by(Message.created_at.desc()).paginate(page=1, per_page=20, error_out=False)
+    return page.total
+
+def fts_search(room_id, query):
+    return MessageSearch.search(room_id, query, 1, 20)[1]
+
+def timed(fn, room_id, query):
+    runs = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        total = fn(room_id, query)
+        runs.append(time.perf_counter() - started)
+        db.session.rollback()
+    return statistics.median(runs) * 1000, total
+
+with app.app_context():
+    print(f"Database: {db.engine.url.render_as_string(hide_password=True)}")
+    room_id = populate()
+
+    started = time.perf_counter()
+    MessageSearch.build_index()
+    print(f"Built the search index in {time.perf_counter() - started:.1f}s")
+
+    print(f"{'query':<20} {'ilike ms':>10} {'hits':>8} {'fts ms':>10} {'hits':>8} {'speedup':>8}")
+    for query in QUERIES:
+        ilike_ms, ilike_total = timed(ilike_search, room_id, query)
+        fts_ms, fts_total = timed(fts_search, room_id, query)
+        print(f"{query:<20} {ilike_ms:>10.1f} {ilike_total:>8} {fts_ms:>10.1f} {fts_total:>8} {ilike_ms / fts_ms:>7.1f}x")
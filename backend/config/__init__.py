@@ -1,4 +1,5 @@
 import os
+import tempfile
 from datetime import timedelta
 
 class Config:
@@ -54,6 +55,36 @@ class Config:
     JUDGE0_API_KEY = os.environ.get('JUDGE0_API_KEY')
     JUDGE0_API_HOST = os.environ.get('JUDGE0_API_HOST') or 'judge0-ce.p.rapidapi.com'
     
+    # Code Execution Configuration
+    EXECUTION_BACKEND = os.environ.get('EXECUTION_BACKEND') or 'judge0'  # judge0 or local
+    LOCAL_EXECUTOR_TIMEOUT = 10  # wall-clock seconds per run
+    LOCAL_EXECUTOR_CPU_LIMIT = 5  # CPU seconds per run
+    LOCAL_EXECUTOR_MEMORY_LIMIT = 512 * 1024 * 1024  # 512MB data segment per run
+    LOCAL_EXECUTOR_MAX_OUTPUT = 1024 * 1024  # 1MB of stdout/stderr kept per run
+    WARM_POOL_SIZE = int(os.environ.get('WARM_POOL_SIZE') or 2)  # idle workers per interpreted language
+    LOCAL_COMPILE_TIMEOUT = 30  # wall-clock seconds per compilation
+    LOCAL_COMPILE_MEMORY_LIMIT = 2048 * 1024 * 1024  # 2GB data segment per compilation
+    COMPILE_CACHE_DIR = os.environ.get('COMPILE_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'codechill-compile-cache')
+    COMPILE_CACHE_MAX_BYTES = 512 * 1024 * 1024  # 512MB of cached binaries
+    EXECUTION_STREAM_MAX_BYTES = 256 * 1024  # 256KB of output streamed live per run
+    EXECUTION_STREAM_INTERVAL = 0.1  # seconds between execution_output events
+    EXECUTION_WORKERS = int(os.environ.get('EXECUTION_WORKERS') or 4)  # concurrent local runs
+    EXECUTION_ROOM_CONCURRENCY = 2  # concurrent local runs per room
+    EXECUTION_MAX_QUEUED_PER_USER = 5
+    EXECUTION_QUEUE_WAIT_SLO = 5  # seconds; longer estimated waits are shed with 429
+    JUDGE_MAX_CASES = 50  # test cases per suite
+    JUDGE_CASE_PARALLELISM = 4  # test cases run concurrently per judge run, each taking one of EXECUTION_WORKERS
+    JUDGE0_POLL_INTERVAL = 0.5  # seconds between Judge0 batch status checks
+    JUDGE0_POLL_TIMEOUT = 60  # seconds before a Judge0 batch is abandoned
+    AUTO_RUN_DEBOUNCE = 1.0  # seconds of editing pause before an auto-run starts
+    BLOB_COMPRESSION_THRESHOLD = 1024  # bytes; smaller sources and outputs are stored as-is
+    INTERACTIVE_CPU_LIMIT = 10  # CPU seconds per interactive session
+    INTERACTIVE_IDLE_TIMEOUT = 120  # seconds without input or output before a session is killed
+    INTERACTIVE_MAX_DURATION = 900  # wall-clock seconds per interactive session
+    INTERACTIVE_MAX_SESSIONS = 8  # concurrent interactive sessions per server
+    INTERACTIVE_MAX_SESSIONS_PER_USER = 1
+    INTERACTIVE_MAX_INPUT = 64 * 1024  # bytes per interactive_input event
+    
     # External API Configuration
     GITHUB_API_URL = 'https://api.github.com'
     LEETCODE_API_URL = 'https://leetcode.com/graphql'
@@ -70,6 +101,7 @@ class Config:
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file upload
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or 'uploads'
     ALLOWED_EXTENSIONS = {'txt', 'py', 'js', 'cpp', 'java', 'c', 'cs', 'php', 'rb', 'go', 'rs'}
+    UPLOAD_SPOOL_THRESHOLD = 1024 * 1024  # uploads larger than 1MB are spooled to disk
     
     # Cache Configuration
     CACHE_TYPE = os.environ.get('CACHE_TYPE') or 'simple'
@@ -83,6 +115,26 @@ class Config:
     ROOM_INACTIVITY_TIMEOUT = 3600  # 1 hour in seconds
     MAX_ROOMS_PER_USER = 5
     MAX_MESSAGE_LENGTH = 1000
+    MESSAGE_FLUSH_INTERVAL = 0.005  # seconds chat messages wait to share a group commit
+    MESSAGE_FLUSH_MAX_BATCH = 200  # messages per group commit
+    MESSAGE_ACK_TIMEOUT = 5  # seconds the REST API waits for a message to be stored
+    CLIENT_MSG_ID_TTL = 300  # seconds a client_msg_id is remembered for dropping resent messages
+    MAX_CLIENT_MSG_ID_LENGTH = 64
+    READ_MARKER_FLUSH_INTERVAL = 2  # seconds read markers are coalesced before being written
+    RECENT_MESSAGES_SIZE = 100  # messages kept in memory per active room
+    RECENT_MESSAGES_IDLE_TIMEOUT = 600  # seconds before an unused room's messages are dropped
+    RECENT_MESSAGES_MAX_ROOMS = 1000
+    MESSAGE_AUTHOR_CACHE_SIZE = 10000  # users whose name and picture are kept for new messages
+    MESSAGE_AUTHOR_REFRESH_DELAY = 1  # seconds profile changes are coalesced before old messages are updated
+    MESSAGE_AUTHOR_REFRESH_BATCH = 1000  # messages updated per transaction when a profile changes
+    CHAT_ARCHIVE_AFTER_DAYS = int(os.environ.get('CHAT_ARCHIVE_AFTER_DAYS') or 90)  # older messages move to the archive
+    CHAT_ARCHIVE_SEGMENT_SIZE = 1000  # messages per compressed archive segment
+    EXPORT_YIELD_PER = 500  # rows fetched per round trip when streaming a room export
+    ROOM_SEARCH_MIN_SIMILARITY = 0.5  # share of a query word's trigrams a room must contain to match
+    ROOM_SEARCH_MAX_RANKED = 200  # best room search matches ranked and paged through
+    TRENDING_HALF_LIFE = 6 * 3600  # seconds for a room's trending score to halve
+    TRENDING_WINDOW_HOURS = 24  # hours of activity reported as a trending room's recent_activity
+    TRENDING_REFRESH_INTERVAL = 5  # seconds between re-sorts of the trending ranking
     MAX_CODE_LENGTH = 100000  # 100KB
     
     @staticmethod
@@ -201,6 +253,54 @@ JUDGE0_LANGUAGE_MAP = {
 # Supported programming languages
 SUPPORTED_LANGUAGES = list(JUDGE0_LANGUAGE_MAP.keys())
 
+# Interpreters used by the local executor
+LOCAL_INTERPRETERS = {
+    'python': {'command': ['python3', '-I', '-u'], 'filename': 'main.py'},
+    'javascript': {'command': ['node'], 'filename': 'main.js'},
+    'ruby': {'command': ['ruby'], 'filename': 'main.rb'},
+    'php': {'command': ['php'], 'filename': 'main.php'},
+}
+
+# Compilers used by the local executor; builds are cached by source hash
+LOCAL_COMPILERS = {
+    'c': {
+        'filename': 'main.c',
+        'compile': ['gcc', '-O2', '-o', 'main', 'main.c', '-lm'],
+        'run': ['./main'],
+        'version': ['gcc', '--version'],
+    },
+    'cpp': {
+        'filename': 'main.cpp',
+        'compile': ['g++', '-O2', '-o', 'main', 'main.cpp'],
+        'run': ['./main'],
+        'version': ['g++', '--version'],
+    },
+    'rust': {
+        'filename': 'main.rs',
+        'compile': ['rustc', '-O', '-o', 'main', 'main.rs'],
+        'run': ['./main'],
+        'version': ['rustc', '--version'],
+    },
+    'go': {
+        'filename': 'main.go',
+        'compile': ['go', 'build', '-o', 'main', 'main.go'],
+        'run': ['./main'],
+        'version': ['go', 'version'],
+    },
+    'java': {
+        'filename': 'Main.java',
+        'compile': ['javac', 'Main.java'],
+        'run': ['java', '-cp', '.', 'Main'],
+        'version': ['javac', '-version'],
+    },
+    'kotlin': {
+        'filename': 'main.kt',
+        'compile': ['kotlinc', 'main.kt', '-include-runtime', '-d', 'main.jar'],
+        'run': ['java', '-jar', 'main.jar'],
+        'version': ['kotlinc', '-version'],
+    },
+}
+
 # Default code templates
 DEFAULT_CODE_TEMPLATES = {
     'javascript': '''// Welcome to CodeChill!
@@ -1,13 +1,23 @@
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
-from sqlalchemy.dialects.mysql import JSON
+from sqlalchemy import bindparam, event, inspect, text
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.dialects.mysql import JSON, LONGBLOB
+import hashlib
+import json
 import uuid
+import zlib
 
 db = SQLAlchemy()
 
 def generate_uuid():
     return str(uuid.uuid4())
 
+# Keyset cursors can be taken from messages before they are stored, so keep their microseconds
+PreciseDateTime = db.DateTime().with_variant(mysql.DATETIME(fsp=6), 'mysql')
+
 class User(db.Model):
     __tablename__ = 'users'
     
@@ -22,10 +32,10 @@ class User(db.Model):
     leetcode_username = db.Column(db.String(100))
     codeforces_username = db.Column(db.String(100))
     
-    # Profile Stats (cached from external APIs)
-    github_stats = db.Column(JSON)
-    leetcode_stats = db.Column(JSON)
-    codeforces_stats = db.Column(JSON)
+    # Profile Stats (cached from external APIs); deferred, load with undefer_group('stats')
+    github_stats = db.deferred(db.Column(JSON), group='stats')
+    leetcode_stats = db.deferred(db.Column(JSON), group='stats')
+    codeforces_stats = db.deferred(db.Column(JSON), group='stats')
     
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
@@ -98,13 +108,14 @@ class Room(db.Model):
     password = db.Column(db.String(255))  # Hashed if private
     max_participants = db.Column(db.Integer, default=10, nullable=False)
     language = db.Column(db.String(50), default='javascript', nullable=False)
+    auto_run = db.Column(db.Boolean, default=False, nullable=False)  # Run the document when edits pause
     
     # Room Status
     is_active = db.Column(db.Boolean, default=True, nullable=False)
     current_participants = db.Column(db.Integer, default=0, nullable=False)
     
-    # Code Content
-    current_content = db.Column(db.Text, default='')
+    # Code Content; deferred, load with undefer_group('content') where the document is used
+    current_content = db.deferred(db.Column(db.Text, default=''), group='content')
     content_version = db.Column(db.Integer, default=1, nullable=False)
     
     # Owner
@@ -115,6 +126,9 @@ class Room(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     last_activity = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Sequence number of the room's latest message; unread counts are measured against it
+    message_seq = db.Column(db.BigInteger, default=0, nullable=False)
+    
     # Relationships
     participants = db.relationship('RoomParticipant', back_populates='room', lazy='dynamic', cascade='all, delete-orphan')
     messages = db.relationship('Message', back_populates='room', lazy='dynamic', cascade='all, delete-orphan')
@@ -129,6 +143,7 @@ class Room(db.Model):
             'max_participants': self.max_participants,
             'current_participants': self.current_participants,
             'language': self.language,
+            'auto_run': self.auto_run,
             'is_active': self.is_active,
             'created_by': self.created_by,
             'created_at': self.created_at.isoformat() if self.created_at else None,
@@ -168,6 +183,9 @@ class RoomParticipant(db.Model):
     left_at = db.Column(db.DateTime)
     last_seen = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Room message_seq read up to
+    last_read_seq = db.Column(db.BigInteger, default=0, nullable=False)
+    
     # Unique constraint: one active participation per user per room
     __table_args__ = (
         db.Index('idx_room_user_active', room_id, user_id, is_active),
@@ -196,8 +214,67 @@ class RoomParticipant(db.Model):
     def __repr__(self):
         return f'<RoomParticipant {self.user_id} in {self.room_id}>'
 
+class RoomStats(db.Model):
+    """Running totals of a room, updated in the same flush as the rows they count
+    
+    Messages include archived ones; active participants are counted by
+    rooms.current_participants. `flask reconcile-room-stats` recounts all of them.
+    """
+    __tablename__ = 'room_stats'
+    
+    room_id = db.Column(db.String(36), db.ForeignKey('rooms.id', ondelete='CASCADE'), primary_key=True)
+    participants_ever = db.Column(db.Integer, default=0, nullable=False)
+    executions = db.Column(db.Integer, default=0, nullable=False)
+    successful_executions = db.Column(db.Integer, default=0, nullable=False)  # status 'completed'
+    messages = db.Column(db.Integer, default=0, nullable=False)  # counted by the message write buffer
+    reconciled_at = db.Column(db.DateTime)  # last recount from the underlying rows
+    
+    COUNTERS = ('participants_ever', 'executions', 'successful_executions', 'messages')
+    
+    @staticmethod
+    def increment(connection, room_id, deltas):
+        """Add to a room's counters; rooms without a row yet are left for their first recount"""
+        table = RoomStats.__table__
+        connection.execute(
+            table.update().where(table.c.room_id == room_id)
+            .values({field: table.c[field] + delta for field, delta in deltas.items()})
+        )
+    
+    @staticmethod
+    def store(connection, rows):
+        """Insert or overwrite the counters of several rooms"""
+        table = RoomStats.__table__
+        if connection.dialect.name == 'mysql':
+            statement = mysql.insert(table)
+            statement = statement.on_duplicate_key_update(
+                {field: statement.inserted[field] for field in RoomStats.COUNTERS + ('reconciled_at',)}
+            )
+        elif connection.dialect.name == 'sqlite':
+            statement = sqlite.insert(table)
+            statement = statement.on_conflict_do_update(
+                index_elements=['room_id'],
+                set_={field: statement.excluded[field] for field in RoomStats.COUNTERS + ('reconciled_at',)}
+            )
+        else:
+            connection.execute(table.delete().where(table.c.room_id.in_([row['room_id'] for row in rows])))
+            statement = table.insert()
+        connection.execute(statement, rows)
+    
+    def to_dict(self):
+        return {field: getattr(self, field) for field in RoomStats.COUNTERS}
+    
+    def __repr__(self):
+        return f'<RoomStats {self.room_id}>'
+
 class Message(db.Model):
     __tablename__ = 'messages'
+    __table_args__ = (
+        # Keyset pagination walks a room's history in (created_at, id) order
+        db.Index('idx_messages_room_created_id', 'room_id', 'created_at', 'id'),
+        db.Index('idx_messages_thread', 'thread_root_id', 'created_at'),
+        # Backstop for resent messages the in-memory index no longer remembers
+        db.UniqueConstraint('room_id', 'user_id', 'client_msg_id', name='uq_messages_client_msg_id'),
+    )
     
     id = db.Column(db.String(36), primary_key=True, default=generate_uuid)
     
@@ -212,9 +289,17 @@ class Message(db.Model):
     # Message Features
     is_edited = db.Column(db.Boolean, default=False, nullable=False)
     reply_to = db.Column(db.String(36), db.ForeignKey('messages.id'))  # For threaded replies
+    thread_root_id = db.Column(db.String(36))  # Top-level message of the reply's thread
+    reply_count = db.Column(db.Integer, default=0, nullable=False)  # Replies anywhere in this message's thread
+    client_msg_id = db.Column(db.String(64))  # Sender-chosen id that makes resends idempotent
+    seq = db.Column(db.BigInteger)  # Position in the room, assigned when the message is committed
+    
+    # Author snapshot, so serializing a message never has to load its User
+    author_name = db.Column(db.String(255))
+    author_picture = db.Column(db.String(500))
     
     # Timestamps
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    created_at = db.Column(PreciseDateTime, default=datetime.utcnow, nullable=False, index=True)
     edited_at = db.Column(db.DateTime)
     
     # Relationships
@@ -227,21 +312,242 @@ class Message(db.Model):
             'id': self.id,
             'room_id': self.room_id,
             'user_id': self.user_id,
-            'user_name': self.user.name if self.user else None,
-            'user_picture': self.user.picture if self.user else None,
+            'user_name': self.author_name,
+            'user_picture': self.author_picture,
             'content': self.content,
             'message_type': self.message_type,
             'is_edited': self.is_edited,
             'reply_to': self.reply_to,
+            'thread_root_id': self.thread_root_id,
+            'reply_count': self.reply_count,
+            'client_msg_id': self.client_msg_id,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'edited_at': self.edited_at.isoformat() if self.edited_at else None
         }
     
+    @staticmethod
+    def refresh_authors(user_ids=None, batch_size=1000):
+        """Copy authors' current name and picture onto their messages (every author's by default)
+        
+        Works through the messages in id order, one batch per transaction, so
+        no single statement locks all of an author's messages; returns rows updated.
+        """
+        author = db.select(User).where(User.id == Message.user_id)
+        updated = 0
+        last_id = None
+        while True:
+            query = db.session.query(Message.id).order_by(Message.id)
+            if user_ids is not None:
+                query = query.filter(Message.user_id.in_(user_ids))
+            if last_id:
+                query = query.filter(Message.id > last_id)
+            batch = [message_id for (message_id,) in query.limit(batch_size)]
+            if not batch:
+                return updated
+            last_id = batch[-1]
+            
+            updated += Message.query.filter(Message.id.in_(batch)).update({
+                Message.author_name: author.with_only_columns(User.name).scalar_subquery(),
+                Message.author_picture: author.with_only_columns(User.picture).scalar_subquery()
+            }, synchronize_session=False)
+            db.session.commit()
+    
     def __repr__(self):
         return f'<Message {self.id} in {self.room_id}>'
 
+@event.listens_for(Session, 'before_flush')
+def update_author_snapshots(session, flush_context, instances):
+    """Fill in the author snapshot of new messages; profile changes reach old ones in the background"""
+    for instance in session.new:
+        if isinstance(instance, Message) and instance.author_name is None:
+            author = session.get(User, instance.user_id)
+            if author:
+                instance.author_name = author.name
+                instance.author_picture = author.picture
+
+class MessageArchiveSegment(db.Model):
+    """A compressed, append-only run of archived messages from one room, oldest first"""
+    __tablename__ = 'message_archive_segments'
+    __table_args__ = (
+        db.Index('idx_archive_room_last', 'room_id', 'last_created_at', 'last_id'),
+    )
+    
+    id = db.Column(db.String(36), primary_key=True, default=generate_uuid)
+    room_id = db.Column(db.String(36), db.ForeignKey('rooms.id'), nullable=False)
+    
+    # Key range covered, in (created_at, id) order
+    first_created_at = db.Column(PreciseDateTime, nullable=False)
+    first_id = db.Column(db.String(36), nullable=False)
+    last_created_at = db.Column(PreciseDateTime, nullable=False)
+    last_id = db.Column(db.String(36), nullable=False)
+    
+    message_count = db.Column(db.Integer, nullable=False)
+    data = db.deferred(db.Column(db.LargeBinary().with_variant(LONGBLOB, 'mysql'), nullable=False))  # zlib JSON of Message.to_dict()s
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def messages(self):
+        """The archived messages as serialized by Message.to_dict()"""
+        return json.loads(zlib.decompress(self.data).decode('utf-8'))
+    
+    def __repr__(self):
+        return f'<MessageArchiveSegment {self.id} ({self.message_count} messages in {self.room_id})>'
+
+class Blob(db.Model):
+    """Content-addressed text shared by every row that references its hash"""
+    __tablename__ = 'blobs'
+    
+    hash = db.Column(db.String(64), primary_key=True)  # sha256 of the UTF-8 text
+    data = db.Column(db.LargeBinary().with_variant(LONGBLOB, 'mysql'), nullable=False)
+    compressed = db.Column(db.Boolean, default=False, nullable=False)  # zlib
+    size = db.Column(db.Integer, nullable=False)  # uncompressed bytes
+    ref_count = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    @staticmethod
+    def digest(text):
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def load(digest):
+        blob = db.session.get(Blob, digest)
+        if blob is None:
+            return None
+        data = zlib.decompress(blob.data) if blob.compressed else blob.data
+        return data.decode('utf-8')
+    
+    @staticmethod
+    def preload(instances):
+        """Load the blob texts of several model instances in one query, ahead of reading them"""
+        wanted = {}  # digest -> instances that read it
+        for instance in instances:
+            texts = instance.__dict__.setdefault('_blob_texts', {})
+            for field in type(instance).BLOB_FIELDS:
+                digest = getattr(instance, f'{field}_hash')
+                if digest is not None and digest not in texts:
+                    wanted.setdefault(digest, []).append(texts)
+        if not wanted:
+            return
+        
+        for digest, data, compressed in db.session.query(Blob.hash, Blob.data, Blob.compressed)\
+                .filter(Blob.hash.in_(list(wanted))):
+            text = (zlib.decompress(data) if compressed else data).decode('utf-8')
+            for texts in wanted[digest]:
+                texts[digest] = text
+    
+    @staticmethod
+    def acquire(connection, digest, text):
+        """Add a reference to a blob, storing it first if it is new"""
+        table = Blob.__table__
+        
+        # Common case: the text is already stored and only needs another reference
+        result = connection.execute(
+            table.update().where(table.c.hash == digest).values(ref_count=table.c.ref_count + 1)
+        )
+        if result.rowcount:
+            return
+        
+        data = text.encode('utf-8')
+        row = {'hash': digest, 'data': data, 'compressed': False, 'size': len(data),
+               'ref_count': 1, 'created_at': datetime.utcnow()}
+        if len(data) >= current_app.config['BLOB_COMPRESSION_THRESHOLD']:
+            compressed = zlib.compress(data, 6)
+            if len(compressed) < len(data):
+                row.update(data=compressed, compressed=True)
+        
+        # A concurrent writer may have stored the same text in the meantime
+        if connection.dialect.name == 'mysql':
+            statement = mysql.insert(table).values(**row)\
+                .on_duplicate_key_update(ref_count=table.c.ref_count + 1)
+        elif connection.dialect.name == 'sqlite':
+            statement = sqlite.insert(table).values(**row)\
+                .on_conflict_do_update(index_elements=['hash'], set_={'ref_count': table.c.ref_count + 1})
+        else:
+            statement = table.insert().values(**row)
+        connection.execute(statement)
+    
+    @staticmethod
+    def release(connection, digest):
+        table = Blob.__table__
+        connection.execute(
+            table.update().where(table.c.hash == digest).values(ref_count=table.c.ref_count - 1)
+        )
+    
+    @staticmethod
+    def collect_garbage():
+        """Delete unreferenced blobs; returns how many were removed"""
+        deleted = Blob.query.filter(Blob.ref_count <= 0).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+    
+    def __repr__(self):
+        return f'<Blob {self.hash} ({self.size} bytes)>'
+
+class BlobText:
+    """Text attribute stored in the blob table; the model keeps only `<name>_hash`"""
+    
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.hash_attr = f'{name}_hash'
+    
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        
+        digest = getattr(instance, self.hash_attr)
+        if digest is None:
+            return None
+        
+        # Texts written or read through this instance, keyed by hash
+        texts = instance.__dict__.setdefault('_blob_texts', {})
+        if digest not in texts:
+            texts[digest] = Blob.load(digest)
+        return texts[digest]
+    
+    def __set__(self, instance, value):
+        # Load the old hash first so the flush can release its reference
+        getattr(instance, self.hash_attr)
+        
+        if value is None:
+            setattr(instance, self.hash_attr, None)
+            return
+        
+        digest = Blob.digest(value)
+        instance.__dict__.setdefault('_blob_texts', {})[digest] = value
+        setattr(instance, self.hash_attr, digest)
+
+@event.listens_for(Session, 'before_flush')
+def update_blob_references(session, flush_context, instances):
+    """Keep blob reference counts in step with the hash columns being flushed"""
+    connection = session.connection()
+    
+    for instance in list(session.new) + list(session.dirty):
+        blob_fields = getattr(type(instance), 'BLOB_FIELDS', None)
+        if not blob_fields:
+            continue
+        
+        state = inspect(instance)
+        texts = instance.__dict__.get('_blob_texts', {})
+        for field in blob_fields:
+            history = state.attrs[f'{field}_hash'].history
+            for digest in history.added:
+                if digest is not None:
+                    Blob.acquire(connection, digest, texts[digest])
+            for digest in history.deleted:
+                if digest is not None:
+                    Blob.release(connection, digest)
+    
+    for instance in session.deleted:
+        for field in getattr(type(instance), 'BLOB_FIELDS', None) or []:
+            digest = getattr(instance, f'{field}_hash')
+            if digest is not None:
+                Blob.release(connection, digest)
+
 class Execution(db.Model):
     __tablename__ = 'executions'
+    __table_args__ = (
+        # Exports walk a room's executions in (created_at, id) order
+        db.Index('idx_executions_room_created_id', 'room_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.String(36), primary_key=True, default=generate_uuid)
     
@@ -251,33 +557,89 @@ class Execution(db.Model):
     
     # Execution Details
     language = db.Column(db.String(50), nullable=False)
-    source_code = db.Column(db.Text, nullable=False)
-    input_data = db.Column(db.Text)
+    source_code_hash = db.Column(db.String(64), db.ForeignKey('blobs.hash'), nullable=False)
+    input_data_hash = db.Column(db.String(64), db.ForeignKey('blobs.hash'))
     
     # Judge0 Integration
     judge0_token = db.Column(db.String(100))  # Judge0 submission token
     judge0_status = db.Column(db.String(50))  # Judge0 status
     
     # Results
-    output = db.Column(db.Text)
-    error_output = db.Column(db.Text)
-    compile_output = db.Column(db.Text)
+    output_hash = db.Column(db.String(64), db.ForeignKey('blobs.hash'))
+    error_output_hash = db.Column(db.String(64), db.ForeignKey('blobs.hash'))
+    compile_output_hash = db.Column(db.String(64), db.ForeignKey('blobs.hash'))
     exit_code = db.Column(db.Integer)
     execution_time = db.Column(db.Float)  # in seconds
     memory_usage = db.Column(db.Integer)  # in KB
     
     # Status
-    status = db.Column(db.String(20), default='pending', nullable=False)  # pending, running, completed, failed
+    # active_history loads the old status before a change, so room_stats sees every transition
+    status = db.column_property(
+        db.Column(db.String(20), default='pending', nullable=False),  # pending, queued, submitted, running, completed, failed, cancelled
+        active_history=True
+    )
+    
+    # Judging
+    mode = db.Column(db.String(20), default='run', nullable=False)  # run, judge, interactive
+    test_suite_id = db.Column(db.String(36), db.ForeignKey('test_suites.id'), index=True)
+    verdicts = db.deferred(db.Column(JSON), group='results')  # Compact per-case verdict summary for judge runs
     
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
     started_at = db.Column(db.DateTime)
     completed_at = db.Column(db.DateTime)
     
+    # Source, input and outputs live in the deduplicated blob table
+    source_code = BlobText()
+    input_data = BlobText()
+    output = BlobText()
+    error_output = BlobText()
+    compile_output = BlobText()
+    BLOB_FIELDS = ['source_code', 'input_data', 'output', 'error_output', 'compile_output']
+    
+    # Uncompressed sizes of the blob fields, loaded on demand
+    source_code_size = db.column_property(
+        db.select(Blob.size).where(Blob.hash == source_code_hash).scalar_subquery(), deferred=True)
+    input_data_size = db.column_property(
+        db.select(Blob.size).where(Blob.hash == input_data_hash).scalar_subquery(), deferred=True)
+    output_size = db.column_property(
+        db.select(Blob.size).where(Blob.hash == output_hash).scalar_subquery(), deferred=True)
+    error_output_size = db.column_property(
+        db.select(Blob.size).where(Blob.hash == error_output_hash).scalar_subquery(), deferred=True)
+    compile_output_size = db.column_property(
+        db.select(Blob.size).where(Blob.hash == compile_output_hash).scalar_subquery(), deferred=True)
+    
     # Relationships
     user = db.relationship('User', back_populates='executions')
     room = db.relationship('Room', back_populates='executions')
     
+    def to_summary_dict(self):
+        """History entry without the large text columns; load with summary columns only"""
+        return {
+            'id': self.id,
+            'room_id': self.room_id,
+            'user_id': self.user_id,
+            'user_name': self.user.name if self.user else None,
+            'language': self.language,
+            'status': self.status,
+            'judge0_status': self.judge0_status,
+            'mode': self.mode,
+            'test_suite_id': self.test_suite_id,
+            'exit_code': self.exit_code,
+            'execution_time': self.execution_time,
+            'memory_usage': self.memory_usage,
+            'sizes': {
+                'source_code': self.source_code_size or 0,
+                'input_data': self.input_data_size or 0,
+                'output': self.output_size or 0,
+                'error_output': self.error_output_size or 0,
+                'compile_output': self.compile_output_size or 0
+            },
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -294,10 +656,148 @@ class Execution(db.Model):
             'execution_time': self.execution_time,
             'memory_usage': self.memory_usage,
             'status': self.status,
+            'mode': self.mode,
+            'test_suite_id': self.test_suite_id,
+            'verdicts': self.verdicts,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'started_at': self.started_at.isoformat() if self.started_at else None,
             'completed_at': self.completed_at.isoformat() if self.completed_at else None
         }
     
+    @staticmethod
+    def migrate_text_columns(batch_size=500):
+        """Move text columns left from before blob storage into blobs; returns executions moved
+        
+        Adds any missing hash columns, moves rows one batch per transaction
+        (so an interrupted run can simply be repeated) and then drops the old
+        columns, whose NOT NULL source_code would otherwise reject new rows.
+        """
+        columns = {column['name'] for column in inspect(db.engine).get_columns('executions')}
+        legacy = [field for field in Execution.BLOB_FIELDS if field in columns]
+        if not legacy:
+            return 0
+        
+        for field in Execution.BLOB_FIELDS:
+            if f'{field}_hash' not in columns:
+                db.session.execute(text(f'ALTER TABLE executions ADD COLUMN {field}_hash VARCHAR(64)'))
+        db.session.commit()
+        
+        table = db.Table('executions', db.MetaData(), autoload_with=db.engine)
+        hash_columns = {field: bindparam(f'new_{field}_hash') for field in Execution.BLOB_FIELDS}
+        update = table.update().where(table.c.id == bindparam('migrated_id'))\
+            .values({f'{field}_hash': param for field, param in hash_columns.items()})
+        
+        moved = 0
+        last_id = ''
+        while True:
+            rows = db.session.execute(
+                db.select(table.c.id, *[table.c[field] for field in legacy])
+                .where(table.c.id > last_id, table.c.source_code_hash.is_(None))
+                .order_by(table.c.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            
+            # acquire() stores each distinct text once and counts one reference per row
+            connection = db.session.connection()
+            params = []
+            for row in rows:
+                values = {f'new_{field}_hash': None for field in Execution.BLOB_FIELDS}
+                for field in legacy:
+                    value = row._mapping[field]
+                    if value is None and field == 'source_code':
+                        value = ''
+                    if value is not None:
+                        digest = Blob.digest(value)
+                        Blob.acquire(connection, digest, value)
+                        values[f'new_{field}_hash'] = digest
+                params.append(dict(values, migrated_id=row.id))
+            connection.execute(update, params)
+            db.session.commit()
+            moved += len(rows)
+        
+        for field in legacy:
+            db.session.execute(text(f'ALTER TABLE executions DROP COLUMN {field}'))
+        db.session.commit()
+        return moved
+    
+    def __repr__(self):
+        return f'<Execution {self.id} ({self.language})>'
+
+class TestSuite(db.Model):
+    __tablename__ = 'test_suites'
+    
+    id = db.Column(db.String(36), primary_key=True, default=generate_uuid)
+    
+    # Foreign Keys
+    room_id = db.Column(db.String(36), db.ForeignKey('rooms.id'), nullable=False, index=True)
+    created_by = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
+    
+    # Problem
+    name = db.Column(db.String(255), nullable=False)
+    cases = db.Column(JSON, nullable=False)  # [{'input': ..., 'expected_output': ...}]
+    
+    # Output Comparison
+    comparison = db.Column(db.String(20), default='exact', nullable=False)  # exact, whitespace, float
+    float_tolerance = db.Column(db.Float, default=1e-6, nullable=False)
+    
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    
+    # Relationships
+    executions = db.relationship('Execution', backref='test_suite', lazy='dynamic')
+    
+    def to_dict(self, include_cases=False):
+        data = {
+            'id': self.id,
+            'room_id': self.room_id,
+            'created_by': self.created_by,
+            'name': self.name,
+            'case_count': len(self.cases or []),
+            'comparison': self.comparison,
+            'float_tolerance': self.float_tolerance,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+        
+        if include_cases:
+            data['cases'] = self.cases
+        
+        return data
+    
     def __repr__(self):
-        return f'<Execution {self.id} ({self.language})>'
\ No newline at end of file
+        return f'<TestSuite {self.name}>'
+
+@event.listens_for(Session, 'after_flush')
+def update_room_stats(session, flush_context):
+    """Apply the participants and executions just flushed to their rooms' running totals"""
+    connection = session.connection()
+    deltas = {}
+    
+    def count(room_id, field, delta):
+        if delta:
+            room = deltas.setdefault(room_id, {})
+            room[field] = room.get(field, 0) + delta
+    
+    new_rooms = [instance.id for instance in session.new if isinstance(instance, Room)]
+    if new_rooms:
+        connection.execute(RoomStats.__table__.insert(), [{'room_id': room_id} for room_id in new_rooms])
+    
+    for instance in session.new:
+        if isinstance(instance, RoomParticipant):
+            count(instance.room_id, 'participants_ever', 1)
+        elif isinstance(instance, Execution):
+            count(instance.room_id, 'executions', 1)
+            count(instance.room_id, 'successful_executions', int(instance.status == 'completed'))
+    
+    for instance in session.dirty:
+        if isinstance(instance, Execution):
+            history = inspect(instance).attrs.status.history
+            if history.has_changes():
+                count(instance.room_id, 'successful_executions',
+                      int('completed' in history.added) - int('completed' in history.deleted))
+    
+    for room_id, room_deltas in deltas.items():
+        RoomStats.increment(connection, room_id, room_deltas)
@@ -7,6 +7,7 @@ from datetime import datetime, timedelta
 import jwt as pyjwt
 from functools import wraps
 
+from sqlalchemy.orm import undefer_group
 from models import db, User
 from services.auth_service import AuthService
 from services.user_service import UserService
@@ -220,7 +221,7 @@ def get_profile():
     """Get current user profile"""
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = User.query.options(undefer_group('stats')).get(current_user_id)
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
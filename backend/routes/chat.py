@@ -1,8 +1,14 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
+from concurrent import futures
+from sqlalchemy.exc import IntegrityError
 
-from models import db, Message, Room, RoomParticipant
+from models import db, Message, RoomParticipant
+from services.message_service import MessageService
+from services.message_search import MessageSearch
+from services.recent_messages import get_recent_messages
+from services.room_export import RoomExport
 
 chat_bp = Blueprint('chat', __name__, url_prefix='/api/chat')
 
@@ -23,27 +29,32 @@ def get_messages(room_id):
         if not participation:
             return jsonify({'error': 'Access denied'}), 403
         
-        page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 50, type=int), 100)
+        limit = min(request.args.get('limit', 50, type=int), 100)
+        before = request.args.get('before')
+        after = request.args.get('after')
         
-        # Get messages ordered by creation time (newest first for pagination, but reverse for display)
-        messages = Message.query.filter_by(room_id=room_id)\
-            .order_by(Message.created_at.desc())\
-            .paginate(page=page, per_page=per_page, error_out=False)
+        if before and after:
+            return jsonify({'error': 'Use either before or after, not both'}), 400
         
-        # Reverse the order for proper chronological display
-        messages_data = [msg.to_dict() for msg in reversed(messages.items)]
+        try:
+            messages, has_more = MessageService.get_page(room_id, limit, before=before, after=after)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        pagination = {
+            'limit': limit,
+            'has_more': has_more,
+            'before': MessageService.encode_cursor(messages[0]) if messages else before,
+            'after': MessageService.encode_cursor(messages[-1]) if messages else after
+        }
+        
+        # Counting scans the whole room, so it is opt-in
+        if request.args.get('include_total', 'false').lower() == 'true':
+            pagination['total'] = Message.query.filter_by(room_id=room_id).count()
         
         return jsonify({
-            'messages': messages_data,
-            'pagination': {
-                'page': page,
-                'pages': messages.pages,
-                'per_page': per_page,
-                'total': messages.total,
-                'has_next': messages.has_next,
-                'has_prev': messages.has_prev
-            }
+            'messages': messages,
+            'pagination': pagination
         }), 200
         
     except Exception as e:
@@ -62,6 +73,7 @@ def send_message(room_id):
         content = data.get('content', '').strip()
         message_type = data.get('message_type', 'text')
         reply_to = data.get('reply_to')
+        client_msg_id = data.get('client_msg_id')
         
         if not content:
             return jsonify({'error': 'Message content is required'}), 400
@@ -72,6 +84,10 @@ def send_message(room_id):
         if message_type not in ['text', 'code', 'system', 'file']:
             return jsonify({'error': 'Invalid message type'}), 400
         
+        if client_msg_id is not None and (not isinstance(client_msg_id, str) or not client_msg_id
+                                          or len(client_msg_id) > current_app.config['MAX_CLIENT_MSG_ID_LENGTH']):
+            return jsonify({'error': 'Invalid client_msg_id'}), 400
+        
         # Check if user is participant
         participation = RoomParticipant.query.filter_by(
             room_id=room_id,
@@ -84,37 +100,69 @@ def send_message(room_id):
         
         # Validate reply_to if provided
         if reply_to:
-            parent_message = Message.query.filter_by(id=reply_to, room_id=room_id).first()
-            if not parent_message:
+            if not MessageService.find_message(room_id, reply_to):
                 return jsonify({'error': 'Parent message not found'}), 400
         
-        # Create message
-        message = Message()
-        message.room_id = room_id
-        message.user_id = current_user_id
-        message.content = content
-        message.message_type = message_type
-        message.reply_to = reply_to
-        
-        db.session.add(message)
-        
-        # Update room last activity
-        room = Room.query.get(room_id)
-        if room:
-            room.last_activity = datetime.utcnow()
-        
-        db.session.commit()
-        
+        # Group-committed with other messages; respond once it is stored
+        message, stored, duplicate = MessageService.post(
+            room_id, current_user_id, content, message_type, reply_to, client_msg_id
+        )
+        try:
+            stored.result(timeout=current_app.config['MESSAGE_ACK_TIMEOUT'])
+        except futures.TimeoutError:
+            # Still queued and probably stored soon; a resend with the same client_msg_id is safe
+            return jsonify({
+                'message': 'Message accepted',
+                'data': message
+            }), 202
+        except IntegrityError:
+            # Resent after the id index forgot it; the unique constraint kept the original
+            db.session.rollback()
+            original = MessageService.find_sent(room_id, current_user_id, client_msg_id) if client_msg_id else None
+            if not original:
+                raise
+            message, duplicate = original, True
+        
+        # A resend gets the original message back
         return jsonify({
-            'message': 'Message sent successfully',
-            'data': message.to_dict()
-        }), 201
+            'message': 'Message already sent' if duplicate else 'Message sent successfully',
+            'data': message
+        }), 200 if duplicate else 201
         
     except Exception as e:
         current_app.logger.error(f"Send message error: {str(e)}")
         db.session.rollback()
         return jsonify({'error': 'Failed to send message'}), 500
 
+@chat_bp.route('/messages/<message_id>/thread', methods=['GET'])
+@jwt_required()
+def get_thread(message_id):
+    """Get the full reply thread a message belongs to"""
+    try:
+        current_user_id = get_jwt_identity()
+        
+        message = Message.query.get(message_id)
+        if not message:
+            return jsonify({'error': 'Message not found'}), 404
+        
+        # Check if user is participant
+        participation = RoomParticipant.query.filter_by(
+            room_id=message.room_id,
+            user_id=current_user_id,
+            is_active=True
+        ).first()
+        
+        if not participation:
+            return jsonify({'error': 'Access denied'}), 403
+        
+        thread = MessageService.get_thread(message_id)
+        
+        return jsonify({'thread': thread}), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Get thread error: {str(e)}")
+        return jsonify({'error': 'Failed to get thread'}), 500
+
 @chat_bp.route('/messages/<message_id>', methods=['PUT'])
 @jwt_required()
 def edit_message(message_id):
@@ -155,6 +203,7 @@ def edit_message(message_id):
         message.edited_at = datetime.utcnow()
         
         db.session.commit()
+        get_recent_messages().replace(message.room_id, message.to_dict())
         
         return jsonify({
             'message': 'Message updated successfully',
@@ -202,6 +251,7 @@ def delete_message(message_id):
         message.edited_at = datetime.utcnow()
         
         db.session.commit()
+        get_recent_messages().replace(message.room_id, message.to_dict())
         
         return jsonify({'message': 'Message deleted successfully'}), 200
         
@@ -210,6 +260,34 @@ def delete_message(message_id):
         db.session.rollback()
         return jsonify({'error': 'Failed to delete message'}), 500
 
+@chat_bp.route('/room/<room_id>/export', methods=['GET'])
+@jwt_required()
+def export_messages(room_id):
+    """Stream a room's whole chat history as NDJSON"""
+    try:
+        current_user_id = get_jwt_identity()
+        
+        # Check if user is participant
+        participation = RoomParticipant.query.filter_by(
+            room_id=room_id,
+            user_id=current_user_id,
+            is_active=True
+        ).first()
+        
+        if not participation:
+            return jsonify({'error': 'Access denied'}), 403
+        
+        try:
+            messages = RoomExport.messages(room_id, after=request.args.get('after'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return RoomExport.response(messages, f'room-{room_id}-messages.ndjson')
+        
+    except Exception as e:
+        current_app.logger.error(f"Export messages error: {str(e)}")
+        return jsonify({'error': 'Failed to export messages'}), 500
+
 @chat_bp.route('/room/<room_id>/search', methods=['GET'])
 @jwt_required()
 def search_messages(room_id):
@@ -231,26 +309,22 @@ def search_messages(room_id):
         if not query or len(query) < 2:
             return jsonify({'error': 'Search query must be at least 2 characters'}), 400
         
-        page = request.args.get('page', 1, type=int)
+        page = max(request.args.get('page', 1, type=int), 1)
         per_page = min(request.args.get('per_page', 20, type=int), 50)
         
-        # Search messages
-        messages = Message.query.filter(
-            Message.room_id == room_id,
-            Message.content.ilike(f'%{query}%')
-        ).order_by(Message.created_at.desc())\
-         .paginate(page=page, per_page=per_page, error_out=False)
+        messages, total = MessageSearch.search(room_id, query, page, per_page)
+        pages = (total + per_page - 1) // per_page
         
         return jsonify({
-            'messages': [msg.to_dict() for msg in messages.items],
+            'messages': messages,
             'query': query,
             'pagination': {
                 'page': page,
-                'pages': messages.pages,
+                'pages': pages,
                 'per_page': per_page,
-                'total': messages.total,
-                'has_next': messages.has_next,
-                'has_prev': messages.has_prev
+                'total': total,
+                'has_next': page < pages,
+                'has_prev': page > 1
             }
         }), 200
         
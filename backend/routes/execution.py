@@ -1,14 +1,30 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from werkzeug.exceptions import RequestedRangeNotSatisfiable, RequestEntityTooLarge
 from datetime import datetime
 import requests
 import json
 
-from models import db, Execution, Room, RoomParticipant
+from sqlalchemy.orm import load_only, joinedload, undefer, undefer_group
+from models import db, Execution, Room, RoomParticipant, TestSuite, User
 from config import JUDGE0_LANGUAGE_MAP
+from services.execution_service import ExecutionService
+from services.execution_scheduler import SchedulerOverloaded, PRIORITY_BATCH
+from services.judge_service import JudgeService, COMPARISON_MODES
+from services.room_export import RoomExport
 
 execution_bp = Blueprint('execution', __name__, url_prefix='/api/execution')
 
+def allowed_file(filename: str) -> bool:
+    """Check an uploaded file's extension against ALLOWED_EXTENSIONS"""
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
+
+def overloaded_response(error: SchedulerOverloaded):
+    """429 response telling the client when to retry"""
+    response = jsonify({'error': str(error), 'retry_after': error.retry_after})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 429
+
 @execution_bp.route('/languages', methods=['GET'])
 def get_supported_languages():
     """Get supported programming languages"""
@@ -27,14 +43,31 @@ def submit_code():
     """Submit code for execution"""
     try:
         current_user_id = get_jwt_identity()
-        data = request.get_json()
+        
+        # Multipart submissions carry source and stdin as files, spooled to
+        # disk above UPLOAD_SPOOL_THRESHOLD instead of parsed out of JSON
+        if request.mimetype == 'multipart/form-data':
+            data = request.form
+            source_file = request.files.get('source_file')
+            input_file = request.files.get('input_file')
+        else:
+            data = request.get_json()
+            source_file = input_file = None
+        
+        for upload in (source_file, input_file):
+            if upload and not allowed_file(upload.filename or ''):
+                return jsonify({'error': f'File type not allowed: {upload.filename}'}), 400
         
         # Validate required fields
         room_id = data.get('room_id')
         language = data.get('language', '').lower()
-        source_code = data.get('source_code', '').strip()
+        source_code = data.get('source_code', '')
         input_data = data.get('input_data', '')
         
+        if source_file:
+            source_code = source_file.read(current_app.config['MAX_CODE_LENGTH'] + 1).decode('utf-8', errors='replace')
+        source_code = source_code.strip()
+        
         if not room_id:
             return jsonify({'error': 'Room ID is required'}), 400
         
@@ -57,6 +90,18 @@ def submit_code():
         if not participation:
             return jsonify({'error': 'Access denied'}), 403
         
+        # Languages with a local toolchain skip Judge0 entirely, behind the
+        # fair-share scheduler's admission control
+        use_local_executor = ExecutionService.uses_local_executor(language)
+        if use_local_executor:
+            try:
+                ExecutionService.check_admission(current_user_id)
+            except SchedulerOverloaded as e:
+                return overloaded_response(e)
+        elif input_file:
+            # Judge0 takes stdin inline, so the upload has to be read after all
+            input_data = input_file.read().decode('utf-8', errors='replace')
+        
         # Create execution record
         execution = Execution()
         execution.room_id = room_id
@@ -69,54 +114,34 @@ def submit_code():
         db.session.add(execution)
         db.session.commit()
         
-        # Submit to Judge0 API in background (simplified for now)
-        judge0_language_id = JUDGE0_LANGUAGE_MAP[language]
-        
-        judge0_payload = {
-            'source_code': source_code,
-            'language_id': judge0_language_id,
-            'stdin': input_data
-        }
-        
-        try:
-            # Submit to Judge0
-            judge0_headers = {
-                'X-RapidAPI-Host': current_app.config['JUDGE0_API_HOST'],
-                'X-RapidAPI-Key': current_app.config['JUDGE0_API_KEY'],
-                'Content-Type': 'application/json'
-            }
+        if use_local_executor:
+            if input_file:
+                # Streamed to the program's stdin from disk, never stored as a blob
+                ExecutionService.save_input_file(execution, input_file)
             
-            response = requests.post(
-                f"{current_app.config['JUDGE0_API_URL']}/submissions",
-                headers=judge0_headers,
-                json=judge0_payload,
-                timeout=10
-            )
-            
-            if response.status_code == 201:
-                judge0_data = response.json()
-                execution.judge0_token = judge0_data.get('token')
-                execution.status = 'submitted'
-                execution.started_at = datetime.utcnow()
-                db.session.commit()
-                
-                return jsonify({
-                    'message': 'Code submitted successfully',
-                    'execution_id': execution.id,
-                    'judge0_token': execution.judge0_token
-                }), 201
-            else:
-                execution.status = 'failed'
-                execution.error_output = f"Judge0 API error: {response.status_code}"
-                db.session.commit()
-                return jsonify({'error': 'Failed to submit to Judge0'}), 500
-                
-        except requests.RequestException as e:
-            execution.status = 'failed'
-            execution.error_output = f"Network error: {str(e)}"
+            execution.status = 'queued'
             db.session.commit()
-            return jsonify({'error': 'Failed to connect to Judge0'}), 500
+            
+            ExecutionService.run_local_async(execution)
+            
+            return jsonify({
+                'message': 'Code submitted successfully',
+                'execution_id': execution.id,
+                'judge0_token': None
+            }), 201
+        
+        error = ExecutionService.submit_to_judge0(execution)
+        if error:
+            return jsonify({'error': error}), 500
         
+        return jsonify({
+            'message': 'Code submitted successfully',
+            'execution_id': execution.id,
+            'judge0_token': execution.judge0_token
+        }), 201
+        
+    except RequestEntityTooLarge:
+        return jsonify({'error': 'Request too large'}), 413
     except Exception as e:
         current_app.logger.error(f"Submit code error: {str(e)}")
         db.session.rollback()
@@ -129,7 +154,7 @@ def get_execution_result(execution_id):
     try:
         current_user_id = get_jwt_identity()
         
-        execution = Execution.query.get(execution_id)
+        execution = Execution.query.options(undefer_group('results')).get(execution_id)
         if not execution:
             return jsonify({'error': 'Execution not found'}), 404
         
@@ -150,38 +175,15 @@ def get_execution_result(execution_id):
         # If still pending/running, check Judge0 status
         if execution.judge0_token and execution.status in ['submitted', 'running']:
             try:
-                judge0_headers = {
-                    'X-RapidAPI-Host': current_app.config['JUDGE0_API_HOST'],
-                    'X-RapidAPI-Key': current_app.config['JUDGE0_API_KEY']
-                }
-                
                 response = requests.get(
                     f"{current_app.config['JUDGE0_API_URL']}/submissions/{execution.judge0_token}",
-                    headers=judge0_headers,
+                    headers=ExecutionService.judge0_headers(),
                     timeout=10
                 )
                 
                 if response.status_code == 200:
-                    judge0_data = response.json()
-                    
-                    # Update execution with Judge0 results
-                    execution.judge0_status = judge0_data.get('status', {}).get('description', 'Unknown')
-                    execution.output = judge0_data.get('stdout', '')
-                    execution.error_output = judge0_data.get('stderr', '')
-                    execution.compile_output = judge0_data.get('compile_output', '')
-                    execution.execution_time = judge0_data.get('time')
-                    execution.memory_usage = judge0_data.get('memory')
-                    execution.exit_code = judge0_data.get('exit_code')
-                    
-                    # Check if execution is finished
-                    status_id = judge0_data.get('status', {}).get('id', 0)
-                    if status_id in [3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14]:  # Finished states
-                        execution.status = 'completed'
-                        execution.completed_at = datetime.utcnow()
-                    else:
-                        execution.status = 'running'
-                    
-                    db.session.commit()
+                    # Update execution with Judge0 results, unless it was cancelled meanwhile
+                    ExecutionService.complete(execution, response.json())
                 
             except requests.RequestException as e:
                 current_app.logger.error(f"Judge0 API error: {str(e)}")
@@ -192,6 +194,105 @@ def get_execution_result(execution_id):
         current_app.logger.error(f"Get execution result error: {str(e)}")
         return jsonify({'error': 'Failed to get execution result'}), 500
 
+@execution_bp.route('/<execution_id>', methods=['GET'])
+@jwt_required()
+def get_execution(execution_id):
+    """Get an execution's full detail"""
+    try:
+        current_user_id = get_jwt_identity()
+        
+        execution = Execution.query.options(undefer_group('results')).get(execution_id)
+        if not execution:
+            return jsonify({'error': 'Execution not found'}), 404
+        
+        # Check if user has access to this execution
+        participation = RoomParticipant.query.filter_by(
+            room_id=execution.room_id,
+            user_id=current_user_id,
+            is_active=True
+        ).first()
+        
+        if not participation:
+            return jsonify({'error': 'Access denied'}), 403
+        
+        return jsonify({'execution': execution.to_dict()}), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Get execution error: {str(e)}")
+        return jsonify({'error': 'Failed to get execution'}), 500
+
+@execution_bp.route('/<execution_id>/<field>', methods=['GET'])
+@jwt_required()
+def get_execution_field(execution_id, field):
+    """Get one of an execution's text fields, honouring HTTP Range requests"""
+    try:
+        current_user_id = get_jwt_identity()
+        
+        if field not in Execution.BLOB_FIELDS:
+            return jsonify({'error': 'Not found'}), 404
+        
+        # Load just the requested column
+        execution = Execution.query.options(
+            load_only(Execution.room_id, Execution.status, getattr(Execution, f'{field}_hash'))
+        ).filter_by(id=execution_id).first()
+        
+        if not execution:
+            return jsonify({'error': 'Execution not found'}), 404
+        
+        # Check if user has access to this execution
+        participation = RoomParticipant.query.filter_by(
+            room_id=execution.room_id,
+            user_id=current_user_id,
+            is_active=True
+        ).first()
+        
+        if not participation:
+            return jsonify({'error': 'Access denied'}), 403
+        
+        data = (getattr(execution, field) or '').encode('utf-8')
+        
+        # Werkzeug turns this into a 206 when a Range header is sent
+        response = current_app.response_class(data, mimetype='text/plain')
+        response.add_etag()
+        try:
+            return response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+        except RequestedRangeNotSatisfiable:
+            response = jsonify({'error': 'Requested range not satisfiable'})
+            response.headers['Content-Range'] = f'bytes */{len(data)}'
+            return response, 416
+        
+    except Exception as e:
+        current_app.logger.error(f"Get execution field error: {str(e)}")
+        return jsonify({'error': 'Failed to get execution'}), 500
+
+@execution_bp.route('/<execution_id>/cancel', methods=['POST'])
+@jwt_required()
+def cancel_execution(execution_id):
+    """Cancel a queued or running execution"""
+    try:
+        current_user_id = get_jwt_identity()
+        
+        execution = Execution.query.get(execution_id)
+        if not execution:
+            return jsonify({'error': 'Execution not found'}), 404
+        
+        # Only the author or the room owner may cancel a run
+        if execution.user_id != current_user_id and execution.room.created_by != current_user_id:
+            return jsonify({'error': 'Access denied'}), 403
+        
+        if not ExecutionService.cancel(execution_id):
+            return jsonify({'error': 'Execution already finished'}), 409
+        
+        return jsonify({
+            'message': 'Execution cancelled',
+            'execution': Execution.query.get(execution_id).to_dict()
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Cancel execution error: {str(e)}")
+        db.session.rollback()
+        return jsonify({'error': 'Failed to cancel execution'}), 500
+
 @execution_bp.route('/room/<room_id>/history', methods=['GET'])
 @jwt_required()
 def get_execution_history(room_id):
@@ -212,12 +313,27 @@ def get_execution_history(room_id):
         page = request.args.get('page', 1, type=int)
         per_page = min(request.args.get('per_page', 20, type=int), 50)
         
+        # Summary columns only: the large text fields are fetched per execution
         executions = Execution.query.filter_by(room_id=room_id)\
+            .options(
+                load_only(
+                    Execution.room_id, Execution.user_id, Execution.language, Execution.status,
+                    Execution.judge0_status, Execution.mode, Execution.test_suite_id,
+                    Execution.exit_code, Execution.execution_time, Execution.memory_usage,
+                    Execution.created_at, Execution.started_at, Execution.completed_at
+                ),
+                undefer(Execution.source_code_size),
+                undefer(Execution.input_data_size),
+                undefer(Execution.output_size),
+                undefer(Execution.error_output_size),
+                undefer(Execution.compile_output_size),
+                joinedload(Execution.user).load_only(User.name)
+            )\
             .order_by(Execution.created_at.desc())\
             .paginate(page=page, per_page=per_page, error_out=False)
         
         return jsonify({
-            'executions': [e.to_dict() for e in executions.items],
+            'executions': [e.to_summary_dict() for e in executions.items],
             'pagination': {
                 'page': page,
                 'pages': executions.pages,
@@ -232,6 +348,203 @@ def get_execution_history(room_id):
         current_app.logger.error(f"Get execution history error: {str(e)}")
         return jsonify({'error': 'Failed to get execution history'}), 500
 
+@execution_bp.route('/room/<room_id>/export', methods=['GET'])
+@jwt_required()
+def export_executions(room_id):
+    """Stream a room's whole execution history, sources and outputs included as NDJSON"""
+    try:
+        current_user_id = get_jwt_identity()
+        
+        # Check if user is participant
+        participation = RoomParticipant.query.filter_by(
+            room_id=room_id,
+            user_id=current_user_id,
+            is_active=True
+        ).first()
+        
+        if not participation:
+            return jsonify({'error': 'Access denied'}), 403
+        
+        try:
+            executions = RoomExport.executions(room_id, after=request.args.get('after'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return RoomExport.response(executions, f'room-{room_id}-executions.ndjson')
+        
+    except Exception as e:
+        current_app.logger.error(f"Export executions error: {str(e)}")
+        return jsonify({'error': 'Failed to export executions'}), 500
+
+@execution_bp.route('/room/<room_id>/suites', methods=['POST'])
+@jwt_required()
+def create_test_suite(room_id):
+    """Store a problem's test suite for judging"""
+    try:
+        current_user_id = get_jwt_identity()
+        data = request.get_json()
+        
+        # Check if user is participant
+        participation = RoomParticipant.query.filter_by(
+            room_id=room_id,
+            user_id=current_user_id,
+            is_active=True
+        ).first()
+        
+        if not participation:
+            return jsonify({'error': 'Access denied'}), 403
+        
+        name = data.get('name', '').strip()
+        if not name or len(name) > 255:
+            return jsonify({'error': 'Problem name is required and must be under 255 characters'}), 400
+        
+        comparison = data.get('comparison', 'exact')
+        if comparison not in COMPARISON_MODES:
+            return jsonify({'error': f'Invalid comparison: {comparison}'}), 400
+        
+        float_tolerance = data.get('float_tolerance', 1e-6)
+        if not isinstance(float_tolerance, (int, float)) or float_tolerance < 0:
+            return jsonify({'error': 'Invalid float tolerance'}), 400
+        
+        cases = data.get('cases')
+        if not isinstance(cases, list) or not cases:
+            return jsonify({'error': 'At least one test case is required'}), 400
+        
+        if len(cases) > current_app.config['JUDGE_MAX_CASES']:
+            return jsonify({'error': 'Too many test cases'}), 400
+        
+        stored_cases = []
+        for case in cases:
+            if not isinstance(case, dict) or not isinstance(case.get('expected_output'), str):
+                return jsonify({'error': 'Each test case needs an expected_output'}), 400
+            
+            case_input = case.get('input') or ''
+            if not isinstance(case_input, str):
+                return jsonify({'error': 'Test case input must be a string'}), 400
+            
+            if len(case_input) + len(case['expected_output']) > current_app.config['MAX_CODE_LENGTH']:
+                return jsonify({'error': 'Test case too long'}), 400
+            
+            stored_cases.append({'input': case_input, 'expected_output': case['expected_output']})
+        
+        suite = TestSuite(
+            room_id=room_id,
+            created_by=current_user_id,
+            name=name,
+            cases=stored_cases,
+            comparison=comparison,
+            float_tolerance=float(float_tolerance)
+        )
+        
+        db.session.add(suite)
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Test suite created successfully',
+            'suite': suite.to_dict(include_cases=True)
+        }), 201
+        
+    except Exception as e:
+        current_app.logger.error(f"Create test suite error: {str(e)}")
+        db.session.rollback()
+        return jsonify({'error': 'Failed to create test suite'}), 500
+
+@execution_bp.route('/room/<room_id>/suites', methods=['GET'])
+@jwt_required()
+def get_test_suites(room_id):
+    """List a room's test suites"""
+    try:
+        current_user_id = get_jwt_identity()
+        
+        # Check if user is participant
+        participation = RoomParticipant.query.filter_by(
+            room_id=room_id,
+            user_id=current_user_id,
+            is_active=True
+        ).first()
+        
+        if not participation:
+            return jsonify({'error': 'Access denied'}), 403
+        
+        suites = TestSuite.query.filter_by(room_id=room_id)\
+            .order_by(TestSuite.created_at.desc()).all()
+        
+        # Cases stay hidden from everyone but the problem's author
+        return jsonify({
+            'suites': [s.to_dict(include_cases=s.created_by == current_user_id) for s in suites]
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Get test suites error: {str(e)}")
+        return jsonify({'error': 'Failed to fetch test suites'}), 500
+
+@execution_bp.route('/judge', methods=['POST'])
+@jwt_required()
+def judge_code():
+    """Judge code against a stored test suite"""
+    try:
+        current_user_id = get_jwt_identity()
+        data = request.get_json()
+        
+        suite_id = data.get('suite_id')
+        language = data.get('language', '').lower()
+        source_code = data.get('source_code', '').strip()
+        early_exit = bool(data.get('early_exit', True))
+        
+        if not language or language not in JUDGE0_LANGUAGE_MAP:
+            return jsonify({'error': f'Unsupported language: {language}'}), 400
+        
+        if not source_code:
+            return jsonify({'error': 'Source code is required'}), 400
+        
+        if len(source_code) > current_app.config['MAX_CODE_LENGTH']:
+            return jsonify({'error': 'Code too long'}), 400
+        
+        suite = TestSuite.query.get(suite_id) if suite_id else None
+        if not suite:
+            return jsonify({'error': 'Test suite not found'}), 404
+        
+        # Check if user is participant of the suite's room
+        participation = RoomParticipant.query.filter_by(
+            room_id=suite.room_id,
+            user_id=current_user_id,
+            is_active=True
+        ).first()
+        
+        if not participation:
+            return jsonify({'error': 'Access denied'}), 403
+        
+        if ExecutionService.uses_local_executor(language):
+            try:
+                ExecutionService.check_admission(current_user_id, PRIORITY_BATCH)
+            except SchedulerOverloaded as e:
+                return overloaded_response(e)
+        
+        # One execution row holds the whole run's verdict summary
+        execution = Execution()
+        execution.room_id = suite.room_id
+        execution.user_id = current_user_id
+        execution.language = language
+        execution.source_code = source_code
+        execution.mode = 'judge'
+        execution.test_suite_id = suite.id
+        execution.status = 'queued'
+        
+        db.session.add(execution)
+        db.session.commit()
+        
+        JudgeService.start(execution, early_exit)
+        
+        return jsonify({
+            'message': 'Code submitted for judging',
+            'execution_id': execution.id
+        }), 201
+        
+    except Exception as e:
+        current_app.logger.error(f"Judge code error: {str(e)}")
+        db.session.rollback()
+        return jsonify({'error': 'Failed to submit code for judging'}), 500
+
 # Error handlers
 @execution_bp.errorhandler(400)
 def bad_request(error):
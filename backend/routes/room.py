@@ -5,8 +5,10 @@ from datetime import datetime
 import secrets
 import string
 
+from sqlalchemy.orm import contains_eager
 from models import db, Room, RoomParticipant, User, Message
 from services.room_service import RoomService
+from services.room_search import get_room_search_index
 from config import DEFAULT_CODE_TEMPLATES, SUPPORTED_LANGUAGES
 
 room_bp = Blueprint('room', __name__, url_prefix='/api/rooms')
@@ -21,50 +23,43 @@ def get_rooms():
         search = request.args.get('search', '').strip()
         language = request.args.get('language', '').strip()
         
-        query = Room.query.filter(
-            Room.is_active == True,
-            Room.is_private == False
-        )
+        if language not in SUPPORTED_LANGUAGES:
+            language = None
         
         if search:
-            query = query.filter(
-                db.or_(
-                    Room.name.ilike(f'%{search}%'),
-                    Room.description.ilike(f'%{search}%')
-                )
+            # Ranked by relevance from the trigram index, then by activity
+            rooms, total, capped, facets = RoomService.find_public_rooms(search, language, (page - 1) * per_page, per_page)
+        else:
+            query = Room.query.filter(
+                Room.is_active == True,
+                Room.is_private == False
             )
+            
+            if language:
+                query = query.filter(Room.language == language)
+            
+            # Order by activity (most recent first)
+            pagination = query.order_by(Room.last_activity.desc()).paginate(
+                page=page, 
+                per_page=per_page, 
+                error_out=False
+            )
+            rooms, total, capped = pagination.items, pagination.total, False
+            facets = get_room_search_index().search('')[1]
         
-        if language and language in SUPPORTED_LANGUAGES:
-            query = query.filter(Room.language == language)
-        
-        # Order by activity (most recent first)
-        query = query.order_by(Room.last_activity.desc())
-        
-        pagination = query.paginate(
-            page=page, 
-            per_page=per_page, 
-            error_out=False
-        )
-        
-        rooms_data = []
-        for room in pagination.items:
-            room_dict = room.to_dict()
-            # Add owner info
-            owner = User.query.get(room.created_by)
-            if owner:
-                room_dict['owner_name'] = owner.name
-                room_dict['owner_picture'] = owner.picture
-            rooms_data.append(room_dict)
+        pages = (total + per_page - 1) // per_page if per_page else 0
         
         return jsonify({
-            'rooms': rooms_data,
+            'rooms': RoomService.serialize_rooms(rooms),
+            'facets': {'language': facets},
             'pagination': {
                 'page': page,
-                'pages': pagination.pages,
+                'pages': pages,
                 'per_page': per_page,
-                'total': pagination.total,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
+                'total': total,
+                'has_next': page < pages,
+                'has_prev': page > 1,
+                'capped': capped  # only the best ROOM_SEARCH_MAX_RANKED search matches are paged
             }
         }), 200
         
@@ -229,7 +224,8 @@ def join_room(room_id):
         participant = RoomParticipant(
             room_id=room_id,
             user_id=current_user_id,
-            role='participant'
+            role='participant',
+            last_read_seq=room.message_seq  # history from before joining doesn't count as unread
         )
         
         db.session.add(participant)
@@ -332,6 +328,9 @@ def update_room(room_id):
                 return jsonify({'error': 'Cannot reduce capacity below current participant count'}), 400
             room.max_participants = max_participants
         
+        if 'auto_run' in data:
+            room.auto_run = bool(data['auto_run'])
+        
         room.updated_at = datetime.utcnow()
         db.session.commit()
         
@@ -416,25 +415,18 @@ def get_my_rooms():
     try:
         current_user_id = get_jwt_identity()
         
-        # Get rooms where user is participant
+        # Get rooms where user is participant, with their unread badges, in one query
         participations = RoomParticipant.query.filter_by(
             user_id=current_user_id,
             is_active=True
-        ).join(Room).filter(Room.is_active == True).all()
+        ).join(Room).filter(Room.is_active == True)\
+            .options(contains_eager(RoomParticipant.room)).all()
         
-        rooms_data = []
-        for participation in participations:
-            room_dict = participation.room.to_dict()
+        rooms_data = RoomService.serialize_rooms([participation.room for participation in participations])
+        for participation, room_dict in zip(participations, rooms_data):
             room_dict['user_role'] = participation.role
             room_dict['joined_at'] = participation.joined_at.isoformat() if participation.joined_at else None
-            
-            # Add owner info
-            owner = User.query.get(participation.room.created_by)
-            if owner:
-                room_dict['owner_name'] = owner.name
-                room_dict['owner_picture'] = owner.picture
-            
-            rooms_data.append(room_dict)
+            room_dict['unread_count'] = max(0, participation.room.message_seq - participation.last_read_seq)
         
         # Sort by last activity
         rooms_data.sort(key=lambda x: x.get('last_activity', ''), reverse=True)
@@ -445,6 +437,39 @@ def get_my_rooms():
         current_app.logger.error(f"Get my rooms error: {str(e)}")
         return jsonify({'error': 'Failed to fetch rooms'}), 500
 
+@room_bp.route('/search', methods=['GET'])
+@jwt_required()
+def search_rooms():
+    """Search public rooms by name or description, most relevant first"""
+    try:
+        query = request.args.get('q', '').strip()
+        language = request.args.get('language', '').strip()
+        limit = max(1, min(request.args.get('limit', 20, type=int), 50))
+        
+        if language not in SUPPORTED_LANGUAGES:
+            language = None
+        
+        rooms, facets = RoomService.search_rooms(query, language, limit)
+        
+        return jsonify({'rooms': rooms, 'facets': {'language': facets}}), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Search rooms error: {str(e)}")
+        return jsonify({'error': 'Failed to search rooms'}), 500
+
+@room_bp.route('/trending', methods=['GET'])
+@jwt_required()
+def get_trending_rooms():
+    """Get the most active public rooms right now"""
+    try:
+        limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+        
+        return jsonify({'rooms': RoomService.get_trending_rooms(limit)}), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Get trending rooms error: {str(e)}")
+        return jsonify({'error': 'Failed to fetch trending rooms'}), 500
+
 # Error handlers
 @room_bp.errorhandler(400)
 def bad_request(error):
@@ -2,8 +2,10 @@ from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
 
+from sqlalchemy.orm import contains_eager, undefer_group
 from models import db, User, Room, RoomParticipant
 from services.user_service import UserService
+from services.room_service import RoomService
 
 users_bp = Blueprint('users', __name__, url_prefix='/api/users')
 
@@ -13,7 +15,7 @@ def get_current_user_profile():
     """Get current user's profile with stats"""
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = User.query.options(undefer_group('stats')).get(current_user_id)
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -97,7 +99,7 @@ def update_current_user_profile():
 def get_user_profile(user_id):
     """Get another user's public profile"""
     try:
-        user = User.query.filter_by(id=user_id, is_active=True).first()
+        user = User.query.options(undefer_group('stats')).filter_by(id=user_id, is_active=True).first()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -205,7 +207,7 @@ def get_user_dashboard():
     """Get user dashboard data"""
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = User.query.options(undefer_group('stats')).get(current_user_id)
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -215,15 +217,14 @@ def get_user_dashboard():
             user_id=current_user_id, 
             is_active=True
         ).join(Room).filter(Room.is_active == True)\
+         .options(contains_eager(RoomParticipant.room))\
          .order_by(Room.last_activity.desc())\
          .limit(5).all()
         
-        recent_rooms = []
-        for participation in recent_participations:
-            room_data = participation.room.to_dict()
+        recent_rooms = RoomService.serialize_rooms([participation.room for participation in recent_participations])
+        for participation, room_data in zip(recent_participations, recent_rooms):
             room_data['user_role'] = participation.role
             room_data['last_activity'] = participation.room.last_activity.isoformat() if participation.room.last_activity else None
-            recent_rooms.append(room_data)
         
         # Get owned rooms
         owned_rooms = Room.query.filter_by(
@@ -234,7 +235,7 @@ def get_user_dashboard():
         dashboard_data = {
             'user': user.to_dict(include_stats=True),
             'recent_rooms': recent_rooms,
-            'owned_rooms': [room.to_dict() for room in owned_rooms],
+            'owned_rooms': RoomService.serialize_rooms(owned_rooms),
             'stats': {
                 'total_rooms_created': Room.query.filter_by(created_by=current_user_id, is_active=True).count(),
                 'total_rooms_joined': RoomParticipant.query.filter_by(user_id=current_user_id, is_active=True).count(),
@@ -260,21 +261,13 @@ def get_user_rooms():
             user_id=current_user_id,
             is_active=True
         ).join(Room).filter(Room.is_active == True)\
+         .options(contains_eager(RoomParticipant.room))\
          .order_by(Room.last_activity.desc()).all()
         
-        rooms_data = []
-        for participation in participations:
-            room_dict = participation.room.to_dict()
+        rooms_data = RoomService.serialize_rooms([participation.room for participation in participations])
+        for participation, room_dict in zip(participations, rooms_data):
             room_dict['user_role'] = participation.role
             room_dict['joined_at'] = participation.joined_at.isoformat() if participation.joined_at else None
-            
-            # Add owner info
-            owner = User.query.get(participation.room.created_by)
-            if owner:
-                room_dict['owner_name'] = owner.name
-                room_dict['owner_picture'] = owner.picture
-            
-            rooms_data.append(room_dict)
         
         return jsonify({'rooms': rooms_data}), 200
         
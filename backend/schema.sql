@@ -3,7 +3,11 @@
 
 -- Drop existing tables if they exist (for development)
 DROP TABLE IF EXISTS executions;
+DROP TABLE IF EXISTS test_suites;
+DROP TABLE IF EXISTS blobs;
+DROP TABLE IF EXISTS message_archive_segments;
 DROP TABLE IF EXISTS messages;
+DROP TABLE IF EXISTS room_stats;
 DROP TABLE IF EXISTS room_participants;
 DROP TABLE IF EXISTS rooms;
 DROP TABLE IF EXISTS users;
@@ -50,6 +54,7 @@ CREATE TABLE rooms (
     password VARCHAR(255), -- Hashed if private
     max_participants INT DEFAULT 10 NOT NULL,
     language VARCHAR(50) DEFAULT 'javascript' NOT NULL,
+    auto_run BOOLEAN DEFAULT FALSE NOT NULL, -- Run the document when edits pause
     
     -- Room Status
     is_active BOOLEAN DEFAULT TRUE NOT NULL,
@@ -67,6 +72,9 @@ CREATE TABLE rooms (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP NOT NULL,
     last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     
+    -- Sequence number of the room's latest message; unread counts are measured against it
+    message_seq BIGINT DEFAULT 0 NOT NULL,
+    
     FOREIGN KEY (created_by) REFERENCES users(id),
     INDEX idx_created_by (created_by),
     INDEX idx_name (name),
@@ -97,6 +105,9 @@ CREATE TABLE room_participants (
     left_at TIMESTAMP NULL,
     last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     
+    -- Room message_seq read up to
+    last_read_seq BIGINT DEFAULT 0 NOT NULL,
+    
     FOREIGN KEY (room_id) REFERENCES rooms(id),
     FOREIGN KEY (user_id) REFERENCES users(id),
     INDEX idx_room_id (room_id),
@@ -104,6 +115,19 @@ CREATE TABLE room_participants (
     INDEX idx_room_user_active (room_id, user_id, is_active)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- Running per-room totals, updated in the same transaction as the rows they count;
+-- messages include archived ones. `flask reconcile-room-stats` recounts them
+CREATE TABLE room_stats (
+    room_id VARCHAR(36) PRIMARY KEY,
+    participants_ever INT DEFAULT 0 NOT NULL,
+    executions INT DEFAULT 0 NOT NULL,
+    successful_executions INT DEFAULT 0 NOT NULL, -- status 'completed'
+    messages INT DEFAULT 0 NOT NULL,
+    reconciled_at TIMESTAMP NULL,
+    
+    FOREIGN KEY (room_id) REFERENCES rooms(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
 -- Chat messages
 CREATE TABLE messages (
     id VARCHAR(36) PRIMARY KEY,
@@ -119,9 +143,17 @@ CREATE TABLE messages (
     -- Message Features
     is_edited BOOLEAN DEFAULT FALSE NOT NULL,
     reply_to VARCHAR(36), -- For threaded replies
+    thread_root_id VARCHAR(36), -- Top-level message of the reply's thread
+    reply_count INT DEFAULT 0 NOT NULL, -- Replies anywhere in this message's thread
+    client_msg_id VARCHAR(64), -- Sender-chosen id that makes resends idempotent
+    seq BIGINT, -- Position in the room, assigned when the message is committed
+    
+    -- Author snapshot, kept in step with the user's profile
+    author_name VARCHAR(255),
+    author_picture VARCHAR(500),
     
     -- Timestamps
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    created_at TIMESTAMP(6) DEFAULT CURRENT_TIMESTAMP(6) NOT NULL, -- microseconds, for keyset cursors
     edited_at TIMESTAMP NULL,
     
     FOREIGN KEY (room_id) REFERENCES rooms(id),
@@ -129,7 +161,65 @@ CREATE TABLE messages (
     FOREIGN KEY (reply_to) REFERENCES messages(id),
     INDEX idx_room_id (room_id),
     INDEX idx_user_id (user_id),
-    INDEX idx_created_at (created_at)
+    INDEX idx_created_at (created_at),
+    INDEX idx_messages_room_created_id (room_id, created_at, id),
+    INDEX idx_messages_thread (thread_root_id, created_at),
+    UNIQUE KEY uq_messages_client_msg_id (room_id, user_id, client_msg_id),
+    FULLTEXT INDEX ft_messages_content (content)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Archived chat history, compressed per room
+CREATE TABLE message_archive_segments (
+    id VARCHAR(36) PRIMARY KEY,
+    room_id VARCHAR(36) NOT NULL,
+    
+    -- Key range covered, in (created_at, id) order
+    first_created_at TIMESTAMP(6) NOT NULL,
+    first_id VARCHAR(36) NOT NULL,
+    last_created_at TIMESTAMP(6) NOT NULL,
+    last_id VARCHAR(36) NOT NULL,
+    
+    message_count INT NOT NULL,
+    data LONGBLOB NOT NULL, -- zlib-compressed JSON array of messages
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    
+    FOREIGN KEY (room_id) REFERENCES rooms(id) ON DELETE CASCADE,
+    INDEX idx_archive_room_last (room_id, last_created_at, last_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Deduplicated sources and outputs, addressed by the sha256 of their text
+CREATE TABLE blobs (
+    hash CHAR(64) PRIMARY KEY,
+    data LONGBLOB NOT NULL,
+    compressed BOOLEAN DEFAULT FALSE NOT NULL, -- zlib, for texts over the compression threshold
+    size INT NOT NULL, -- uncompressed bytes
+    ref_count INT DEFAULT 0 NOT NULL, -- executions referencing this blob; 0 means collectable
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    
+    INDEX idx_ref_count (ref_count)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Test suites for judging submissions against a problem
+CREATE TABLE test_suites (
+    id VARCHAR(36) PRIMARY KEY,
+    
+    -- Foreign Keys
+    room_id VARCHAR(36) NOT NULL,
+    created_by VARCHAR(36) NOT NULL,
+    
+    -- Problem Details
+    name VARCHAR(255) NOT NULL,
+    cases JSON NOT NULL, -- [{input, expected_output}]
+    comparison VARCHAR(20) DEFAULT 'exact' NOT NULL, -- exact, whitespace, float
+    float_tolerance DOUBLE DEFAULT 0.000001 NOT NULL,
+    
+    -- Timestamps
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP NOT NULL,
+    
+    FOREIGN KEY (room_id) REFERENCES rooms(id) ON DELETE CASCADE,
+    FOREIGN KEY (created_by) REFERENCES users(id),
+    INDEX idx_room_id (room_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Code executions for tracking runs via Judge0
@@ -142,23 +232,28 @@ CREATE TABLE executions (
     
     -- Execution Details
     language VARCHAR(50) NOT NULL,
-    source_code LONGTEXT NOT NULL,
-    input_data TEXT,
+    source_code_hash CHAR(64) NOT NULL, -- blobs.hash
+    input_data_hash CHAR(64),
     
     -- Judge0 Integration
     judge0_token VARCHAR(100), -- Judge0 submission token
     judge0_status VARCHAR(50), -- Judge0 status
     
+    -- Judging
+    mode VARCHAR(20) DEFAULT 'run' NOT NULL, -- run, judge, interactive
+    test_suite_id VARCHAR(36),
+    verdicts JSON, -- per-case verdict summary for judge runs
+    
     -- Results
-    output TEXT,
-    error_output TEXT,
-    compile_output TEXT,
+    output_hash CHAR(64),
+    error_output_hash CHAR(64),
+    compile_output_hash CHAR(64),
     exit_code INT,
     execution_time DECIMAL(10,6), -- in seconds
     memory_usage INT, -- in KB
     
     -- Status
-    status VARCHAR(20) DEFAULT 'pending' NOT NULL, -- pending, running, completed, failed
+    status VARCHAR(20) DEFAULT 'pending' NOT NULL, -- pending, queued, submitted, running, completed, failed, cancelled
     
     -- Timestamps
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
@@ -167,11 +262,19 @@ CREATE TABLE executions (
     
     FOREIGN KEY (room_id) REFERENCES rooms(id),
     FOREIGN KEY (user_id) REFERENCES users(id),
+    FOREIGN KEY (test_suite_id) REFERENCES test_suites(id),
+    FOREIGN KEY (source_code_hash) REFERENCES blobs(hash),
+    FOREIGN KEY (input_data_hash) REFERENCES blobs(hash),
+    FOREIGN KEY (output_hash) REFERENCES blobs(hash),
+    FOREIGN KEY (error_output_hash) REFERENCES blobs(hash),
+    FOREIGN KEY (compile_output_hash) REFERENCES blobs(hash),
     INDEX idx_room_id (room_id),
     INDEX idx_user_id (user_id),
     INDEX idx_created_at (created_at),
+    INDEX idx_test_suite_id (test_suite_id),
     INDEX idx_judge0_token (judge0_token),
-    INDEX idx_status (status)
+    INDEX idx_status (status),
+    INDEX idx_executions_room_created_id (room_id, created_at, id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Create some views for common queries
@@ -0,0 +1,74 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from flask import current_app
+from typing import Any, Callable, Dict, Optional, Tuple
+
+Sent = Tuple[Dict[str, Any], Future]  # the broadcast message and its storage Future
+
+class ClientMessageIndex:
+    """Recently sent messages by the id their client gave them
+
+    A client that lost an ack resends the message under the same
+    `client_msg_id`; the index hands back the original instead of writing
+    and broadcasting a copy. Ids are scoped to room and sender and remembered
+    for `ttl` seconds; later resends are found in the database, and the
+    unique constraint on messages catches any that race their original.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+
+        self._sent = OrderedDict()  # (room_id, user_id, client_msg_id) -> (expires, Sent), oldest first
+        self._lock = threading.Lock()
+
+    def get(self, room_id: str, user_id: str, client_msg_id: str) -> Optional[Sent]:
+        """The message already sent under this id, if it is still remembered"""
+        with self._lock:
+            self._expire()
+            entry = self._sent.get((room_id, user_id, client_msg_id))
+            return entry[1] if entry else None
+
+    def claim(self, room_id: str, user_id: str, client_msg_id: str,
+              send: Callable[[], Sent]) -> Tuple[Dict[str, Any], Future, bool]:
+        """Send a message unless one with this id was sent already; returns (message, Future, duplicate)"""
+        key = (room_id, user_id, client_msg_id)
+        with self._lock:
+            self._expire()
+            entry = self._sent.get(key)
+            if entry:
+                return entry[1][0], entry[1][1], True
+
+            # Sending (in-memory only) under the lock makes racing resends produce one message
+            message, stored = send()
+            self._sent[key] = (time.monotonic() + self.ttl, (message, stored))
+
+        def forget_if_lost(future):
+            if future.exception():
+                with self._lock:
+                    entry = self._sent.get(key)
+                    if entry and entry[1][1] is future:
+                        del self._sent[key]  # let the client's next resend try again
+        stored.add_done_callback(forget_if_lost)
+        return message, stored, False
+
+    def _expire(self):
+        """Drop ids older than ttl; caller holds the lock"""
+        now = time.monotonic()
+        while self._sent:
+            key, (expires, _) = next(iter(self._sent.items()))
+            if expires > now:
+                break
+            del self._sent[key]
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_client_message_index() -> ClientMessageIndex:
+    """Return the process-wide client message id index, creating it on first use"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = ClientMessageIndex(current_app.config['CLIENT_MSG_ID_TTL'])
+    return _index
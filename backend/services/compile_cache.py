@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+META_FILENAME = 'meta.json'
+ARTIFACTS_DIRNAME = 'artifacts'
+
+class CompiledBuild:
+    """A cached compilation: artifacts directory plus compiler output"""
+
+    def __init__(self, key: str, path: str, meta: Dict[str, Any]):
+        self.key = key
+        self.artifacts = os.path.join(path, ARTIFACTS_DIRNAME)
+        self.success = meta['success']
+        self.compile_output = meta['compile_output']
+        self.exit_code = meta.get('exit_code')
+
+class CompileCache:
+    """Size-bounded on-disk LRU of compiled artifacts, keyed by language, toolchain and source"""
+
+    def __init__(self, root: str, max_bytes: int, logger):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.logger = logger
+
+        self._entries = OrderedDict()  # key -> size in bytes, least recently used first
+        self._total = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(root, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def make_key(language: str, toolchain_version: str, source: bytes) -> str:
+        digest = hashlib.sha256()
+        for part in (language.encode('utf-8'), toolchain_version.encode('utf-8'), source):
+            digest.update(len(part).to_bytes(8, 'big'))
+            digest.update(part)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[CompiledBuild]:
+        """Look up a build, marking it as recently used"""
+        path = os.path.join(self.root, key)
+        try:
+            with open(os.path.join(path, META_FILENAME)) as f:
+                meta = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+
+        return CompiledBuild(key, path, meta)
+
+    def put(self, key: str, build_dir: str, exclude: str, success: bool,
+            compile_output: str, exit_code: Optional[int]) -> CompiledBuild:
+        """Store a build directory's artifacts (everything except `exclude`) under a key"""
+        staging = tempfile.mkdtemp(prefix='.staging-', dir=self.root)
+        try:
+            artifacts = os.path.join(staging, ARTIFACTS_DIRNAME)
+            if success:
+                shutil.copytree(build_dir, artifacts, ignore=shutil.ignore_patterns(exclude, '.*'))
+            else:
+                os.mkdir(artifacts)
+
+            meta = {'success': success, 'compile_output': compile_output, 'exit_code': exit_code}
+            with open(os.path.join(staging, META_FILENAME), 'w') as f:
+                json.dump(meta, f)
+
+            size = self._directory_size(staging)
+            path = os.path.join(self.root, key)
+            try:
+                os.rename(staging, path)
+            except OSError:
+                # Another worker stored the same build first
+                shutil.rmtree(staging, ignore_errors=True)
+                return self.get(key) or CompiledBuild(key, path, meta)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        with self._lock:
+            self._entries[key] = size
+            self._total += size
+            self._evict()
+
+        return CompiledBuild(key, path, meta)
+
+    def _evict(self):
+        """Drop least recently used builds until the cache fits its budget"""
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total -= size
+            shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+            self.logger.info(f"Evicted compile cache entry {key}")
+
+    def _load_index(self):
+        """Rebuild the LRU order from entry modification times"""
+        entries = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.startswith('.staging-'):
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            if os.path.isdir(path):
+                entries.append((os.path.getmtime(path), name, self._directory_size(path)))
+
+        for _, name, size in sorted(entries):
+            self._entries[name] = size
+            self._total += size
+
+        with self._lock:
+            self._evict()
+
+    @staticmethod
+    def _directory_size(path: str) -> int:
+        total = 0
+        for dirpath, _, filenames in os.walk(path):
+            for filename in filenames:
+                try:
+                    total += os.path.getsize(os.path.join(dirpath, filename))
+                except OSError:
+                    pass
+        return total
@@ -0,0 +1,268 @@
+import heapq
+import itertools
+import math
+import threading
+import time
+from flask import current_app
+from typing import Callable, Dict, Optional
+
+PRIORITY_INTERACTIVE = 'interactive'
+PRIORITY_BATCH = 'batch'
+
+# Lower runs first; batch judging only gets workers nothing interactive wants
+PRIORITY_ORDER = {PRIORITY_INTERACTIVE: 0, PRIORITY_BATCH: 1}
+
+class SchedulerOverloaded(Exception):
+    """Raised when a job is refused by admission control"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class Job:
+    """A queued execution and its fair-queuing tag"""
+
+    def __init__(self, job_id: str, room_id: str, user_id: str, fn: Callable[[], None], priority: str, slots: int):
+        self.job_id = job_id
+        self.room_id = room_id
+        self.user_id = user_id
+        self.fn = fn
+        self.priority = priority
+        self.slots = slots
+        self.enqueued_at = time.monotonic()
+        self.start_tag = 0.0
+        self.finish_tag = 0.0
+        self.cancelled = False
+
+class ExecutionScheduler:
+    """Weighted fair queuing of executions across rooms and users
+
+    Every (room, user) pair is a flow. A flow's weight is its room's share
+    split evenly between the room's active flows, so each room gets an equal
+    share of the workers and users share their room's portion. Jobs are
+    dispatched in virtual finish-time order, interactive before batch, while
+    respecting a per-room concurrency cap.
+
+    `workers` is also the number of runs that may execute at once. A job
+    that runs several in parallel (a judge run's test cases) holds that many
+    slots, so it waits until they are all free; worker threads it leaves
+    idle meanwhile pick up nothing that would exceed the cap.
+    """
+
+    def __init__(self, workers: int, room_concurrency: int, max_queued_per_user: int,
+                 max_queue_wait: float, logger):
+        self.workers = workers
+        self.room_concurrency = room_concurrency
+        self.max_queued_per_user = max_queued_per_user
+        self.max_queue_wait = max_queue_wait
+        self.logger = logger
+
+        self._queues = {priority: [] for priority in PRIORITY_ORDER}  # heaps of (tag, seq, job)
+        self._jobs = {}  # job_id -> queued Job
+        self._flow_finish = {}  # (room_id, user_id) -> last virtual finish tag
+        self._flow_queued = {}  # (room_id, user_id) -> queued job count
+        self._user_queued = {}  # user_id -> queued job count
+        self._room_running = {}  # room_id -> running job count
+        self._busy_slots = 0  # slots held by running jobs, at most `workers`
+        self._virtual_time = 0.0
+        self._service_time = 1.0  # moving average of seconds per job
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+        for index in range(workers):
+            thread = threading.Thread(target=self._worker_loop, name=f'execution-worker-{index}')
+            thread.daemon = True
+            thread.start()
+
+    def check_admission(self, user_id: str, priority: str = PRIORITY_INTERACTIVE):
+        """Raise SchedulerOverloaded if a new job for this user would be refused"""
+        with self._condition:
+            if self._user_queued.get(user_id, 0) >= self.max_queued_per_user:
+                raise SchedulerOverloaded(
+                    'Too many queued executions, wait for your previous runs to finish',
+                    retry_after=max(1, math.ceil(self._service_time))
+                )
+
+            wait = self._estimated_wait(priority)
+            if wait > self.max_queue_wait:
+                raise SchedulerOverloaded(
+                    'Execution queue is full, try again shortly',
+                    retry_after=max(1, math.ceil(wait - self.max_queue_wait))
+                )
+
+    def submit(self, job_id: str, room_id: str, user_id: str, fn: Callable[[], None],
+               priority: str = PRIORITY_INTERACTIVE, slots: int = 1):
+        """Queue a job; `fn` runs on a scheduler worker thread and may start up to `slots` runs at once"""
+        job = Job(job_id, room_id, user_id, fn, priority, max(1, min(slots, self.workers)))
+        flow = (room_id, user_id)
+
+        with self._condition:
+            # Start-time fair queuing: a flow's next job starts no earlier than
+            # the current virtual time or its previous job's finish
+            job.start_tag = max(self._virtual_time, self._flow_finish.get(flow, 0.0))
+            job.finish_tag = job.start_tag + 1.0 / self._flow_weight(room_id, user_id)
+            self._flow_finish[flow] = job.finish_tag
+
+            self._flow_queued[flow] = self._flow_queued.get(flow, 0) + 1
+            self._user_queued[user_id] = self._user_queued.get(user_id, 0) + 1
+            self._jobs[job_id] = job
+
+            heapq.heappush(self._queues[priority], (job.finish_tag, next(self._sequence), job))
+            self._condition.notify()
+
+    def cancel(self, job_id: str) -> bool:
+        """Drop a queued job; False if it already started or is unknown"""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+
+            # The heap entry is skipped lazily when it reaches the top
+            job.cancelled = True
+            self._dequeued(job)
+            return True
+
+    def stats(self) -> Dict[str, float]:
+        with self._condition:
+            return {
+                'queued': len(self._jobs),
+                'running': sum(self._room_running.values()),
+                'busy_slots': self._busy_slots,
+                'workers': self.workers,
+                'average_service_time': round(self._service_time, 3),
+                'estimated_wait': round(self._estimated_wait(PRIORITY_INTERACTIVE), 3)
+            }
+
+    def _flow_weight(self, room_id: str, user_id: str) -> float:
+        """Equal share per room, split between the room's flows with queued work"""
+        room_flows = {user for (room, user), count in self._flow_queued.items() if room == room_id and count > 0}
+        room_flows.add(user_id)
+        return 1.0 / len(room_flows)
+
+    def _estimated_wait(self, priority: str) -> float:
+        """Queue wait a new job of this priority would see; caller holds the lock
+
+        Only jobs that could take a free worker now count: jobs held back by
+        their room's concurrency cap wait on their own room, not on the pool,
+        so one room's backlog never refuses work in the others.
+        """
+        room_slots = {}  # room_id -> jobs the room may still start
+        ahead = 0
+        oldest = None
+        for job in sorted(self._jobs.values(), key=lambda job: job.enqueued_at):
+            if PRIORITY_ORDER[job.priority] > PRIORITY_ORDER[priority]:
+                continue
+            slots = room_slots.setdefault(job.room_id, self.room_concurrency - self._room_running.get(job.room_id, 0))
+            if slots <= 0:
+                continue
+            room_slots[job.room_id] = slots - 1
+            ahead += job.slots
+            if oldest is None:
+                oldest = job.enqueued_at
+        estimate = ahead * self._service_time / self.workers
+
+        # Head-of-line waits are the ground truth once the queue is backed up
+        if oldest is not None:
+            estimate = max(estimate, time.monotonic() - oldest)
+
+        return estimate
+
+    def _next_job(self) -> Optional[Job]:
+        """Pop the dispatchable job with the smallest tag; caller holds the lock
+
+        A job waiting for enough free slots holds back its own and lower
+        priorities, so a steady stream of single runs can't starve it.
+        """
+        for priority in sorted(PRIORITY_ORDER, key=PRIORITY_ORDER.get):
+            queue = self._queues[priority]
+            skipped = []
+            job = None
+            waiting = False  # the next job here needs more slots than are free
+
+            while queue:
+                entry = heapq.heappop(queue)
+                candidate = entry[2]
+                if candidate.cancelled:
+                    continue
+                if self._room_running.get(candidate.room_id, 0) >= self.room_concurrency:
+                    skipped.append(entry)
+                    continue
+                if self._busy_slots + candidate.slots > self.workers:
+                    skipped.append(entry)
+                    waiting = True
+                    break
+                job = candidate
+                break
+
+            for entry in skipped:
+                heapq.heappush(queue, entry)
+
+            if job or waiting:
+                return job
+        return None
+
+    def _dequeued(self, job: Job):
+        """Drop a job from the queued bookkeeping; caller holds the lock"""
+        self._jobs.pop(job.job_id, None)
+
+        flow = (job.room_id, job.user_id)
+        self._flow_queued[flow] -= 1
+        if self._flow_queued[flow] <= 0:
+            del self._flow_queued[flow]
+
+        self._user_queued[job.user_id] -= 1
+        if self._user_queued[job.user_id] <= 0:
+            del self._user_queued[job.user_id]
+
+        if not self._jobs:
+            # Idle: forget old flows so virtual time doesn't grow without bound
+            self._flow_finish.clear()
+            self._virtual_time = 0.0
+
+    def _worker_loop(self):
+        while True:
+            with self._condition:
+                job = self._next_job()
+                while job is None:
+                    self._condition.wait()
+                    job = self._next_job()
+
+                self._dequeued(job)
+                self._virtual_time = max(self._virtual_time, job.start_tag)
+                self._room_running[job.room_id] = self._room_running.get(job.room_id, 0) + 1
+                self._busy_slots += job.slots
+
+            started = time.monotonic()
+            try:
+                job.fn()
+            except Exception as e:
+                self.logger.error(f"Scheduled execution {job.job_id} failed: {str(e)}")
+            finally:
+                elapsed = time.monotonic() - started
+
+                with self._condition:
+                    self._service_time = 0.8 * self._service_time + 0.2 * elapsed
+                    self._busy_slots -= job.slots
+                    self._room_running[job.room_id] -= 1
+                    if self._room_running[job.room_id] <= 0:
+                        del self._room_running[job.room_id]
+                    # Freed slots may unblock jobs other workers skipped
+                    self._condition.notify_all()
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_execution_scheduler() -> ExecutionScheduler:
+    """Return the process-wide execution scheduler, creating it on first use"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            app = current_app._get_current_object()
+            _scheduler = ExecutionScheduler(
+                app.config['EXECUTION_WORKERS'],
+                app.config['EXECUTION_ROOM_CONCURRENCY'],
+                app.config['EXECUTION_MAX_QUEUED_PER_USER'],
+                app.config['EXECUTION_QUEUE_WAIT_SLO'],
+                app.logger
+            )
+    return _scheduler
@@ -0,0 +1,414 @@
+from flask import current_app
+from contextlib import contextmanager
+from datetime import datetime
+from typing import BinaryIO, Dict, Any, Iterator, Optional
+import functools
+import os
+import threading
+import requests
+
+from sqlalchemy.orm import undefer_group
+from models import db, Execution, Room
+from config import JUDGE0_LANGUAGE_MAP
+from services.local_executor import LocalExecutor, CancelToken, ExecutionCancelled, get_local_executor
+from services.execution_scheduler import get_execution_scheduler, PRIORITY_INTERACTIVE, SchedulerOverloaded
+from services.output_streamer import OutputStreamer
+
+# Judge0 status ids for finished submissions
+JUDGE0_FINISHED_STATUSES = [3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14]
+
+# Execution statuses that can still be cancelled
+ACTIVE_STATUSES = ['pending', 'queued', 'submitted', 'running']
+
+# Statuses a run's result may be recorded over
+RUNNING_STATUSES = ['submitted', 'running']
+
+_cancel_tokens = {}  # execution_id -> CancelToken of a run in progress
+_cancel_tokens_lock = threading.Lock()
+
+_auto_run_timers = {}  # (room_id, user_id) -> pending debounce Timer
+_auto_run_timers_lock = threading.Lock()
+
+_input_files = {}  # execution_id -> open uploaded stdin file waiting for its run
+_input_files_lock = threading.Lock()
+
+class ExecutionService:
+    """Service for running code executions"""
+
+    @staticmethod
+    def uses_local_executor(language: str) -> bool:
+        """Check if a language should run on the local executor instead of Judge0"""
+        return (
+            current_app.config['EXECUTION_BACKEND'] == 'local' and
+            LocalExecutor.supports(language)
+        )
+
+    @staticmethod
+    def judge0_headers() -> Dict[str, str]:
+        """Headers for Judge0 API requests"""
+        return {
+            'X-RapidAPI-Host': current_app.config['JUDGE0_API_HOST'],
+            'X-RapidAPI-Key': current_app.config['JUDGE0_API_KEY'],
+            'Content-Type': 'application/json'
+        }
+
+    @staticmethod
+    def submit_to_judge0(execution: Execution) -> Optional[str]:
+        """Submit an execution to Judge0; returns an error message on failure"""
+        try:
+            response = requests.post(
+                f"{current_app.config['JUDGE0_API_URL']}/submissions",
+                headers=ExecutionService.judge0_headers(),
+                json={
+                    'source_code': execution.source_code,
+                    'language_id': JUDGE0_LANGUAGE_MAP[execution.language],
+                    'stdin': execution.input_data or ''
+                },
+                timeout=10
+            )
+
+            if response.status_code == 201:
+                execution.judge0_token = response.json().get('token')
+                execution.status = 'submitted'
+                execution.started_at = datetime.utcnow()
+                db.session.commit()
+                return None
+
+            execution.status = 'failed'
+            execution.error_output = f"Judge0 API error: {response.status_code}"
+            db.session.commit()
+            return 'Failed to submit to Judge0'
+
+        except requests.RequestException as e:
+            execution.status = 'failed'
+            execution.error_output = f"Network error: {str(e)}"
+            db.session.commit()
+            return 'Failed to connect to Judge0'
+
+    @staticmethod
+    def apply_result(execution: Execution, result: Dict[str, Any]):
+        """Copy a Judge0-shaped result onto an execution"""
+        execution.judge0_status = result.get('status', {}).get('description', 'Unknown')
+        execution.output = result.get('stdout', '')
+        execution.error_output = result.get('stderr', '')
+        execution.compile_output = result.get('compile_output', '')
+        execution.execution_time = result.get('time')
+        execution.memory_usage = result.get('memory')
+        execution.exit_code = result.get('exit_code')
+
+        # Check if execution is finished
+        status_id = result.get('status', {}).get('id', 0)
+        if status_id in JUDGE0_FINISHED_STATUSES:
+            execution.status = 'completed'
+            execution.completed_at = datetime.utcnow()
+        else:
+            execution.status = 'running'
+
+    @staticmethod
+    def complete(execution: Execution, result: Dict[str, Any]) -> bool:
+        """Record a run's result and commit, unless the execution was cancelled first
+
+        The status is written with a conditional UPDATE, as mark_running does,
+        so a cancel() racing the end of the run either lands first (and the
+        result is dropped) or finds the execution no longer active. The rest
+        of the result goes through the ORM in the same transaction.
+        """
+        finished = result.get('status', {}).get('id', 0) in JUDGE0_FINISHED_STATUSES
+        claimed = Execution.query.filter(
+            Execution.id == execution.id,
+            Execution.status.in_(RUNNING_STATUSES)
+        ).update({'status': 'completed' if finished else 'running'}, synchronize_session=False)
+        if not claimed:
+            db.session.rollback()
+            return False
+
+        ExecutionService.apply_result(execution, result)
+        db.session.commit()
+        return True
+
+    @staticmethod
+    def check_admission(user_id: str, priority: str = PRIORITY_INTERACTIVE):
+        """Raise SchedulerOverloaded if the local executor would refuse a new run"""
+        get_execution_scheduler().check_admission(user_id, priority)
+
+    @staticmethod
+    def save_input_file(execution: Execution, upload) -> None:
+        """Keep an uploaded stdin file until the execution's local run streams it
+
+        The request has already spooled the upload to an unlinked temp file;
+        duplicating its descriptor keeps that same file alive after the
+        request closes it, instead of copying it to disk a second time.
+        """
+        stdin = os.fdopen(os.dup(upload.stream.fileno()), 'rb')
+
+        with _input_files_lock:
+            _input_files[execution.id] = stdin
+
+    @staticmethod
+    def discard_input_file(execution_id: str) -> Optional[BinaryIO]:
+        """Forget an execution's uploaded stdin file, returning it if it had one; the caller closes it"""
+        with _input_files_lock:
+            return _input_files.pop(execution_id, None)
+
+    @staticmethod
+    def run_local_async(execution: Execution, priority: str = PRIORITY_INTERACTIVE):
+        """Queue an execution on the fair-share scheduler for the local executor"""
+        app = current_app._get_current_object()
+        get_execution_scheduler().submit(
+            execution.id,
+            execution.room_id,
+            execution.user_id,
+            functools.partial(ExecutionService.run_local, app, execution.id),
+            priority
+        )
+
+    @staticmethod
+    @contextmanager
+    def cancellable(execution_id: str) -> Iterator[CancelToken]:
+        """Register a cancel token for a run in progress so cancel() can stop it"""
+        token = CancelToken()
+        with _cancel_tokens_lock:
+            _cancel_tokens[execution_id] = token
+        try:
+            yield token
+        finally:
+            with _cancel_tokens_lock:
+                if _cancel_tokens.get(execution_id) is token:
+                    del _cancel_tokens[execution_id]
+
+    @staticmethod
+    def mark_running(execution_id: str) -> Optional[Execution]:
+        """Move a queued execution to running; None if it was cancelled first"""
+        started = Execution.query.filter_by(id=execution_id, status='queued').update(
+            {'status': 'running', 'started_at': datetime.utcnow()},
+            synchronize_session=False
+        )
+        db.session.commit()
+        if not started:
+            return None
+        return Execution.query.get(execution_id)
+
+    @staticmethod
+    def run_local(app, execution_id: str):
+        """Run an execution on the local executor, streaming output to its room
+
+        Output is persisted once, when the run completes.
+        """
+        with app.app_context(), ExecutionService.cancellable(execution_id) as cancel:
+            socketio = app.extensions.get('socketio')
+            input_file = ExecutionService.discard_input_file(execution_id)
+            try:
+                execution = ExecutionService.mark_running(execution_id)
+                if not execution:
+                    return
+
+                streamer = None
+                if socketio:
+                    streamer = OutputStreamer(
+                        socketio,
+                        app.logger,
+                        execution.room_id,
+                        execution.id,
+                        app.config['EXECUTION_STREAM_MAX_BYTES'],
+                        app.config['EXECUTION_STREAM_INTERVAL']
+                    )
+
+                if input_file:
+                    input_file.seek(0)
+                stdin = input_file or execution.input_data or ''
+                try:
+                    result = get_local_executor().run(
+                        execution.language,
+                        execution.source_code,
+                        stdin,
+                        on_output=streamer.write if streamer else None,
+                        cancel=cancel
+                    )
+                finally:
+                    output_seq = streamer.close() if streamer else 0
+
+                if not ExecutionService.complete(execution, result):
+                    return  # cancel() already recorded and announced it
+
+                if socketio:
+                    socketio.emit('execution_completed', {
+                        'execution_id': execution.id,
+                        'status': execution.status,
+                        'output_seq': output_seq,
+                        'execution': execution.to_dict()
+                    }, room=execution.room_id)
+
+            except ExecutionCancelled:
+                pass  # cancel() already recorded and announced it
+
+            except Exception as e:
+                app.logger.error(f"Local execution {execution_id} failed: {str(e)}")
+                db.session.rollback()
+
+                execution = Execution.query.get(execution_id)
+                if execution and execution.status != 'cancelled':
+                    execution.status = 'failed'
+                    execution.error_output = f"Local executor error: {str(e)}"
+                    execution.completed_at = datetime.utcnow()
+                    db.session.commit()
+
+                    if socketio:
+                        socketio.emit('execution_completed', {
+                            'execution_id': execution.id,
+                            'status': execution.status,
+                            'execution': execution.to_dict()
+                        }, room=execution.room_id)
+            finally:
+                if input_file:
+                    input_file.close()
+                db.session.remove()
+
+    @staticmethod
+    def cancel(execution_id: str) -> bool:
+        """Cancel a queued or running execution; False if it already finished"""
+        cancelled = Execution.query.filter(
+            Execution.id == execution_id,
+            Execution.status.in_(ACTIVE_STATUSES)
+        ).update({'status': 'cancelled', 'completed_at': datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+        if not cancelled:
+            return False
+
+        execution = Execution.query.get(execution_id)
+
+        # Whichever of these holds the run stops it; the others are no-ops
+        if ExecutionService.uses_local_executor(execution.language):
+            if get_execution_scheduler().cancel(execution_id):
+                # The run will never start, so nothing else will clean up its input
+                input_file = ExecutionService.discard_input_file(execution_id)
+                if input_file:
+                    input_file.close()
+
+        with _cancel_tokens_lock:
+            token = _cancel_tokens.get(execution_id)
+        if token:
+            token.cancel()
+
+        if execution.judge0_token:
+            ExecutionService.delete_judge0_submission(execution.judge0_token)
+
+        socketio = current_app.extensions.get('socketio')
+        if socketio:
+            socketio.emit('execution_cancelled', {
+                'execution_id': execution.id,
+                'execution': execution.to_dict()
+            }, room=execution.room_id)
+
+        return True
+
+    @staticmethod
+    def delete_judge0_submission(token: str):
+        """Ask Judge0 to drop a submission; best effort, as not every deployment allows it"""
+        try:
+            response = requests.delete(
+                f"{current_app.config['JUDGE0_API_URL']}/submissions/{token}",
+                headers=ExecutionService.judge0_headers(),
+                params={'fields': 'token'},
+                timeout=10
+            )
+            if response.status_code not in (200, 204):
+                current_app.logger.warning(f"Judge0 refused to delete submission {token}: {response.status_code}")
+        except requests.RequestException as e:
+            current_app.logger.warning(f"Failed to delete Judge0 submission {token}: {str(e)}")
+
+    @staticmethod
+    def cancel_superseded(room_id: str, user_id: str) -> int:
+        """Cancel a user's unfinished plain runs in a room; returns how many were cancelled"""
+        superseded = Execution.query.with_entities(Execution.id).filter(
+            Execution.room_id == room_id,
+            Execution.user_id == user_id,
+            Execution.mode == 'run',
+            Execution.status.in_(ACTIVE_STATUSES)
+        ).all()
+
+        return sum(1 for (execution_id,) in superseded if ExecutionService.cancel(execution_id))
+
+    @staticmethod
+    def schedule_auto_run(room_id: str, user_id: str):
+        """(Re)start the debounce timer for a user's auto-run in a room"""
+        app = current_app._get_current_object()
+        key = (room_id, user_id)
+
+        timer = threading.Timer(app.config['AUTO_RUN_DEBOUNCE'], ExecutionService.auto_run, args=(app, room_id, user_id))
+        timer.daemon = True
+
+        with _auto_run_timers_lock:
+            previous = _auto_run_timers.get(key)
+            if previous:
+                previous.cancel()
+            _auto_run_timers[key] = timer
+        timer.start()
+
+    @staticmethod
+    def cancel_auto_run(room_id: str, user_id: str):
+        """Drop a user's pending auto-run in a room, if any"""
+        with _auto_run_timers_lock:
+            timer = _auto_run_timers.pop((room_id, user_id), None)
+        if timer:
+            timer.cancel()
+
+    @staticmethod
+    def auto_run(app, room_id: str, user_id: str):
+        """Run a room's current document once edits have paused, superseding older runs"""
+        with app.app_context():
+            with _auto_run_timers_lock:
+                if _auto_run_timers.get((room_id, user_id)) is threading.current_thread():
+                    del _auto_run_timers[(room_id, user_id)]
+
+            socketio = app.extensions.get('socketio')
+            try:
+                room = Room.query.options(undefer_group('content')).get(room_id)
+                if not room or not room.is_active or not room.auto_run:
+                    return
+
+                source_code = (room.current_content or '').strip()
+                if not source_code or len(source_code) > app.config['MAX_CODE_LENGTH']:
+                    return
+                if room.language not in JUDGE0_LANGUAGE_MAP:
+                    return
+
+                ExecutionService.cancel_superseded(room_id, user_id)
+
+                use_local_executor = ExecutionService.uses_local_executor(room.language)
+                if use_local_executor:
+                    try:
+                        ExecutionService.check_admission(user_id)
+                    except SchedulerOverloaded as e:
+                        app.logger.info(f"Auto-run for room {room_id} shed: {str(e)}")
+                        return
+
+                execution = Execution(
+                    room_id=room_id,
+                    user_id=user_id,
+                    language=room.language,
+                    source_code=source_code,
+                    status='pending'
+                )
+                db.session.add(execution)
+                db.session.commit()
+
+                if socketio:
+                    socketio.emit('execution_started', {
+                        'execution_id': execution.id,
+                        'user_id': user_id,
+                        'language': execution.language,
+                        'auto_run': True
+                    }, room=room_id)
+
+                if use_local_executor:
+                    execution.status = 'queued'
+                    db.session.commit()
+                    ExecutionService.run_local_async(execution)
+                else:
+                    ExecutionService.submit_to_judge0(execution)
+
+            except Exception as e:
+                app.logger.error(f"Auto-run for room {room_id} failed: {str(e)}")
+                db.session.rollback()
+            finally:
+                db.session.remove()
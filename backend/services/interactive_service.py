@@ -0,0 +1,136 @@
+from flask import current_app
+from datetime import datetime
+from typing import Optional
+import threading
+
+from models import db, Execution
+from services.execution_service import ExecutionService
+from services.local_executor import get_local_executor
+from services.output_streamer import OutputStreamer
+
+_sessions = {}  # execution_id -> (user_id, InteractiveProcess or None while starting, OutputStreamer or None)
+_sessions_lock = threading.Lock()
+
+class InteractiveService:
+    """Service for interactive executions whose stdin is bridged over the room's socket"""
+
+    @staticmethod
+    def start(execution: Execution) -> Optional[str]:
+        """Start an interactive session in the background; returns an error message if refused"""
+        app = current_app._get_current_object()
+
+        with _sessions_lock:
+            if len(_sessions) >= app.config['INTERACTIVE_MAX_SESSIONS']:
+                return 'Too many interactive sessions, try again later'
+
+            user_sessions = sum(1 for user_id, _, _ in _sessions.values() if user_id == execution.user_id)
+            if user_sessions >= app.config['INTERACTIVE_MAX_SESSIONS_PER_USER']:
+                return 'Stop your running interactive session first'
+
+            _sessions[execution.id] = (execution.user_id, None, None)
+
+        thread = threading.Thread(target=InteractiveService.run_session, args=(app, execution.id))
+        thread.daemon = True
+        thread.start()
+        return None
+
+    @staticmethod
+    def send_input(execution_id: str, user_id: str, data: str, eof: bool = False) -> bool:
+        """Pass input from the session's owner to its program; False if there is no such session"""
+        with _sessions_lock:
+            owner_id, process, streamer = _sessions.get(execution_id, (None, None, None))
+
+        if process is None or owner_id != user_id:
+            return False
+
+        if '\n' in data or eof:
+            # Each answered prompt gets its own live output budget
+            streamer.new_turn()
+        process.send(data, eof)
+        return True
+
+    @staticmethod
+    def run_session(app, execution_id: str):
+        """Run an interactive program until it exits, is stopped, or hits its limits"""
+        with app.app_context(), ExecutionService.cancellable(execution_id) as cancel:
+            socketio = app.extensions.get('socketio')
+            try:
+                execution = ExecutionService.mark_running(execution_id)
+                if not execution:
+                    return
+
+                streamer = OutputStreamer(
+                    socketio,
+                    app.logger,
+                    execution.room_id,
+                    execution.id,
+                    app.config['EXECUTION_STREAM_MAX_BYTES'],
+                    app.config['EXECUTION_STREAM_INTERVAL']
+                )
+
+                process, result = get_local_executor().start_interactive(
+                    execution.language,
+                    execution.source_code,
+                    streamer.write
+                )
+
+                if process:
+                    if not cancel.attach(process.worker):
+                        process.worker.kill()
+
+                    with _sessions_lock:
+                        _sessions[execution_id] = (execution.user_id, process, streamer)
+
+                    socketio.emit('interactive_started', {
+                        'execution_id': execution.id,
+                        'user_id': execution.user_id
+                    }, room=execution.room_id)
+
+                    try:
+                        result = process.wait()
+                    finally:
+                        cancel.detach(process.worker)
+                        process.worker.discard()
+
+                    execution.input_data = process.input_text()
+
+                output_seq = streamer.close()
+
+                if cancel.cancelled or not ExecutionService.complete(execution, result):
+                    # Keep the transcript, but the run stays cancelled
+                    if process:
+                        execution.input_data = process.input_text()
+                    execution.output = result.get('stdout')
+                    execution.error_output = result.get('stderr')
+                    execution.exit_code = result.get('exit_code')
+                    execution.execution_time = result.get('time')
+                    execution.memory_usage = result.get('memory')
+                    db.session.commit()
+
+                socketio.emit('execution_completed', {
+                    'execution_id': execution.id,
+                    'status': execution.status,
+                    'output_seq': output_seq,
+                    'execution': execution.to_dict()
+                }, room=execution.room_id)
+
+            except Exception as e:
+                app.logger.error(f"Interactive execution {execution_id} failed: {str(e)}")
+                db.session.rollback()
+
+                execution = Execution.query.get(execution_id)
+                if execution and execution.status != 'cancelled':
+                    execution.status = 'failed'
+                    execution.error_output = f"Local executor error: {str(e)}"
+                    execution.completed_at = datetime.utcnow()
+                    db.session.commit()
+
+                    socketio.emit('execution_completed', {
+                        'execution_id': execution.id,
+                        'status': execution.status,
+                        'execution': execution.to_dict()
+                    }, room=execution.room_id)
+            finally:
+                with _sessions_lock:
+                    _sessions.pop(execution_id, None)
+                db.session.remove()
@@ -0,0 +1,328 @@
+from flask import current_app
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, List, Optional, Tuple
+import functools
+import math
+import threading
+import time
+import requests
+
+from models import db, Execution, TestSuite
+from config import JUDGE0_LANGUAGE_MAP
+from services.execution_service import ExecutionService, JUDGE0_FINISHED_STATUSES
+from services.execution_scheduler import get_execution_scheduler, PRIORITY_BATCH
+from services.local_executor import get_local_executor, ExecutionCancelled
+
+COMPARISON_MODES = ['exact', 'whitespace', 'float']
+
+VERDICT_DESCRIPTIONS = {
+    'AC': 'Accepted',
+    'WA': 'Wrong Answer',
+    'TLE': 'Time Limit Exceeded',
+    'CE': 'Compilation Error',
+    'RE': 'Runtime Error',
+    'IE': 'Internal Error',
+    'SKIP': 'Skipped',
+}
+
+# Judge0 status ids grouped by verdict
+RUNTIME_ERROR_STATUSES = [7, 8, 9, 10, 11, 12]
+
+class JudgeService:
+    """Service for judging programs against stored test suites"""
+
+    @staticmethod
+    def outputs_match(expected: str, actual: str, comparison: str = 'exact', tolerance: float = 1e-6) -> bool:
+        """Compare program output against the expected output
+
+        exact: identical apart from trailing newlines at the very end
+        whitespace: identical token sequences
+        float: identical token sequences, numeric tokens within tolerance
+        """
+        expected = (expected or '').rstrip('\n')
+        actual = (actual or '').rstrip('\n')
+        if expected == actual:
+            return True
+        if comparison == 'exact':
+            return False
+
+        expected_tokens = expected.split()
+        actual_tokens = actual.split()
+        if len(expected_tokens) != len(actual_tokens):
+            return False
+        if comparison == 'whitespace':
+            return expected_tokens == actual_tokens
+
+        for expected_token, actual_token in zip(expected_tokens, actual_tokens):
+            if expected_token == actual_token:
+                continue
+            try:
+                expected_value = float(expected_token)
+                actual_value = float(actual_token)
+            except ValueError:
+                return False
+            if not math.isclose(actual_value, expected_value, rel_tol=tolerance, abs_tol=tolerance):
+                return False
+
+        return True
+
+    @staticmethod
+    def case_verdict(result: Dict[str, Any], case: Dict[str, Any], suite: TestSuite) -> str:
+        """Verdict for one test case from a Judge0-shaped result"""
+        status_id = (result.get('status') or {}).get('id')
+        if status_id == 6:
+            return 'CE'
+        if status_id == 5:
+            return 'TLE'
+        if status_id in RUNTIME_ERROR_STATUSES:
+            return 'RE'
+        if status_id not in (3, 4):
+            return 'IE'
+
+        matched = JudgeService.outputs_match(
+            case.get('expected_output', ''),
+            result.get('stdout'),
+            suite.comparison,
+            suite.float_tolerance
+        )
+        return 'AC' if matched else 'WA'
+
+    @staticmethod
+    def start(execution: Execution, early_exit: bool = True):
+        """Judge an execution in the background, on the local executor when possible"""
+        app = current_app._get_current_object()
+
+        if ExecutionService.uses_local_executor(execution.language):
+            scheduler = get_execution_scheduler()
+            # Each concurrent case is a run, so the judge holds one scheduler slot per case thread
+            parallelism = max(1, min(app.config['JUDGE_CASE_PARALLELISM'], len(execution.test_suite.cases), scheduler.workers))
+            scheduler.submit(
+                execution.id,
+                execution.room_id,
+                execution.user_id,
+                functools.partial(JudgeService.judge_local, app, execution.id, early_exit, parallelism),
+                PRIORITY_BATCH,
+                slots=parallelism
+            )
+        else:
+            thread = threading.Thread(target=JudgeService.judge_with_judge0, args=(app, execution.id, early_exit))
+            thread.daemon = True
+            thread.start()
+
+    @staticmethod
+    def judge_local(app, execution_id: str, early_exit: bool, parallelism: int):
+        """Run every case on the local executor, `parallelism` at a time"""
+        with app.app_context(), ExecutionService.cancellable(execution_id) as cancel:
+            try:
+                execution, suite = JudgeService._begin(execution_id)
+                if not execution:
+                    return
+
+                cases = suite.cases
+                results = [None] * len(cases)
+                stop = threading.Event()
+                executor = get_local_executor()
+
+                # Case threads have no app context, so read the row up front
+                language = execution.language
+                source_code = execution.source_code
+
+                def run_case(index):
+                    if stop.is_set():
+                        return index, None
+                    return index, executor.run(language, source_code, cases[index].get('input', ''), cancel=cancel)
+
+                with ThreadPoolExecutor(max_workers=parallelism) as pool:
+                    futures = [pool.submit(run_case, index) for index in range(len(cases))]
+
+                    for future in as_completed(futures):
+                        if future.cancelled():
+                            continue
+
+                        index, result = future.result()
+                        if result is None:
+                            continue
+
+                        verdict = JudgeService.case_verdict(result, cases[index], suite)
+                        results[index] = (verdict, result)
+
+                        if verdict != 'AC' and early_exit:
+                            stop.set()
+                            for pending in futures:
+                                pending.cancel()
+
+                JudgeService._finish(app, execution, results)
+
+            except ExecutionCancelled:
+                pass  # ExecutionService.cancel() already recorded and announced it
+
+            except Exception as e:
+                JudgeService._fail(app, execution_id, e)
+            finally:
+                db.session.remove()
+
+    @staticmethod
+    def judge_with_judge0(app, execution_id: str, early_exit: bool):
+        """Submit every case as one Judge0 batch and poll until done"""
+        with app.app_context(), ExecutionService.cancellable(execution_id) as cancel:
+            try:
+                execution, suite = JudgeService._begin(execution_id)
+                if not execution:
+                    return
+
+                cases = suite.cases
+                results = [None] * len(cases)
+                api_url = app.config['JUDGE0_API_URL']
+                headers = ExecutionService.judge0_headers()
+
+                response = requests.post(
+                    f"{api_url}/submissions/batch",
+                    headers=headers,
+                    json={'submissions': [{
+                        'source_code': execution.source_code,
+                        'language_id': JUDGE0_LANGUAGE_MAP[execution.language],
+                        'stdin': case.get('input', '')
+                    } for case in cases]},
+                    timeout=10
+                )
+                if response.status_code != 201:
+                    raise RuntimeError(f"Judge0 API error: {response.status_code}")
+
+                pending = {item['token']: index for index, item in enumerate(response.json()) if item.get('token')}
+                deadline = time.monotonic() + app.config['JUDGE0_POLL_TIMEOUT']
+
+                while pending and time.monotonic() < deadline:
+                    time.sleep(app.config['JUDGE0_POLL_INTERVAL'])
+
+                    if cancel.cancelled:
+                        for token in pending:
+                            ExecutionService.delete_judge0_submission(token)
+                        return
+
+                    response = requests.get(
+                        f"{api_url}/submissions/batch",
+                        headers=headers,
+                        params={
+                            'tokens': ','.join(pending),
+                            'fields': 'token,stdout,stderr,compile_output,time,memory,exit_code,status'
+                        },
+                        timeout=10
+                    )
+                    if response.status_code != 200:
+                        continue
+
+                    failed = False
+                    for submission in response.json().get('submissions', []):
+                        status_id = (submission.get('status') or {}).get('id', 0)
+                        if status_id not in JUDGE0_FINISHED_STATUSES:
+                            continue
+
+                        index = pending.pop(submission.get('token'), None)
+                        if index is None:
+                            continue
+
+                        verdict = JudgeService.case_verdict(submission, cases[index], suite)
+                        results[index] = (verdict, submission)
+                        failed = failed or verdict != 'AC'
+
+                    if failed and early_exit:
+                        break
+
+                # Cases skipped by early exit, or still running at the deadline, would keep using Judge0 quota
+                for token in pending:
+                    ExecutionService.delete_judge0_submission(token)
+
+                JudgeService._finish(app, execution, results)
+
+            except Exception as e:
+                JudgeService._fail(app, execution_id, e)
+            finally:
+                db.session.remove()
+
+    @staticmethod
+    def _begin(execution_id: str) -> Tuple[Optional[Execution], Optional[TestSuite]]:
+        execution = ExecutionService.mark_running(execution_id)
+        if not execution or not execution.test_suite:
+            return None, None
+
+        return execution, execution.test_suite
+
+    @staticmethod
+    def _finish(app, execution: Execution, results: List[Optional[Tuple[str, Dict[str, Any]]]]):
+        """Store a compact verdict summary instead of one row per case"""
+        cases = []
+        first_failure = None
+
+        for index, entry in enumerate(results):
+            if entry is None:
+                cases.append({'case': index, 'verdict': 'SKIP'})
+                continue
+
+            verdict, result = entry
+            cases.append({
+                'case': index,
+                'verdict': verdict,
+                'time': JudgeService._as_float(result.get('time')),
+                'memory': result.get('memory')
+            })
+            if verdict != 'AC' and first_failure is None:
+                first_failure = (index, verdict, result)
+
+        passed = sum(1 for case in cases if case['verdict'] == 'AC')
+        overall = 'AC' if passed == len(cases) else (first_failure[1] if first_failure else 'SKIP')
+
+        execution.verdicts = {
+            'verdict': overall,
+            'passed': passed,
+            'total': len(cases),
+            'failed_case': first_failure[0] if first_failure else None,
+            'cases': cases
+        }
+        execution.judge0_status = VERDICT_DESCRIPTIONS[overall]
+        execution.execution_time = max((case.get('time') or 0 for case in cases), default=0)
+        execution.memory_usage = max((case.get('memory') or 0 for case in cases), default=0)
+
+        # Keep the output of the first failing case for debugging
+        if first_failure:
+            result = first_failure[2]
+            execution.output = result.get('stdout')
+            execution.error_output = result.get('stderr')
+            execution.compile_output = result.get('compile_output')
+            execution.exit_code = result.get('exit_code')
+
+        execution.status = 'completed'
+        execution.completed_at = datetime.utcnow()
+        db.session.commit()
+
+        JudgeService._notify(app, execution)
+
+    @staticmethod
+    def _fail(app, execution_id: str, error: Exception):
+        app.logger.error(f"Judging execution {execution_id} failed: {str(error)}")
+        db.session.rollback()
+
+        execution = Execution.query.get(execution_id)
+        if execution and execution.status != 'cancelled':
+            execution.status = 'failed'
+            execution.error_output = f"Judge error: {str(error)}"
+            execution.completed_at = datetime.utcnow()
+            db.session.commit()
+            JudgeService._notify(app, execution)
+
+    @staticmethod
+    def _notify(app, execution: Execution):
+        socketio = app.extensions.get('socketio')
+        if socketio:
+            socketio.emit('execution_completed', {
+                'execution_id': execution.id,
+                'status': execution.status,
+                'execution': execution.to_dict()
+            }, room=execution.room_id)
+
+    @staticmethod
+    def _as_float(value) -> Optional[float]:
+        try:
+            return float(value) if value is not None else None
+        except (TypeError, ValueError):
+            return None
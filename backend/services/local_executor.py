@@ -0,0 +1,738 @@
+import functools
+import os
+import pty
+import queue
+import resource
+import select
+import shutil
+import signal
+import subprocess
+import tempfile
+import termios
+import threading
+import time
+from flask import current_app
+from typing import Optional, Dict, Any, List, Callable, Tuple, Union, BinaryIO
+
+from config import LOCAL_INTERPRETERS, LOCAL_COMPILERS
+from services.compile_cache import CompileCache, CompiledBuild
+
+# Judge0-compatible statuses, so local results are stored exactly like Judge0 ones
+STATUS_ACCEPTED = {'id': 3, 'description': 'Accepted'}
+STATUS_TIME_LIMIT_EXCEEDED = {'id': 5, 'description': 'Time Limit Exceeded'}
+STATUS_COMPILATION_ERROR = {'id': 6, 'description': 'Compilation Error'}
+STATUS_RUNTIME_ERROR = {'id': 11, 'description': 'Runtime Error (NZEC)'}
+STATUS_RUNTIME_ERROR_OTHER = {'id': 12, 'description': 'Runtime Error (Other)'}
+STATUS_INTERNAL_ERROR = {'id': 13, 'description': 'Internal Error'}
+
+SIGNAL_STATUSES = {
+    signal.SIGSEGV: {'id': 7, 'description': 'Runtime Error (SIGSEGV)'},
+    signal.SIGXFSZ: {'id': 8, 'description': 'Runtime Error (SIGXFSZ)'},
+    signal.SIGFPE: {'id': 9, 'description': 'Runtime Error (SIGFPE)'},
+    signal.SIGABRT: {'id': 10, 'description': 'Runtime Error (SIGABRT)'},
+}
+
+# Byte a warm worker writes once its interpreter has finished starting up
+READY_BYTE = b'\x06'
+
+# Bootstraps for pre-forked workers. Each one signals readiness, then reads
+# "<source length>\n<source>" from stdin and runs it, leaving the rest of
+# stdin untouched for the program itself.
+WARM_BOOTSTRAPS = {
+    'python': r'''
+import sys
+sys.stdout.buffer.write(b'\x06')
+sys.stdout.buffer.flush()
+_size = int(sys.stdin.buffer.readline())
+try:
+    _code = compile(sys.stdin.buffer.read(_size), 'main.py', 'exec')
+    exec(_code, {'__name__': '__main__', '__builtins__': __builtins__})
+except SystemExit:
+    raise
+except BaseException as e:
+    import traceback
+    traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+    sys.exit(1)
+''',
+    'javascript': r'''
+const fs = require('fs');
+fs.writeSync(1, '\x06');
+const one = Buffer.alloc(1);
+let header = '';
+while (fs.readSync(0, one, 0, 1, null) === 1 && one[0] !== 10) header += String.fromCharCode(one[0]);
+const size = parseInt(header, 10) || 0;
+const source = Buffer.alloc(size);
+for (let read = 0, n; read < size; read += n) {
+    n = fs.readSync(0, source, read, size - read, null);
+    if (n === 0) break;
+}
+const Module = require('module');
+const main = new Module('main.js', null);
+main.filename = require('path').resolve('main.js');
+main.paths = Module._nodeModulePaths(process.cwd());
+main._compile(source.toString('utf8'), main.filename);
+''',
+}
+
+WARM_BOOTSTRAP_FLAGS = {
+    'python': '-c',
+    'javascript': '-e',
+}
+
+class Worker:
+    """A spawned interpreter process and its private working directory"""
+
+    def __init__(self, process: subprocess.Popen, workdir: str, warm: bool):
+        self.process = process
+        self.workdir = workdir
+        self.warm = warm
+
+    def kill(self):
+        """Kill the worker's whole process group"""
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def discard(self):
+        """Kill the worker and remove its working directory"""
+        self.kill()
+        try:
+            self.process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            pass
+        for pipe in (self.process.stdin, self.process.stdout, self.process.stderr):
+            if pipe:
+                pipe.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+class ExecutionCancelled(Exception):
+    """Raised by LocalExecutor.run when its run was cancelled"""
+
+class CancelToken:
+    """Lets another thread stop a run, killing any workers it has started"""
+
+    def __init__(self):
+        self.cancelled = False
+        self._workers = set()
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            workers = list(self._workers)
+        for worker in workers:
+            worker.kill()
+
+    def attach(self, worker: Worker) -> bool:
+        """Track a started worker; False if the run was already cancelled"""
+        with self._lock:
+            if self.cancelled:
+                return False
+            self._workers.add(worker)
+            return True
+
+    def detach(self, worker: Worker):
+        with self._lock:
+            self._workers.discard(worker)
+
+class OutputCapture:
+    """Drains a pipe, keeping at most `limit` bytes and optionally forwarding each chunk"""
+
+    def __init__(self, limit: int, on_chunk: Optional[Callable[[bytes], None]] = None):
+        self.limit = limit
+        self.on_chunk = on_chunk
+        self.chunks = []
+        self.size = 0
+        self.truncated = False
+
+    def drain(self, pipe):
+        fd = pipe.fileno()
+        while True:
+            try:
+                chunk = os.read(fd, 65536)
+            except OSError:
+                break  # A pty reports EIO once the program has closed it
+            if not chunk:
+                break
+
+            if self.on_chunk:
+                self.on_chunk(chunk)
+
+            remaining = self.limit - self.size
+            if remaining <= 0:
+                self.truncated = True
+                continue
+            if len(chunk) > remaining:
+                chunk = chunk[:remaining]
+                self.truncated = True
+
+            self.chunks.append(chunk)
+            self.size += len(chunk)
+
+    def text(self) -> str:
+        data = b''.join(self.chunks).decode('utf-8', errors='replace')
+        if self.truncated:
+            data += '\n[output truncated]'
+        return data
+
+class InteractiveProcess:
+    """A long-lived program whose stdin is fed line by line while it runs
+
+    Stdout is a pty so the program's runtime line-buffers it, and output
+    reaches the caller as soon as each line (or prompt) is written.
+    """
+
+    def __init__(self, worker: Worker, master_fd: int, max_output: int, idle_timeout: float,
+                 max_duration: float, on_output: Callable[[str, bytes], None]):
+        self.worker = worker
+        self.idle_timeout = idle_timeout
+        self.max_duration = max_duration
+        self.on_output = on_output
+        self.last_activity = time.monotonic()
+
+        self.stdout = OutputCapture(max_output, functools.partial(self._output, 'stdout'))
+        self.stderr = OutputCapture(max_output, functools.partial(self._output, 'stderr'))
+        self.max_output = max_output
+        self._sent = []  # transcript of the input passed to the program
+        self._sent_size = 0
+        self._line = ''
+        self._closed = False
+        self._input = queue.Queue()
+        self._lock = threading.Lock()
+
+        self._threads = [
+            threading.Thread(target=self.stdout.drain, args=(os.fdopen(master_fd, 'rb', buffering=0),)),
+            threading.Thread(target=self.stderr.drain, args=(worker.process.stderr,)),
+            threading.Thread(target=self._write_loop),
+        ]
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+
+    def send(self, data: str, eof: bool = False):
+        """Buffer input and pass complete lines to the program; `eof` closes its stdin"""
+        with self._lock:
+            if self._closed:
+                return
+            self.last_activity = time.monotonic()
+
+            self._line += data
+            lines, _, self._line = self._line.rpartition('\n')
+            if lines:
+                self._queue_input(lines + '\n')
+
+            if eof:
+                if self._line:
+                    self._queue_input(self._line)
+                    self._line = ''
+                self._closed = True
+                self._input.put(None)
+
+    def wait(self) -> Dict[str, Any]:
+        """Block until the program exits or hits its idle or lifetime limit"""
+        process = self.worker.process
+        started = time.monotonic()
+        timed_out = False
+
+        while True:
+            pid, wait_status, usage = os.wait4(process.pid, os.WNOHANG)
+            if pid:
+                break
+
+            now = time.monotonic()
+            if now - self.last_activity > self.idle_timeout or now - started > self.max_duration:
+                timed_out = True
+                self.worker.kill()
+                _, wait_status, usage = os.wait4(process.pid, 0)
+                break
+            time.sleep(0.1)
+
+        process.returncode = os.waitstatus_to_exitcode(wait_status)
+        self.worker.kill()
+        self._input.put(None)
+        for thread in self._threads:
+            thread.join(timeout=1)
+
+        return {
+            'stdout': self.stdout.text(),
+            'stderr': self.stderr.text(),
+            'compile_output': None,
+            'exit_code': process.returncode,
+            'time': round(usage.ru_utime + usage.ru_stime, 3),
+            'wall_time': round(time.monotonic() - started, 3),
+            'memory': usage.ru_maxrss,
+            'status': LocalExecutor._status(process.returncode, timed_out)
+        }
+
+    def input_text(self) -> str:
+        return b''.join(self._sent).decode('utf-8', errors='replace')
+
+    def _queue_input(self, text: str):
+        data = text.encode('utf-8')
+        if self._sent_size < self.max_output:
+            self._sent.append(data[:self.max_output - self._sent_size])
+            self._sent_size += len(self._sent[-1])
+
+        self._input.put(data)
+        self.on_output('stdin', data)
+
+    def _output(self, stream: str, chunk: bytes):
+        self.last_activity = time.monotonic()
+        self.on_output(stream, chunk)
+
+    def _write_loop(self):
+        pipe = self.worker.process.stdin
+        try:
+            while True:
+                data = self._input.get()
+                if data is None:
+                    break
+                pipe.write(data)
+                pipe.flush()
+        except (BrokenPipeError, ValueError):
+            pass  # Program exited without reading all of its input
+        finally:
+            try:
+                pipe.close()
+            except BrokenPipeError:
+                pass
+
+class WarmPool:
+    """Pre-forked interpreter workers, one job each, replenished in the background"""
+
+    def __init__(self, executor: 'LocalExecutor', size: int):
+        self._executor = executor
+        self._size = size
+        self._ready = {language: queue.Queue() for language in WARM_BOOTSTRAPS if language in LOCAL_INTERPRETERS}
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._replenish_loop, name='warm-pool')
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+
+    def acquire(self, language: str) -> Optional[Worker]:
+        """Take a ready worker for a language, or None if the pool is empty"""
+        ready = self._ready.get(language)
+        if ready is None:
+            return None
+
+        worker = None
+        while worker is None:
+            try:
+                worker = ready.get_nowait()
+            except queue.Empty:
+                break
+
+            # Workers can die while idle; never hand one of those out
+            if worker.process.poll() is not None:
+                worker.discard()
+                worker = None
+
+        self._wakeup.set()
+        return worker
+
+    def shutdown(self):
+        self._stopped = True
+        self._wakeup.set()
+        for ready in self._ready.values():
+            while not ready.empty():
+                ready.get_nowait().discard()
+
+    def _replenish_loop(self):
+        while not self._stopped:
+            self._wakeup.clear()
+
+            for language in list(self._ready):
+                ready = self._ready[language]
+                while ready.qsize() < self._size and not self._stopped:
+                    try:
+                        worker = self._executor.spawn_warm(language)
+                    except OSError as e:
+                        # Interpreter missing on this host: stop trying, fall back to cold runs
+                        self._executor.logger.warning(f"Disabling warm pool for {language}: {str(e)}")
+                        del self._ready[language]
+                        break
+
+                    if worker is None:
+                        break
+                    ready.put(worker)
+
+            self._wakeup.wait(timeout=5)
+
+class LocalExecutor:
+    """Runs programs in resource-limited subprocesses on this host"""
+
+    def __init__(self, config, logger):
+        self.logger = logger
+        self.timeout = config['LOCAL_EXECUTOR_TIMEOUT']
+        self.cpu_limit = config['LOCAL_EXECUTOR_CPU_LIMIT']
+        self.memory_limit = config['LOCAL_EXECUTOR_MEMORY_LIMIT']
+        self.max_output = config['LOCAL_EXECUTOR_MAX_OUTPUT']
+        self.compile_timeout = config['LOCAL_COMPILE_TIMEOUT']
+        self.compile_memory_limit = config['LOCAL_COMPILE_MEMORY_LIMIT']
+        self.interactive_cpu_limit = config['INTERACTIVE_CPU_LIMIT']
+        self.interactive_idle_timeout = config['INTERACTIVE_IDLE_TIMEOUT']
+        self.interactive_max_duration = config['INTERACTIVE_MAX_DURATION']
+
+        self.compile_cache = CompileCache(config['COMPILE_CACHE_DIR'], config['COMPILE_CACHE_MAX_BYTES'], logger)
+        self._compile_locks = {}
+        self._compile_locks_lock = threading.Lock()
+
+        self.pool = WarmPool(self, config['WARM_POOL_SIZE'])
+        if config['WARM_POOL_SIZE'] > 0:
+            self.pool.start()
+
+    @staticmethod
+    def supports(language: str) -> bool:
+        """Check if a language's toolchain is installed on this host"""
+        if language not in LOCAL_INTERPRETERS and language not in LOCAL_COMPILERS:
+            return False
+        return _toolchain_version(language) is not None
+
+    def run(self, language: str, source_code: str, input_data: Union[str, BinaryIO] = '',
+            on_output: Optional[Callable[[str, bytes], None]] = None,
+            cancel: Optional[CancelToken] = None) -> Dict[str, Any]:
+        """Run a program and return a Judge0-shaped result
+
+        `input_data` is text or a binary file, which is streamed to the
+        program in chunks. `on_output(stream, chunk)` is called from reader
+        threads as stdout and stderr arrive, before the run completes. Raises
+        ExecutionCancelled if `cancel` fires before or during the run.
+        """
+        source = source_code.encode('utf-8')
+        if isinstance(input_data, str) or input_data is None:
+            stdin = [(input_data or '').encode('utf-8')]
+        else:
+            stdin = [input_data]
+        build = None
+
+        if cancel and cancel.cancelled:
+            raise ExecutionCancelled()
+
+        if language in LOCAL_COMPILERS:
+            # Builds are shared through the cache, so a cancel never interrupts one
+            build = self.compile(language, source)
+            if not build.success:
+                return self._compilation_error(build)
+            worker = self.spawn_build(language, build)
+        else:
+            worker = self.pool.acquire(language)
+            if worker:
+                stdin = [f'{len(source)}\n'.encode('ascii') + source] + stdin
+            else:
+                worker = self.spawn_cold(language, source)
+
+        if cancel and not cancel.attach(worker):
+            worker.discard()
+            raise ExecutionCancelled()
+
+        try:
+            result = self._execute(worker, stdin, on_output)
+        finally:
+            if cancel:
+                cancel.detach(worker)
+            worker.discard()
+
+        if cancel and cancel.cancelled:
+            raise ExecutionCancelled()
+
+        if build:
+            result['compile_output'] = build.compile_output
+        return result
+
+    def compile(self, language: str, source: bytes) -> CompiledBuild:
+        """Compile a program, reusing a cached build of the same source and toolchain"""
+        key = CompileCache.make_key(language, _toolchain_version(language), source)
+
+        build = self.compile_cache.get(key)
+        if build:
+            return build
+
+        # Identical sources submitted together compile once
+        with self._compile_locks_lock:
+            lock = self._compile_locks.setdefault(key, threading.Lock())
+
+        with lock:
+            build = self.compile_cache.get(key)
+            if build:
+                return build
+
+            try:
+                return self._compile(key, language, source)
+            finally:
+                with self._compile_locks_lock:
+                    self._compile_locks.pop(key, None)
+
+    def start_interactive(self, language: str, source_code: str,
+                          on_output: Callable[[str, bytes], None]) -> Tuple[Optional[InteractiveProcess], Optional[Dict[str, Any]]]:
+        """Start a program for an interactive session
+
+        Returns the running process, or a compilation error result if the
+        program does not build.
+        """
+        source = source_code.encode('utf-8')
+        workdir = tempfile.mkdtemp(prefix='codechill-')
+
+        if language in LOCAL_COMPILERS:
+            build = self.compile(language, source)
+            if not build.success:
+                shutil.rmtree(workdir, ignore_errors=True)
+                return None, self._compilation_error(build)
+            shutil.copytree(build.artifacts, workdir, dirs_exist_ok=True)
+            command = LOCAL_COMPILERS[language]['run']
+        else:
+            interpreter = LOCAL_INTERPRETERS[language]
+            with open(os.path.join(workdir, interpreter['filename']), 'wb') as f:
+                f.write(source)
+            command = interpreter['command'] + [interpreter['filename']]
+
+        master_fd, slave_fd = pty.openpty()
+        try:
+            # Keep "\n" as is instead of the terminal's "\r\n"
+            attributes = termios.tcgetattr(slave_fd)
+            attributes[1] &= ~termios.ONLCR
+            termios.tcsetattr(slave_fd, termios.TCSANOW, attributes)
+
+            process = self._spawn(
+                command,
+                workdir,
+                limits=(self.interactive_cpu_limit, self.memory_limit, self.max_output),
+                stdout=slave_fd
+            )
+        except Exception:
+            os.close(master_fd)
+            raise
+        finally:
+            os.close(slave_fd)
+
+        return InteractiveProcess(
+            Worker(process, workdir, warm=False),
+            master_fd,
+            self.max_output,
+            self.interactive_idle_timeout,
+            self.interactive_max_duration,
+            on_output
+        ), None
+
+    def spawn_build(self, language: str, build: CompiledBuild) -> Worker:
+        """Start a compiled program from a copy of its cached artifacts"""
+        workdir = tempfile.mkdtemp(prefix='codechill-')
+        shutil.copytree(build.artifacts, workdir, dirs_exist_ok=True)
+
+        process = self._spawn(LOCAL_COMPILERS[language]['run'], workdir)
+        return Worker(process, workdir, warm=False)
+
+    def spawn_warm(self, language: str) -> Optional[Worker]:
+        """Start a bootstrapped worker and wait until its interpreter is ready"""
+        interpreter = LOCAL_INTERPRETERS[language]
+        command = interpreter['command'] + [WARM_BOOTSTRAP_FLAGS[language], WARM_BOOTSTRAPS[language]]
+        workdir = tempfile.mkdtemp(prefix='codechill-')
+        worker = Worker(self._spawn(command, workdir), workdir, warm=True)
+
+        fd = worker.process.stdout.fileno()
+        ready, _, _ = select.select([fd], [], [], self.timeout)
+        if not ready or os.read(fd, 1) != READY_BYTE:
+            self.logger.warning(f"Warm {language} worker failed to start")
+            worker.discard()
+            return None
+
+        return worker
+
+    def spawn_cold(self, language: str, source: bytes) -> Worker:
+        """Start a fresh interpreter on a source file"""
+        interpreter = LOCAL_INTERPRETERS[language]
+        workdir = tempfile.mkdtemp(prefix='codechill-')
+        with open(os.path.join(workdir, interpreter['filename']), 'wb') as f:
+            f.write(source)
+
+        process = self._spawn(interpreter['command'] + [interpreter['filename']], workdir)
+        return Worker(process, workdir, warm=False)
+
+    def _compile(self, key: str, language: str, source: bytes) -> CompiledBuild:
+        compiler = LOCAL_COMPILERS[language]
+        workdir = tempfile.mkdtemp(prefix='codechill-build-')
+        try:
+            with open(os.path.join(workdir, compiler['filename']), 'wb') as f:
+                f.write(source)
+
+            process = self._spawn(
+                compiler['compile'],
+                workdir,
+                # Artifacts larger than the whole cache could never be stored anyway
+                limits=(self.compile_timeout, self.compile_memory_limit, self.compile_cache.max_bytes),
+                stderr=subprocess.STDOUT,
+                # Toolchain managers (rustup, go) keep their state under the real home
+                home=os.environ.get('HOME', workdir)
+            )
+            try:
+                output, _ = process.communicate(timeout=self.compile_timeout)
+            except subprocess.TimeoutExpired:
+                Worker(process, workdir, warm=False).kill()
+                output, _ = process.communicate()
+                output += b'\nCompilation timed out'
+
+            compile_output = output[:self.max_output].decode('utf-8', errors='replace')
+            return self.compile_cache.put(
+                key,
+                workdir,
+                exclude=compiler['filename'],
+                success=process.returncode == 0,
+                compile_output=compile_output,
+                exit_code=process.returncode
+            )
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    @staticmethod
+    def _compilation_error(build: CompiledBuild) -> Dict[str, Any]:
+        return {
+            'stdout': None,
+            'stderr': None,
+            'compile_output': build.compile_output,
+            'exit_code': build.exit_code,
+            'time': None,
+            'wall_time': None,
+            'memory': None,
+            'status': STATUS_COMPILATION_ERROR
+        }
+
+    def _spawn(self, command: List[str], workdir: str, limits=None, stderr=subprocess.PIPE,
+               home: Optional[str] = None, stdout=subprocess.PIPE) -> subprocess.Popen:
+        cpu_limit, memory_limit, file_size_limit = limits or (self.cpu_limit, self.memory_limit, self.max_output)
+        try:
+            return subprocess.Popen(
+                command,
+                cwd=workdir,
+                stdin=subprocess.PIPE,
+                stdout=stdout,
+                stderr=stderr,
+                env={
+                    'PATH': os.environ.get('PATH', '/usr/bin:/bin'),
+                    'HOME': home or workdir,
+                    'LANG': 'C.UTF-8',
+                },
+                preexec_fn=functools.partial(self._apply_limits, cpu_limit, memory_limit, file_size_limit),
+                start_new_session=True
+            )
+        except OSError:
+            shutil.rmtree(workdir, ignore_errors=True)
+            raise
+
+    @staticmethod
+    def _apply_limits(cpu_limit: int, memory_limit: int, file_size_limit: int):
+        """Resource limits applied in the child before exec"""
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_limit + 1))
+        resource.setrlimit(resource.RLIMIT_DATA, (memory_limit, memory_limit))
+        resource.setrlimit(resource.RLIMIT_FSIZE, (file_size_limit, file_size_limit))
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+
+    def _execute(self, worker: Worker, stdin: List[Union[bytes, BinaryIO]],
+                 on_output: Optional[Callable[[str, bytes], None]] = None) -> Dict[str, Any]:
+        process = worker.process
+        stdout = OutputCapture(self.max_output, functools.partial(on_output, 'stdout') if on_output else None)
+        stderr = OutputCapture(self.max_output, functools.partial(on_output, 'stderr') if on_output else None)
+
+        threads = [
+            threading.Thread(target=self._feed, args=(process.stdin, stdin)),
+            threading.Thread(target=stdout.drain, args=(process.stdout,)),
+            threading.Thread(target=stderr.drain, args=(process.stderr,)),
+        ]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        timed_out = threading.Event()
+        timer = threading.Timer(self.timeout, self._timeout, args=(worker, timed_out))
+        timer.daemon = True
+
+        started = time.monotonic()
+        timer.start()
+        try:
+            _, wait_status, usage = os.wait4(process.pid, 0)
+        finally:
+            timer.cancel()
+        wall_time = time.monotonic() - started
+
+        process.returncode = os.waitstatus_to_exitcode(wait_status)
+
+        # Anything the program left running still holds the pipes open
+        worker.kill()
+        for thread in threads:
+            thread.join(timeout=1)
+
+        return {
+            'stdout': stdout.text(),
+            'stderr': stderr.text(),
+            'compile_output': None,
+            'exit_code': process.returncode,
+            'time': round(usage.ru_utime + usage.ru_stime, 3),
+            'wall_time': round(wall_time, 3),
+            'memory': usage.ru_maxrss,
+            'status': self._status(process.returncode, timed_out.is_set())
+        }
+
+    @staticmethod
+    def _feed(pipe, parts: List[Union[bytes, BinaryIO]]):
+        try:
+            for part in parts:
+                if isinstance(part, bytes):
+                    pipe.write(part)
+                else:
+                    # Uploaded input files are copied chunk by chunk, never read whole
+                    shutil.copyfileobj(part, pipe, 65536)
+        except (BrokenPipeError, ValueError):
+            pass  # Program exited without reading all of its input
+        finally:
+            try:
+                pipe.close()
+            except BrokenPipeError:
+                pass
+
+    @staticmethod
+    def _timeout(worker: Worker, timed_out: threading.Event):
+        timed_out.set()
+        worker.kill()
+
+    @staticmethod
+    def _status(returncode: int, timed_out: bool) -> Dict[str, Any]:
+        if timed_out or returncode == -signal.SIGXCPU:
+            return STATUS_TIME_LIMIT_EXCEEDED
+        if returncode == 0:
+            return STATUS_ACCEPTED
+        if returncode > 0:
+            return STATUS_RUNTIME_ERROR
+        return SIGNAL_STATUSES.get(-returncode, STATUS_RUNTIME_ERROR_OTHER)
+
+@functools.lru_cache(maxsize=None)
+def _toolchain_version(language: str) -> Optional[str]:
+    """First line of a toolchain's version output, or None if it is not installed"""
+    if language in LOCAL_COMPILERS:
+        command = LOCAL_COMPILERS[language]['version']
+    else:
+        command = LOCAL_INTERPRETERS[language]['command'][:1] + ['--version']
+
+    if not shutil.which(command[0]):
+        return None
+
+    try:
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+
+    lines = result.stdout.decode('utf-8', errors='replace').strip().splitlines()
+    return lines[0] if lines else command[0]
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_local_executor() -> LocalExecutor:
+    """Return the process-wide local executor, creating it on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            app = current_app._get_current_object()
+            _executor = LocalExecutor(app.config, app.logger)
+    return _executor
@@ -0,0 +1,199 @@
+from flask import current_app
+from datetime import datetime
+from sqlalchemy import bindparam
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import heapq
+import json
+import zlib
+
+from models import db, Message, MessageArchiveSegment, Room
+
+MessageKey = Tuple[str, str]  # (created_at isoformat, id), the order history is paged in
+
+def message_key(message: Dict[str, Any]) -> MessageKey:
+    return message['created_at'], message['id']
+
+class MessageArchive:
+    """Cold storage for old chat history
+
+    The archive job moves messages older than a cutoff, and every message of
+    inactive rooms, out of `messages` into compressed per-room segments.
+    Segments are only ever appended. History reads merge archived messages
+    back in when a page reaches past the hot rows. Archived messages are
+    read-only and no longer searchable.
+    """
+
+    @staticmethod
+    def archive(cutoff: datetime, segment_size: int) -> Tuple[int, int]:
+        """Archive old messages in every room; returns (segments written, messages archived)"""
+        room_ids = [room_id for (room_id,) in db.session.query(Message.room_id)
+                    .join(Room, Room.id == Message.room_id)
+                    .filter(db.or_(Message.created_at < cutoff, Room.is_active == False))
+                    .distinct()]
+
+        segments = archived = 0
+        for room_id in room_ids:
+            try:
+                room_segments, room_archived = MessageArchive.archive_room(room_id, cutoff, segment_size)
+                segments += room_segments
+                archived += room_archived
+            except Exception as e:
+                current_app.logger.error(f"Archiving messages of room {room_id} failed: {str(e)}")
+                db.session.rollback()
+        return segments, archived
+
+    @staticmethod
+    def archive_room(room_id: str, cutoff: datetime, segment_size: int) -> Tuple[int, int]:
+        """Archive one room's old messages, one segment per transaction"""
+        room = Room.query.get(room_id)
+        query = Message.query.filter(Message.room_id == room_id)
+        if room and room.is_active:
+            query = query.filter(Message.created_at < cutoff)
+
+        segments = archived = 0
+        last_created_at = last_id = None
+        while True:
+            chunk_query = query
+            if last_id:
+                chunk_query = chunk_query.filter(db.or_(
+                    Message.created_at > last_created_at,
+                    db.and_(Message.created_at == last_created_at, Message.id > last_id)
+                ))
+            chunk = chunk_query.order_by(Message.created_at.asc(), Message.id.asc()).limit(segment_size).all()
+            if not chunk:
+                break
+            last_created_at, last_id = chunk[-1].created_at, chunk[-1].id
+
+            # A message still replied to from the hot table stays there until its replies are archived
+            ids = [message.id for message in chunk]
+            replied_to = {reply_to for (reply_to,) in db.session.query(Message.reply_to)
+                          .filter(Message.reply_to.in_(ids), Message.id.notin_(ids))}
+            chunk = [message for message in chunk if message.id not in replied_to]
+
+            if chunk:
+                messages = [message.to_dict() for message in chunk]
+                db.session.add(MessageArchiveSegment(
+                    room_id=room_id,
+                    first_created_at=chunk[0].created_at,
+                    first_id=chunk[0].id,
+                    last_created_at=chunk[-1].created_at,
+                    last_id=chunk[-1].id,
+                    message_count=len(messages),
+                    data=zlib.compress(json.dumps(messages).encode('utf-8'))
+                ))
+
+                # Newest first, so replies go before the messages they point at
+                db.session.execute(
+                    Message.__table__.delete().where(Message.__table__.c.id == bindparam('archived_id')),
+                    [{'archived_id': message.id} for message in reversed(chunk)]
+                )
+                segments += 1
+                archived += len(chunk)
+
+            db.session.commit()
+            db.session.expunge_all()
+
+        return segments, archived
+
+    @staticmethod
+    def fill_older(room_id: str, messages: List[Dict[str, Any]], limit: int,
+                   before: Optional[MessageKey] = None) -> List[Dict[str, Any]]:
+        """Merge archived messages into a newest-first page of hot messages older than `before`
+
+        `messages` holds up to limit + 1 hot rows; the result holds up to
+        limit + 1 rows from both tables.
+        """
+        newest = MessageArchive._newest_key(room_id)
+        if newest is None:
+            return messages
+        if len(messages) > limit and message_key(messages[-1]) > newest:
+            return messages  # the page never reaches archived history
+
+        archived = MessageArchive._older(room_id, before, limit + 1)
+        return sorted(messages + archived, key=message_key, reverse=True)[:limit + 1]
+
+    @staticmethod
+    def fill_newer(room_id: str, messages: List[Dict[str, Any]], limit: int,
+                   after: MessageKey) -> List[Dict[str, Any]]:
+        """Merge archived messages into an oldest-first page of hot messages newer than `after`"""
+        newest = MessageArchive._newest_key(room_id)
+        if newest is None or after >= newest:
+            return messages
+
+        archived = MessageArchive._newer(room_id, after, limit + 1)
+        return sorted(messages + archived, key=message_key)[:limit + 1]
+
+    @staticmethod
+    def stream(room_id: str, after: Optional[MessageKey] = None) -> Iterator[Dict[str, Any]]:
+        """Every archived message of a room newer than `after`, oldest first
+
+        Decompresses one segment at a time; only messages of segments that
+        overlap are held back until their turn.
+        """
+        query = MessageArchiveSegment.query.filter_by(room_id=room_id)
+        if after:
+            query = query.filter(MessageArchiveSegment.last_created_at >= datetime.fromisoformat(after[0]))
+        segments = query.order_by(MessageArchiveSegment.first_created_at.asc(), MessageArchiveSegment.first_id.asc()).all()
+
+        pending = []  # (key, tiebreak, message) heap of decoded but not yet emitted messages
+        for segment in segments:
+            first = (segment.first_created_at.isoformat(), segment.first_id)
+            while pending and pending[0][0] < first:
+                yield heapq.heappop(pending)[2]
+            for message in segment.messages():
+                if after is None or message_key(message) > after:
+                    heapq.heappush(pending, (message_key(message), len(pending), message))
+        while pending:
+            yield heapq.heappop(pending)[2]
+
+    @staticmethod
+    def thread(room_id: str, root_id: str) -> List[Dict[str, Any]]:
+        """Archived messages of one thread, its root included; reads every segment of the room"""
+        return [message for message in MessageArchive.stream(room_id)
+                if message['id'] == root_id or message.get('thread_root_id') == root_id]
+    
+    @staticmethod
+    def _newest_key(room_id: str) -> Optional[MessageKey]:
+        segment = MessageArchiveSegment.query.filter_by(room_id=room_id)\
+            .order_by(MessageArchiveSegment.last_created_at.desc(), MessageArchiveSegment.last_id.desc())\
+            .first()
+        return (segment.last_created_at.isoformat(), segment.last_id) if segment else None
+
+    @staticmethod
+    def _older(room_id: str, before: Optional[MessageKey], count: int) -> List[Dict[str, Any]]:
+        """Up to `count` archived messages older than `before`, newest first"""
+        query = MessageArchiveSegment.query.filter_by(room_id=room_id)
+        if before:
+            query = query.filter(MessageArchiveSegment.first_created_at <= datetime.fromisoformat(before[0]))
+        segments = query.order_by(
+            MessageArchiveSegment.last_created_at.desc(),
+            MessageArchiveSegment.last_id.desc()
+        ).all()
+
+        found = []
+        for segment in segments:
+            # Segments can overlap, so stop only once the rest are all older than what we have
+            if len(found) >= count and (segment.last_created_at.isoformat(), segment.last_id) < message_key(found[count - 1]):
+                break
+            found.extend(message for message in segment.messages() if before is None or message_key(message) < before)
+            found.sort(key=message_key, reverse=True)
+        return found[:count]
+
+    @staticmethod
+    def _newer(room_id: str, after: MessageKey, count: int) -> List[Dict[str, Any]]:
+        """Up to `count` archived messages newer than `after`, oldest first"""
+        segments = MessageArchiveSegment.query.filter(
+            MessageArchiveSegment.room_id == room_id,
+            MessageArchiveSegment.last_created_at >= datetime.fromisoformat(after[0])
+        ).order_by(
+            MessageArchiveSegment.first_created_at.asc(),
+            MessageArchiveSegment.first_id.asc()
+        ).all()
+
+        found = []
+        for segment in segments:
+            if len(found) >= count and (segment.first_created_at.isoformat(), segment.first_id) > message_key(found[count - 1]):
+                break
+            found.extend(message for message in segment.messages() if message_key(message) > after)
+            found.sort(key=message_key)
+        return found[:count]
@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models import db, Message, User
+
+Author = Tuple[str, Optional[str]]  # (name, picture)
+
+class MessageAuthorCache:
+    """Names and pictures of recent chat authors, for the snapshot stored on each message
+
+    Sending a message reads its author from here instead of loading the
+    user. When a profile's name or picture change commits, its entry is
+    dropped and a background thread copies the new snapshot onto the
+    author's stored messages in batches (as `flask refresh-message-authors`
+    does), outside the request that changed the profile. Changes within
+    `delay` seconds of each other share one pass, which also gives messages
+    still in the write buffer time to be stored. Entries beyond `max_users`
+    are dropped least recently used first.
+    Assumes a single server process, as the Socket.IO deployment does.
+    """
+
+    def __init__(self, app, max_users: int, delay: float, batch_size: int):
+        self.app = app
+        self.max_users = max_users
+        self.delay = delay
+        self.batch_size = batch_size
+
+        self._authors = OrderedDict()  # user_id -> Author, least recently used first
+        self._changed = set()  # user_ids whose stored messages await the new snapshot
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+
+        thread = threading.Thread(target=self._worker_loop, name='message-author-refresher')
+        thread.daemon = True
+        thread.start()
+
+    def get(self, user_id: str) -> Optional[Author]:
+        """The user's name and picture, loading them on a miss; None for an unknown user"""
+        with self._lock:
+            author = self._authors.get(user_id)
+            if author:
+                self._authors.move_to_end(user_id)
+                return author
+
+        author = db.session.query(User.name, User.picture).filter(User.id == user_id).first()
+        if not author:
+            return None
+
+        with self._lock:
+            self._authors[user_id] = tuple(author)
+            while len(self._authors) > self.max_users:
+                self._authors.popitem(last=False)
+        return tuple(author)
+
+    def changed(self, user_ids: Iterable[str]):
+        """Forget these users' snapshots and refresh their stored messages in the background"""
+        with self._condition:
+            for user_id in user_ids:
+                self._authors.pop(user_id, None)
+                self._changed.add(user_id)
+            self._condition.notify()
+
+    def _worker_loop(self):
+        while True:
+            with self._condition:
+                while not self._changed:
+                    self._condition.wait()
+            time.sleep(self.delay)
+
+            with self._condition:
+                user_ids, self._changed = self._changed, set()
+            with self.app.app_context():
+                try:
+                    Message.refresh_authors(list(user_ids), self.batch_size)
+                except Exception as e:
+                    self.app.logger.error(f"Refreshing the messages of {len(user_ids)} authors failed: {str(e)}")
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+
+@event.listens_for(Session, 'after_flush')
+def collect_profile_changes(session, flush_context):
+    """Note users whose name or picture changed; their messages follow once the transaction commits"""
+    for instance in session.dirty:
+        if isinstance(instance, User):
+            state = inspect(instance)
+            if state.attrs.name.history.has_changes() or state.attrs.picture.history.has_changes():
+                session.info.setdefault('changed_authors', set()).add(instance.id)
+
+@event.listens_for(Session, 'after_commit')
+def refresh_changed_authors(session):
+    changed = session.info.pop('changed_authors', None)
+    if changed:
+        get_message_authors().changed(changed)
+
+@event.listens_for(Session, 'after_rollback')
+def discard_profile_changes(session):
+    session.info.pop('changed_authors', None)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_message_authors() -> MessageAuthorCache:
+    """Return the process-wide message author cache, creating it on first use"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            app = current_app._get_current_object()
+            _cache = MessageAuthorCache(
+                app,
+                app.config['MESSAGE_AUTHOR_CACHE_SIZE'],
+                app.config['MESSAGE_AUTHOR_REFRESH_DELAY'],
+                app.config['MESSAGE_AUTHOR_REFRESH_BATCH']
+            )
+    return _cache
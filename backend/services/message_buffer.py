@@ -0,0 +1,160 @@
+import atexit
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import bindparam
+from typing import Any, Dict, List, Tuple
+
+from models import db, Message, Room, RoomStats
+
+class MessageWriteBuffer:
+    """Group-commits chat messages
+
+    Callers broadcast a message as soon as it is accepted and get a Future
+    back. Messages accepted within `interval` seconds of each other (up to
+    `max_batch`) are inserted in one transaction together with a single
+    sequence/last_activity update per room and reply count update per
+    thread, so a busy room pays for one commit per batch rather than two
+    per message. Each Future resolves to the message id once its batch is
+    committed, or fails if the message was not stored.
+    """
+
+    def __init__(self, app, interval: float, max_batch: int):
+        self.app = app
+        self.interval = interval
+        self.max_batch = max_batch
+
+        self._pending = []  # (row, future) pairs waiting for the next commit
+        self._condition = threading.Condition()
+
+        thread = threading.Thread(target=self._worker_loop, name='message-writer')
+        thread.daemon = True
+        thread.start()
+
+    def submit(self, message: Message) -> Future:
+        """Queue a new message for the next group commit"""
+        future = Future()
+        row = {column.name: getattr(message, column.name) for column in Message.__table__.columns}
+
+        with self._condition:
+            self._pending.append((row, future))
+            self._condition.notify()
+        return future
+
+    def flush(self):
+        """Commit everything queued so far from the calling thread"""
+        with self._condition:
+            batch, self._pending = self._pending, []
+        if batch:
+            self._write(batch)
+
+    def _worker_loop(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+
+                # Hold the first message briefly so the ones behind it share its commit
+                deadline = time.monotonic() + self.interval
+                while len(self._pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+
+            self._write(batch)
+
+    def _write(self, batch: List[Tuple[Dict[str, Any], Future]]):
+        with self.app.app_context():
+            try:
+                self._commit([row for row, _ in batch])
+                for row, future in batch:
+                    future.set_result(row['id'])
+            except Exception as e:
+                self.app.logger.error(f"Group commit of {len(batch)} messages failed: {str(e)}")
+                db.session.rollback()
+
+                # Retry one by one so a single bad message can't sink its batch
+                for row, future in batch:
+                    try:
+                        self._commit([row])
+                        future.set_result(row['id'])
+                    except Exception as error:
+                        db.session.rollback()
+                        self.app.logger.error(f"Failed to store message {row['id']}: {str(error)}")
+                        future.set_exception(error)
+            finally:
+                db.session.remove()
+
+    @staticmethod
+    def _commit(rows: List[Dict[str, Any]]):
+        rooms = Room.__table__
+        by_room = {}
+        for row in sorted(rows, key=lambda row: (row['created_at'], row['id'])):
+            by_room.setdefault(row['room_id'], []).append(row)
+
+        # Reserve each room's next sequence numbers; the row lock holds them until commit
+        db.session.execute(
+            rooms.update()
+            .where(rooms.c.id == bindparam('seq_room_id'))
+            .values(
+                message_seq=rooms.c.message_seq + bindparam('new_messages'),
+                last_activity=db.case((rooms.c.is_active == True, bindparam('activity_at')), else_=rooms.c.last_activity)
+            ),
+            [{'seq_room_id': room_id, 'new_messages': len(room_rows), 'activity_at': room_rows[-1]['created_at']}
+             for room_id, room_rows in by_room.items()]
+        )
+        room_stats = RoomStats.__table__
+        db.session.execute(
+            room_stats.update()
+            .where(room_stats.c.room_id == bindparam('stats_room_id'))
+            .values(messages=room_stats.c.messages + bindparam('new_messages')),
+            [{'stats_room_id': room_id, 'new_messages': len(room_rows)} for room_id, room_rows in by_room.items()]
+        )
+        last_seq = dict(db.session.execute(
+            db.select(rooms.c.id, rooms.c.message_seq).where(rooms.c.id.in_(list(by_room)))
+        ).all())
+        for room_id, room_rows in by_room.items():
+            if room_id in last_seq:
+                for offset, row in enumerate(room_rows):
+                    row['seq'] = last_seq[room_id] - len(room_rows) + 1 + offset
+
+        db.session.execute(Message.__table__.insert(), rows)
+
+        replies = {}
+        for row in rows:
+            if row['thread_root_id']:
+                replies[row['thread_root_id']] = replies.get(row['thread_root_id'], 0) + 1
+        if replies:
+            messages = Message.__table__
+            db.session.execute(
+                messages.update()
+                .where(messages.c.id == bindparam('thread_id'))
+                .values(reply_count=messages.c.reply_count + bindparam('new_replies')),
+                [{'thread_id': root_id, 'new_replies': count} for root_id, count in replies.items()]
+            )
+
+        db.session.commit()
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+def get_message_buffer() -> MessageWriteBuffer:
+    """Return the process-wide message write buffer, creating it on first use"""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            app = current_app._get_current_object()
+            _buffer = MessageWriteBuffer(
+                app,
+                app.config['MESSAGE_FLUSH_INTERVAL'],
+                app.config['MESSAGE_FLUSH_MAX_BATCH']
+            )
+            # Don't lose the last few milliseconds of chat on shutdown
+            atexit.register(_buffer.flush)
+    return _buffer
@@ -0,0 +1,215 @@
+from flask import current_app
+from typing import Any, Dict, List, Tuple
+import html
+import re
+import threading
+
+from sqlalchemy import text
+from sqlalchemy.dialects.mysql import match
+
+from models import db, Message
+
+# Highlight markers placed in snippets; replaced with <mark> after escaping
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+SNIPPET_CHARS = 80  # characters of context either side of the first match
+
+# Deleted messages become system messages and drop out of the index
+SQLITE_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts "
+    "USING fts5(content, content='messages', content_rowid='rowid')",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages "
+    "WHEN new.message_type != 'system' BEGIN "
+    "INSERT INTO messages_fts(rowid, content) VALUES (new.rowid, new.content); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages "
+    "WHEN old.message_type != 'system' BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.rowid, old.content); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content, message_type ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) "
+    "SELECT 'delete', old.rowid, old.content WHERE old.message_type != 'system'; "
+    "INSERT INTO messages_fts(rowid, content) "
+    "SELECT new.rowid, new.content WHERE new.message_type != 'system'; "
+    "END",
+]
+
+_indexed = None  # whether the database has its search index; checked once per process
+_indexed_lock = threading.Lock()
+
+class MessageSearch:
+    """Full-text search over chat messages
+
+    SQLite uses an FTS5 table kept in sync by triggers; MySQL uses a
+    FULLTEXT index on messages.content. Both are built by `flask
+    build-message-search-index`; until then, and on other databases, search
+    falls back to ILIKE. Queries are plain words (all must match) and
+    "quoted phrases".
+
+    The FTS5 table is keyed by the implicit rowid of messages, which VACUUM
+    may renumber, so the command must be run again after a VACUUM.
+    """
+
+    @staticmethod
+    def build_index():
+        """Create the search index for the current database, or rebuild the SQLite one from scratch"""
+        global _indexed
+        dialect = db.engine.dialect.name
+
+        if dialect == 'sqlite':
+            exists = MessageSearch._index_exists()
+            for statement in SQLITE_SEARCH_DDL:
+                db.session.execute(text(statement))
+            if exists:
+                # Re-reads every rowid, so an index left stale by a VACUUM is in sync again
+                db.session.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')"))
+            else:
+                db.session.execute(text(
+                    "INSERT INTO messages_fts(rowid, content) "
+                    "SELECT rowid, content FROM messages WHERE message_type != 'system'"
+                ))
+            db.session.commit()
+
+        elif dialect == 'mysql' and not MessageSearch._index_exists():
+            current_app.logger.info('Building FULLTEXT index on messages.content')
+            db.session.execute(text("ALTER TABLE messages ADD FULLTEXT INDEX ft_messages_content (content)"))
+            db.session.commit()
+
+        with _indexed_lock:
+            _indexed = None
+
+    @staticmethod
+    def has_index() -> bool:
+        """Whether full-text search can use the index; looked up once per process"""
+        global _indexed
+        with _indexed_lock:
+            if _indexed is None:
+                _indexed = MessageSearch._index_exists()
+            return _indexed
+
+    @staticmethod
+    def _index_exists() -> bool:
+        dialect = db.engine.dialect.name
+        if dialect == 'sqlite':
+            statement = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+        elif dialect == 'mysql':
+            statement = ("SELECT 1 FROM information_schema.statistics WHERE table_schema = DATABASE() "
+                         "AND table_name = 'messages' AND index_name = 'ft_messages_content'")
+        else:
+            return False
+        return db.session.execute(text(statement)).first() is not None
+
+    @staticmethod
+    def parse_query(query: str) -> List[List[str]]:
+        """Split a query into terms, each a list of words (more than one for a phrase)"""
+        terms = []
+        for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query):
+            words = re.findall(r'\w+', phrase or word)
+            if words:
+                terms.append(words)
+        return terms
+
+    @staticmethod
+    def search(room_id: str, query: str, page: int, per_page: int) -> Tuple[List[Dict[str, Any]], int]:
+        """Ranked matches in a room as message dicts with a `snippet`, plus the total match count"""
+        terms = MessageSearch.parse_query(query)
+        if not terms:
+            return [], 0
+
+        dialect = db.engine.dialect.name
+        offset = (page - 1) * per_page
+
+        if not MessageSearch.has_index():
+            rows, total = MessageSearch._search_ilike(room_id, terms, offset, per_page)
+        elif dialect == 'sqlite':
+            rows, total = MessageSearch._search_sqlite(room_id, terms, offset, per_page)
+        elif dialect == 'mysql':
+            rows, total = MessageSearch._search_mysql(room_id, terms, offset, per_page)
+        else:
+            rows, total = MessageSearch._search_ilike(room_id, terms, offset, per_page)
+
+        # Snippets are built for the returned page only, never for every match
+        messages = {msg.id: msg for msg in Message.query.filter(Message.id.in_([row[0] for row in rows]))}
+        results = []
+        for message_id, content in rows:
+            message = messages.get(message_id)
+            if message:
+                snippet = MessageSearch._render_snippet(MessageSearch._make_snippet(content, terms))
+                results.append(dict(message.to_dict(), snippet=snippet))
+        return results, total
+
+    @staticmethod
+    def _search_sqlite(room_id: str, terms: List[List[str]], offset: int, limit: int):
+        # Every term is quoted, so user input never reaches FTS5 query syntax.
+        # CROSS JOIN pins the FTS table as the outer loop; otherwise SQLite may
+        # walk the whole room by index and probe the FTS table per message
+        fts_query = ' AND '.join('"' + ' '.join(words) + '"' for words in terms)
+        params = {'query': fts_query, 'room_id': room_id}
+
+        rows = db.session.execute(text(
+            "SELECT m.id, m.content "
+            "FROM messages_fts CROSS JOIN messages m ON m.rowid = messages_fts.rowid "
+            "WHERE messages_fts MATCH :query AND m.room_id = :room_id "
+            "ORDER BY messages_fts.rank, m.created_at DESC "
+            "LIMIT :limit OFFSET :offset"
+        ), dict(params, limit=limit, offset=offset)).all()
+
+        total = db.session.execute(text(
+            "SELECT count(*) FROM messages_fts CROSS JOIN messages m ON m.rowid = messages_fts.rowid "
+            "WHERE messages_fts MATCH :query AND m.room_id = :room_id"
+        ), params).scalar()
+        return rows, total
+
+    @staticmethod
+    def _search_mysql(room_id: str, terms: List[List[str]], offset: int, limit: int):
+        boolean_query = ' '.join(
+            '+"' + ' '.join(words) + '"' if len(words) > 1 else '+' + words[0]
+            for words in terms
+        )
+        score = match(Message.content, against=boolean_query).in_boolean_mode()
+        matches = Message.query.filter(
+            Message.room_id == room_id,
+            Message.message_type != 'system',
+            score
+        )
+
+        rows = matches.with_entities(Message.id, Message.content)\
+            .order_by(score.desc(), Message.created_at.desc())\
+            .offset(offset).limit(limit).all()
+        return rows, matches.count()
+
+    @staticmethod
+    def _search_ilike(room_id: str, terms: List[List[str]], offset: int, limit: int):
+        conditions = [Message.content.ilike(f"%{' '.join(words)}%") for words in terms]
+        matches = Message.query.filter(
+            Message.room_id == room_id,
+            Message.message_type != 'system',
+            *conditions
+        )
+
+        rows = matches.with_entities(Message.id, Message.content)\
+            .order_by(Message.created_at.desc())\
+            .offset(offset).limit(limit).all()
+        return rows, matches.count()
+
+    @staticmethod
+    def _make_snippet(content: str, terms: List[List[str]]) -> str:
+        """Window of text around the first match, with every match marked"""
+        pattern = re.compile(
+            '|'.join(r'\b' + r'\W+'.join(re.escape(word) for word in words) + r'\b' for words in terms),
+            re.IGNORECASE
+        )
+        first = pattern.search(content)
+        if not first:
+            return content[:2 * SNIPPET_CHARS]
+
+        start = max(0, first.start() - SNIPPET_CHARS)
+        end = min(len(content), first.end() + SNIPPET_CHARS)
+        window = pattern.sub(lambda m: MARK_START + m.group(0) + MARK_END, content[start:end])
+        return ('…' if start > 0 else '') + window + ('…' if end < len(content) else '')
+
+    @staticmethod
+    def _render_snippet(snippet: str) -> str:
+        """Escape message text and turn match markers into <mark> tags"""
+        return html.escape(snippet or '').replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
@@ -0,0 +1,232 @@
+from concurrent.futures import Future
+from datetime import datetime
+from sqlalchemy import bindparam
+from typing import Any, Dict, List, Optional, Tuple
+import base64
+import uuid
+
+from models import db, Message
+from services.message_archive import MessageArchive
+from services.message_authors import get_message_authors
+from services.message_buffer import get_message_buffer
+from services.recent_messages import get_recent_messages
+from services.client_message_ids import get_client_message_index
+from services.trending import TrendingTracker, get_trending_tracker
+
+class MessageService:
+    """Service for chat message operations"""
+    
+    @staticmethod
+    def encode_cursor(message: Dict[str, Any]) -> str:
+        """Opaque cursor for a serialized message's position in its room's history"""
+        raw = f"{message['created_at']}|{message['id']}"
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+    
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+        """Inverse of encode_cursor; raises ValueError for malformed cursors"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+            created_at, message_id = raw.split('|', 1)
+            return datetime.fromisoformat(created_at), message_id
+        except (TypeError, UnicodeDecodeError, ValueError, base64.binascii.Error):
+            raise ValueError('Invalid cursor')
+    
+    @staticmethod
+    def get_page(room_id: str, limit: int, before: Optional[str] = None,
+                 after: Optional[str] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """One page of a room's serialized messages in chronological order, plus whether more exist
+        
+        Pages walk the (room_id, created_at, id) index from a cursor, so any
+        depth costs the same as the first page. Without a cursor the newest
+        messages are returned, from the recent message cache when possible;
+        `before` pages back in time, `after` forward.
+        """
+        if not before and not after:
+            recent = get_recent_messages().recent(room_id, limit)
+            if recent is not None:
+                return recent
+        
+        query = Message.query.filter(Message.room_id == room_id)
+        
+        if after:
+            created_at, message_id = MessageService.decode_cursor(after)
+            query = query.filter(db.or_(
+                Message.created_at > created_at,
+                db.and_(Message.created_at == created_at, Message.id > message_id)
+            )).order_by(Message.created_at.asc(), Message.id.asc())
+        else:
+            if before:
+                created_at, message_id = MessageService.decode_cursor(before)
+                query = query.filter(db.or_(
+                    Message.created_at < created_at,
+                    db.and_(Message.created_at == created_at, Message.id < message_id)
+                ))
+            query = query.order_by(Message.created_at.desc(), Message.id.desc())
+        
+        # One extra row tells us whether another page exists without a COUNT
+        messages = [message.to_dict() for message in query.limit(limit + 1)]
+        
+        # Scrolling past the hot rows continues into the archive
+        if after:
+            messages = MessageArchive.fill_newer(room_id, messages, limit, (created_at.isoformat(), message_id))
+        else:
+            cursor = (created_at.isoformat(), message_id) if before else None
+            messages = MessageArchive.fill_older(room_id, messages, limit, cursor)
+        
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        
+        if not after:
+            messages.reverse()
+        return messages, has_more
+    
+    @staticmethod
+    def post(room_id: str, user_id: str, content: str, message_type: str = 'text',
+             reply_to: Optional[str] = None,
+             client_msg_id: Optional[str] = None) -> Tuple[Dict[str, Any], Future, bool]:
+        """Accept a new message for the room's group commit
+        
+        Returns the message as it should be broadcast right away, a Future
+        that resolves once the message is durably stored, and whether it is
+        a resend of a message already accepted under the same client_msg_id
+        (in which case the original is returned and nothing is written).
+        """
+        # A recent resend costs a dictionary lookup: no queries, no write, no broadcast
+        index = get_client_message_index()
+        if client_msg_id:
+            sent = index.get(room_id, user_id, client_msg_id)
+            if sent:
+                return sent[0], sent[1], True
+            
+            # Resent after the index forgot it; the original is stored by now
+            original = MessageService.find_sent(room_id, user_id, client_msg_id)
+            if original:
+                stored = Future()
+                stored.set_result(original['id'])
+                return original, stored, True
+        
+        message = Message(
+            id=str(uuid.uuid4()),
+            room_id=room_id,
+            user_id=user_id,
+            content=content,
+            message_type=message_type,
+            is_edited=False,
+            reply_to=reply_to,
+            reply_count=0,
+            client_msg_id=client_msg_id,
+            created_at=datetime.utcnow()
+        )
+        
+        # The buffer writes the row directly, so take the author snapshot here
+        author = get_message_authors().get(user_id)
+        if author:
+            message.author_name, message.author_picture = author
+        
+        if reply_to:
+            parent = MessageService.find_message(room_id, reply_to)
+            message.thread_root_id = (parent['thread_root_id'] or parent['id']) if parent else reply_to
+        
+        # Fetched before claiming, which holds the id index's lock while it submits
+        trending = get_trending_tracker()
+        if client_msg_id:
+            return index.claim(room_id, user_id, client_msg_id, lambda: MessageService._submit(message, trending))
+        
+        payload, stored = MessageService._submit(message, trending)
+        return payload, stored, False
+    
+    @staticmethod
+    def find_message(room_id: str, message_id: str) -> Optional[Dict[str, Any]]:
+        """A room's serialized message, from the recent cache when it is there (so possibly not stored yet)"""
+        message = get_recent_messages().find(room_id, message_id)
+        if message:
+            return message
+        
+        stored = Message.query.filter_by(id=message_id, room_id=room_id).first()
+        return stored.to_dict() if stored else None
+    
+    @staticmethod
+    def find_sent(room_id: str, user_id: str, client_msg_id: str) -> Optional[Dict[str, Any]]:
+        """The stored message a sender posted under a client_msg_id, if any"""
+        original = Message.query.filter_by(room_id=room_id, user_id=user_id, client_msg_id=client_msg_id).first()
+        return original.to_dict() if original else None
+    
+    @staticmethod
+    def _submit(message: Message, trending: TrendingTracker) -> Tuple[Dict[str, Any], Future]:
+        """Hand a built message to the recent cache and the write buffer"""
+        room_id = message.room_id
+        payload = message.to_dict()
+        recent = get_recent_messages()
+        recent.add(room_id, payload)
+        if message.thread_root_id:
+            recent.count_reply(room_id, message.thread_root_id, 1)
+        
+        def settle(future):
+            if future.exception():
+                recent.remove(room_id, payload['id'])
+                if message.thread_root_id:
+                    recent.count_reply(room_id, message.thread_root_id, -1)
+            elif message.message_type != 'system':
+                trending.record(room_id, 'message', message.created_at)
+        
+        stored = get_message_buffer().submit(message)
+        stored.add_done_callback(settle)
+        return payload, stored
+    
+    @staticmethod
+    def get_thread(message_id: str) -> Optional[Dict[str, Any]]:
+        """The whole reply tree containing a message, rooted at its top-level message
+        
+        Every reply records its thread's root when posted, so the tree is one
+        indexed query at any depth. Each node carries its direct `replies`.
+        A root that has been archived is read back from the room's archive.
+        """
+        message = Message.query.get(message_id)
+        if not message:
+            return None
+        
+        root_id = message.thread_root_id or message.id
+        messages = [m.to_dict() for m in Message.query.filter(db.or_(Message.id == root_id, Message.thread_root_id == root_id))]
+        if not any(m['id'] == root_id for m in messages):
+            stored = {m['id'] for m in messages}
+            messages.extend(m for m in MessageArchive.thread(message.room_id, root_id) if m['id'] not in stored)
+        messages.sort(key=lambda m: (m['created_at'], m['id']))
+        
+        nodes = {m['id']: dict(m, replies=[]) for m in messages}
+        for m in messages:
+            if m['id'] != root_id and m['reply_to'] in nodes:
+                nodes[m['reply_to']]['replies'].append(nodes[m['id']])
+        return nodes.get(root_id)
+    
+    @staticmethod
+    def rebuild_threads() -> int:
+        """Recompute thread roots and reply counts from reply_to; returns replies updated"""
+        parents = dict(db.session.query(Message.id, Message.reply_to).filter(Message.reply_to.isnot(None)))
+        
+        roots = {}
+        for message_id in parents:
+            root = message_id
+            while root in parents:
+                root = parents[root]
+            roots[message_id] = root
+        
+        messages = Message.__table__
+        db.session.execute(messages.update().values(thread_root_id=None, reply_count=0))
+        if roots:
+            db.session.execute(
+                messages.update().where(messages.c.id == bindparam('reply_id')).values(thread_root_id=bindparam('root_id')),
+                [{'reply_id': message_id, 'root_id': root} for message_id, root in roots.items()]
+            )
+        
+        counts = {}
+        for root in roots.values():
+            counts[root] = counts.get(root, 0) + 1
+        if counts:
+            db.session.execute(
+                messages.update().where(messages.c.id == bindparam('root_id')).values(reply_count=bindparam('replies')),
+                [{'root_id': root, 'replies': count} for root, count in counts.items()]
+            )
+        
+        db.session.commit()
+        return len(roots)
@@ -0,0 +1,110 @@
+import codecs
+import threading
+import time
+
+class OutputStreamer:
+    """Streams a running execution's output to its room as `execution_output` chunks
+
+    Chunks are coalesced so a room receives at most one event per `interval`
+    seconds, each carrying a sequence number so clients can detect gaps.
+    Streaming stops after `max_bytes` (per turn, for interactive sessions);
+    the full output is still persisted once the run completes.
+    """
+
+    def __init__(self, socketio, logger, room_id: str, execution_id: str, max_bytes: int, interval: float):
+        self.socketio = socketio
+        self.logger = logger
+        self.room_id = room_id
+        self.execution_id = execution_id
+        self.max_bytes = max_bytes
+        self.interval = interval
+
+        self.seq = 0
+        self.streamed_bytes = 0
+        self.truncated = False
+
+        self._decoders = {}
+        self._pending = []  # [stream, text] pairs waiting for the next flush
+        self._last_flush = 0.0
+        self._timer = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def write(self, stream: str, chunk: bytes):
+        """Queue a chunk of stdout or stderr; called from executor reader threads"""
+        with self._lock:
+            if self._closed or self.truncated:
+                return
+
+            remaining = self.max_bytes - self.streamed_bytes
+            if len(chunk) > remaining:
+                chunk = chunk[:remaining]
+                self.truncated = True
+            self.streamed_bytes += len(chunk)
+
+            decoder = self._decoders.get(stream)
+            if decoder is None:
+                decoder = self._decoders[stream] = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            text = decoder.decode(chunk, final=self.truncated)
+
+            if text or self.truncated:
+                if self._pending and self._pending[-1][0] == stream:
+                    self._pending[-1][1] += text
+                else:
+                    self._pending.append([stream, text])
+
+            wait = self._last_flush + self.interval - time.monotonic()
+            if wait <= 0 or self.truncated:
+                self._flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(wait, self._flush_later)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def new_turn(self):
+        """Start a fresh `max_bytes` budget, for the next turn of an interactive session"""
+        with self._lock:
+            self.streamed_bytes = 0
+            self.truncated = False
+
+    def close(self) -> int:
+        """Flush anything pending and stop streaming; returns the last sequence number"""
+        with self._lock:
+            for stream, decoder in self._decoders.items():
+                text = decoder.decode(b'', final=True)
+                if text:
+                    self._pending.append([stream, text])
+            self._flush()
+            self._closed = True
+            return self.seq
+
+    def _flush_later(self):
+        with self._lock:
+            if not self._closed:
+                self._flush()
+
+    def _flush(self):
+        """Emit pending chunks; caller holds the lock"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        self._last_flush = time.monotonic()
+        pending, self._pending = self._pending, []
+
+        for index, (stream, text) in enumerate(pending):
+            self.seq += 1
+            self._emit({
+                'execution_id': self.execution_id,
+                'seq': self.seq,
+                'stream': stream,
+                'data': text,
+                'truncated': self.truncated and index == len(pending) - 1
+            })
+
+    def _emit(self, payload: dict):
+        # Never let a socket error stop the executor from draining the pipe
+        try:
+            self.socketio.emit('execution_output', payload, room=self.room_id)
+        except Exception as e:
+            self.logger.error(f"Failed to stream output for execution {self.execution_id}: {str(e)}")
@@ -0,0 +1,137 @@
+import atexit
+import threading
+import time
+from flask import current_app
+from sqlalchemy import bindparam
+from typing import Dict, List, Optional, Set, Tuple
+
+from models import db, Message, Room, RoomParticipant
+
+UNSTORED_RETRIES = 5  # flushes a marker waits for its message to leave the write buffer
+
+class ReadMarkerBuffer:
+    """Coalesces chat read markers and writes them in batches
+
+    A read marker is the room's message sequence number a participant has
+    read up to; unread counts are the room's sequence minus the marker.
+    Clients may report reads as often as they like: reports are coalesced
+    per (user, room) and written every `interval` seconds in one
+    transaction. Markers only ever move forward, so a late report of an
+    older message never undoes a newer one. A report of a message still
+    waiting in the write buffer is kept for the next few flushes.
+    """
+
+    def __init__(self, app, interval: float):
+        self.app = app
+        self.interval = interval
+
+        self._pending = {}  # (user_id, room_id) -> message_ids read up to, None for the whole room
+        self._retries = {}  # (user_id, room_id, message_id) -> flushes left for a message not stored yet
+        self._lock = threading.Lock()
+
+        thread = threading.Thread(target=self._worker_loop, name='read-marker-writer')
+        thread.daemon = True
+        thread.start()
+
+    def mark(self, user_id: str, room_id: str, message_id: Optional[str] = None):
+        """Record that a user has read a room up to a message, or all of it"""
+        with self._lock:
+            self._add(user_id, room_id, message_id)
+
+    def flush(self):
+        """Write everything reported so far from the calling thread"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if batch:
+            self._write(batch)
+
+    def _worker_loop(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def _add(self, user_id: str, room_id: str, message_id: Optional[str]):
+        """Caller holds the lock"""
+        key = (user_id, room_id)
+        if message_id is None:
+            self._pending[key] = None
+        elif key not in self._pending:
+            self._pending[key] = {message_id}
+        elif self._pending[key] is not None:
+            # Order of arrival says nothing about which is newer; the write keeps the highest seq
+            self._pending[key].add(message_id)
+
+    def _write(self, batch: Dict[Tuple[str, str], Optional[Set[str]]]):
+        with self.app.app_context():
+            try:
+                self._requeue(self._commit(batch))
+            except Exception as e:
+                self.app.logger.error(f"Writing {len(batch)} read markers failed: {str(e)}")
+                db.session.rollback()
+            finally:
+                db.session.remove()
+
+    def _requeue(self, unstored: List[Tuple[str, str, str]]):
+        """Report markers for messages not stored yet again, until they run out of retries"""
+        with self._lock:
+            retries, self._retries = self._retries, {}
+            for key in unstored:
+                left = retries.get(key, UNSTORED_RETRIES)
+                if left > 0:
+                    self._retries[key] = left - 1
+                    self._add(*key)
+
+    @staticmethod
+    def _commit(batch: Dict[Tuple[str, str], Optional[Set[str]]]) -> List[Tuple[str, str, str]]:
+        """Advance the markers; returns the (user_id, room_id, message_id) reports whose message has no seq yet"""
+        messages = Message.__table__
+        rooms = Room.__table__
+        message_seq = db.select(messages.c.seq).where(
+            messages.c.id == bindparam('read_message_id'),
+            messages.c.room_id == bindparam('read_room_id')
+        ).scalar_subquery()
+        room_seq = db.select(rooms.c.message_seq).where(rooms.c.id == bindparam('read_room_id')).scalar_subquery()
+
+        up_to_message = [{'read_user_id': user_id, 'read_room_id': room_id, 'read_message_id': message_id}
+                         for (user_id, room_id), message_ids in batch.items() if message_ids is not None
+                         for message_id in message_ids]
+        stored = set(db.session.execute(
+            db.select(messages.c.room_id, messages.c.id).where(
+                messages.c.id.in_({params['read_message_id'] for params in up_to_message}),
+                messages.c.seq.isnot(None)
+            )
+        ).all()) if up_to_message else set()
+        unstored = [(params['read_user_id'], params['read_room_id'], params['read_message_id'])
+                    for params in up_to_message
+                    if (params['read_room_id'], params['read_message_id']) not in stored]
+        whole_room = [{'read_user_id': user_id, 'read_room_id': room_id}
+                      for (user_id, room_id), message_ids in batch.items() if message_ids is None]
+
+        for seq, params in ((message_seq, up_to_message), (room_seq, whole_room)):
+            if params:
+                db.session.execute(ReadMarkerBuffer._advance(seq), params)
+        db.session.commit()
+        return unstored
+
+    @staticmethod
+    def _advance(seq):
+        participants = RoomParticipant.__table__
+        return participants.update().where(
+            participants.c.user_id == bindparam('read_user_id'),
+            participants.c.room_id == bindparam('read_room_id'),
+            participants.c.is_active == True,
+            participants.c.last_read_seq < seq
+        ).values(last_read_seq=seq)
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+def get_read_markers() -> ReadMarkerBuffer:
+    """Return the process-wide read marker buffer, creating it on first use"""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            app = current_app._get_current_object()
+            _buffer = ReadMarkerBuffer(app, app.config['READ_MARKER_FLUSH_INTERVAL'])
+            atexit.register(_buffer.flush)
+    return _buffer
@@ -0,0 +1,182 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from typing import Any, Dict, List, Optional, Tuple
+
+from models import Message
+from services.message_archive import MessageArchive
+
+class RoomBuffer:
+    """The newest serialized messages of one room, oldest first"""
+
+    def __init__(self, entries: List[Dict[str, Any]], complete: bool):
+        self.entries = entries
+        self.complete = complete  # True while the buffer holds the room's whole history
+        self.last_used = time.monotonic()
+
+class RecentMessageCache:
+    """Per-room ring buffers of recently sent messages
+
+    Joining a room and reading the first page of its history are served from
+    memory. A room is loaded with one query the first time it is needed, kept
+    current as messages are sent, edited and deleted, and dropped after
+    `idle_timeout` seconds without use (or when `max_rooms` is exceeded).
+    Assumes a single server process, as the Socket.IO deployment does.
+    """
+
+    def __init__(self, capacity: int, idle_timeout: float, max_rooms: int):
+        self.capacity = capacity
+        self.idle_timeout = idle_timeout
+        self.max_rooms = max_rooms
+
+        self._rooms = OrderedDict()  # room_id -> RoomBuffer, least recently used first
+        self._loading = {}  # room_id -> messages sent while its buffer was being loaded
+        self._lock = threading.Lock()
+
+    def recent(self, room_id: str, limit: int) -> Optional[Tuple[List[Dict[str, Any]], bool]]:
+        """The room's last `limit` messages and whether older ones exist; None if the buffer can't answer"""
+        if limit > self.capacity:
+            return None
+
+        buffer = self._get(room_id)
+        if buffer is None:
+            buffer = self.load(room_id)
+
+        with self._lock:
+            if len(buffer.entries) < limit and not buffer.complete:
+                return None
+            has_more = len(buffer.entries) > limit or not buffer.complete
+            return list(buffer.entries[-limit:]), has_more
+
+    def load(self, room_id: str) -> RoomBuffer:
+        """Fill the room's buffer from the database unless it is already loaded"""
+        buffer = self._get(room_id)
+        if buffer is not None:
+            return buffer
+
+        with self._lock:
+            self._loading.setdefault(room_id, [])
+
+        try:
+            messages = Message.query.filter_by(room_id=room_id)\
+                .order_by(Message.created_at.desc(), Message.id.desc())\
+                .limit(self.capacity + 1).all()
+            messages = MessageArchive.fill_older(room_id, [message.to_dict() for message in messages], self.capacity)
+            complete = len(messages) <= self.capacity
+            entries = list(reversed(messages[:self.capacity]))
+        except Exception:
+            with self._lock:
+                self._loading.pop(room_id, None)
+            raise
+
+        with self._lock:
+            # Messages sent during the query may or may not be in its result
+            for message in self._loading.pop(room_id, []):
+                self._insert(entries, message)
+
+            buffer = self._rooms.get(room_id)
+            if buffer is None:
+                buffer = RoomBuffer(entries[-self.capacity:], complete and len(entries) <= self.capacity)
+                self._rooms[room_id] = buffer
+                self._evict()
+            return buffer
+
+    def add(self, room_id: str, message: Dict[str, Any]):
+        """Record a newly sent message"""
+        with self._lock:
+            if room_id in self._loading:
+                self._loading[room_id].append(message)
+
+            buffer = self._rooms.get(room_id)
+            if buffer is not None:
+                self._insert(buffer.entries, message)
+                if len(buffer.entries) > self.capacity:
+                    del buffer.entries[:len(buffer.entries) - self.capacity]
+                    buffer.complete = False
+
+    def replace(self, room_id: str, message: Dict[str, Any]):
+        """Swap in the edited or deleted version of a buffered message"""
+        with self._lock:
+            buffer = self._rooms.get(room_id)
+            if buffer is None:
+                return
+            for index, entry in enumerate(buffer.entries):
+                if entry['id'] == message['id']:
+                    buffer.entries[index] = message
+                    break
+
+    def count_reply(self, room_id: str, root_id: str, delta: int):
+        """Adjust the buffered reply count of a thread's root message"""
+        with self._lock:
+            buffer = self._rooms.get(room_id)
+            if buffer is None:
+                return
+            for index, entry in enumerate(buffer.entries):
+                if entry['id'] == root_id:
+                    buffer.entries[index] = dict(entry, reply_count=(entry.get('reply_count') or 0) + delta)
+                    break
+
+    def remove(self, room_id: str, message_id: str):
+        """Forget a message that was broadcast but never stored"""
+        with self._lock:
+            if room_id in self._loading:
+                self._loading[room_id] = [m for m in self._loading[room_id] if m['id'] != message_id]
+
+            buffer = self._rooms.get(room_id)
+            if buffer is not None:
+                buffer.entries = [entry for entry in buffer.entries if entry['id'] != message_id]
+
+    def find(self, room_id: str, message_id: str) -> Optional[Dict[str, Any]]:
+        """A buffered message, stored or not; None if the room isn't loaded or the message is older"""
+        with self._lock:
+            buffer = self._rooms.get(room_id)
+            for entry in (reversed(buffer.entries) if buffer else ()):
+                if entry['id'] == message_id:
+                    return entry
+        return None
+
+    def _get(self, room_id: str) -> Optional[RoomBuffer]:
+        with self._lock:
+            self._evict()
+            buffer = self._rooms.get(room_id)
+            if buffer is not None:
+                buffer.last_used = time.monotonic()
+                self._rooms.move_to_end(room_id)
+            return buffer
+
+    def _evict(self):
+        """Drop idle rooms and trim to max_rooms; caller holds the lock"""
+        cutoff = time.monotonic() - self.idle_timeout
+        while self._rooms:
+            room_id, buffer = next(iter(self._rooms.items()))
+            if buffer.last_used >= cutoff and len(self._rooms) <= self.max_rooms:
+                break
+            del self._rooms[room_id]
+
+    @staticmethod
+    def _insert(entries: List[Dict[str, Any]], message: Dict[str, Any]):
+        """Add a message in (created_at, id) order, ignoring duplicates; caller holds the lock"""
+        if any(entry['id'] == message['id'] for entry in entries):
+            return
+
+        entries.append(message)
+        key = lambda entry: (entry['created_at'], entry['id'])
+        if len(entries) > 1 and key(entries[-2]) > key(message):
+            entries.sort(key=key)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_recent_messages() -> RecentMessageCache:
+    """Return the process-wide recent message cache, creating it on first use"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            app = current_app._get_current_object()
+            _cache = RecentMessageCache(
+                app.config['RECENT_MESSAGES_SIZE'],
+                app.config['RECENT_MESSAGES_IDLE_TIMEOUT'],
+                app.config['RECENT_MESSAGES_MAX_ROOMS']
+            )
+    return _cache
@@ -0,0 +1,113 @@
+from flask import current_app, request, stream_with_context
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+import heapq
+import json
+import zlib
+
+from sqlalchemy.orm import Session, joinedload, undefer_group
+
+from models import db, Blob, Execution, Message
+from services.message_archive import MessageArchive, MessageKey, message_key
+from services.message_service import MessageService
+
+GZIP_FLUSH_LINES = 100  # lines between gzip flushes, so a slow export still arrives steadily
+
+class RoomExport:
+    """Streams a room's full chat or execution history as NDJSON
+
+    Rows come from a server-side cursor in (created_at, id) order, so memory
+    stays flat however large the room is. Every line carries a `cursor`; an
+    interrupted export resumes by passing the last one received as `after`.
+    """
+
+    @staticmethod
+    def messages(room_id: str, after: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Every message of a room, archived ones included, oldest first; raises ValueError for a bad cursor"""
+        key = RoomExport._decode(after)
+        query = db.select(Message).where(Message.room_id == room_id)
+        if key:
+            query = query.where(RoomExport._after(Message, key))
+        query = query.order_by(Message.created_at.asc(), Message.id.asc())
+
+        hot = (message.to_dict() for message in RoomExport._stream(query))
+        return heapq.merge(MessageArchive.stream(room_id, key), hot, key=message_key)
+
+    @staticmethod
+    def executions(room_id: str, after: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Every execution of a room with its source and outputs, oldest first; raises ValueError for a bad cursor"""
+        key = RoomExport._decode(after)
+        query = db.select(Execution).where(Execution.room_id == room_id).options(joinedload(Execution.user), undefer_group('results'))
+        if key:
+            query = query.where(RoomExport._after(Execution, key))
+        query = query.order_by(Execution.created_at.asc(), Execution.id.asc())
+
+        def export():
+            for batch in RoomExport._batches(query):
+                # One blob query per batch instead of five per execution
+                Blob.preload(batch)
+                for execution in batch:
+                    yield execution.to_dict()
+        return export()
+
+    @staticmethod
+    def response(records: Iterator[Dict[str, Any]], filename: str):
+        """Streaming NDJSON download, gzipped when the client accepts it"""
+        compress = 'gzip' in request.accept_encodings
+        response = current_app.response_class(
+            stream_with_context(RoomExport.ndjson(records, compress)),
+            mimetype='application/x-ndjson'
+        )
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        if compress:
+            response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+        return response
+
+    @staticmethod
+    def ndjson(records: Iterator[Dict[str, Any]], compress: bool = False) -> Iterator[bytes]:
+        """Encode records as NDJSON lines with resume cursors, optionally gzipped"""
+        gzip = zlib.compressobj(wbits=31) if compress else None  # wbits=31 writes a gzip header
+
+        for count, record in enumerate(records, 1):
+            line = json.dumps(dict(record, cursor=MessageService.encode_cursor(record))).encode('utf-8') + b'\n'
+            if gzip is None:
+                yield line
+                continue
+            chunk = gzip.compress(line)
+            if count % GZIP_FLUSH_LINES == 0:
+                chunk += gzip.flush(zlib.Z_SYNC_FLUSH)
+            if chunk:
+                yield chunk
+
+        if gzip is not None:
+            yield gzip.flush()
+
+    @staticmethod
+    def _stream(query) -> Iterator[Any]:
+        for batch in RoomExport._batches(query):
+            yield from batch
+
+    @staticmethod
+    def _batches(query) -> Iterator[List[Any]]:
+        """The query's rows, EXPORT_YIELD_PER at a time"""
+        # A session of its own keeps the cursor's connection busy with nothing
+        # else; blob and archive reads go through the request's session meanwhile
+        with Session(db.engine) as session:
+            yield from session.scalars(query.execution_options(yield_per=current_app.config['EXPORT_YIELD_PER'])).partitions()
+
+    @staticmethod
+    def _decode(after: Optional[str]) -> Optional[MessageKey]:
+        """Resume cursor as a (created_at isoformat, id) key; raises ValueError if malformed"""
+        if not after:
+            return None
+        created_at, record_id = MessageService.decode_cursor(after)
+        return created_at.isoformat(), record_id
+
+    @staticmethod
+    def _after(model, key: MessageKey):
+        created_at = datetime.fromisoformat(key[0])
+        return db.or_(
+            model.created_at > created_at,
+            db.and_(model.created_at == created_at, model.id > key[1])
+        )
@@ -0,0 +1,171 @@
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from flask import current_app
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models import db, Room
+
+WORD_RE = re.compile(r'\w+')
+EMPTY = frozenset()
+
+INDEXED_FIELDS = ('name', 'description', 'language', 'is_active', 'is_private')
+
+def trigrams(text: str, prefix: bool = False) -> Set[str]:
+    """Padded character trigrams of every word; `prefix` leaves word ends open for query terms"""
+    grams = set()
+    for word in WORD_RE.findall((text or '').lower()):
+        padded = '  ' + word + ('' if prefix else ' ')
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+class RoomSearchIndex:
+    """In-memory trigram index over the names and descriptions of public rooms
+
+    A query word matches a room when enough of its trigrams occur in the
+    room's text (`min_similarity`), which covers prefixes ("pyth") and small
+    typos ("pyhton"); every query word must match. The index is built from
+    the database on first use and kept current from committed sessions.
+    Assumes a single server process, as the Socket.IO deployment does.
+    """
+
+    def __init__(self, min_similarity: float):
+        self.min_similarity = min_similarity
+
+        self._rooms = {}  # room_id -> (language, indexed text)
+        self._postings = defaultdict(set)  # trigram -> room_ids
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Index every active public room"""
+        rooms = {}
+        postings = defaultdict(set)
+        for room_id, name, description, language in db.session.query(Room.id, Room.name, Room.description, Room.language)\
+                .filter(Room.is_active == True, Room.is_private == False):
+            text = f'{name} {description or ""}'
+            rooms[room_id] = (language, text)
+            for gram in trigrams(text):
+                postings[gram].add(room_id)
+
+        with self._lock:
+            self._rooms, self._postings = rooms, postings
+
+    def add(self, room_id: str, name: str, description: Optional[str], language: str):
+        """Index a room, replacing any earlier version of it"""
+        text = f'{name} {description or ""}'
+        with self._lock:
+            self._remove(room_id)
+            self._rooms[room_id] = (language, text)
+            for gram in trigrams(text):
+                self._postings[gram].add(room_id)
+
+    def remove(self, room_id: str):
+        """Drop a room from the index"""
+        with self._lock:
+            self._remove(room_id)
+
+    def search(self, query: str, language: Optional[str] = None) -> Tuple[List[Tuple[str, float]], Dict[str, int]]:
+        """Matching (room_id, score) pairs, best first, and per-language counts of all matches
+
+        Facet counts ignore the language filter, so they show what choosing
+        another language would return.
+        """
+        terms = [trigrams(word, prefix=True) for word in WORD_RE.findall(query.lower())]
+
+        with self._lock:
+            if not terms:
+                scores = dict.fromkeys(self._rooms, 0.0)
+            else:
+                scores = None
+                for grams in terms:
+                    postings = sorted((self._postings.get(gram, EMPTY) for gram in grams), key=len)
+                    needed = max(1, math.ceil(self.min_similarity * len(grams)))
+
+                    # A room with `needed` of the trigrams has at least one of the rarest len - needed + 1
+                    candidates = set().union(*postings[:len(grams) - needed + 1])
+                    if scores is not None:
+                        candidates &= scores.keys()
+
+                    matched = {}
+                    for room_id in candidates:
+                        count = sum(room_id in posting for posting in postings)
+                        if count >= needed:
+                            matched[room_id] = count / len(grams) + (scores[room_id] if scores else 0)
+                    scores = matched
+
+            facets = Counter(self._rooms[room_id][0] for room_id in scores)
+            if language:
+                scores = {room_id: score for room_id, score in scores.items() if self._rooms[room_id][0] == language}
+
+        return sorted(scores.items(), key=lambda match: -match[1]), dict(facets)
+
+    def evict(self, room_ids: List[str]) -> Dict[str, int]:
+        """Drop rooms the database no longer shows; returns how many were dropped per language"""
+        dropped = Counter()
+        with self._lock:
+            for room_id in room_ids:
+                entry = self._rooms.get(room_id)
+                if entry:
+                    dropped[entry[0]] += 1
+                    self._remove(room_id)
+        return dict(dropped)
+
+    def _remove(self, room_id: str):
+        """Caller holds the lock"""
+        entry = self._rooms.pop(room_id, None)
+        if entry:
+            for gram in trigrams(entry[1]):
+                postings = self._postings[gram]
+                postings.discard(room_id)
+                if not postings:
+                    del self._postings[gram]
+
+@event.listens_for(Session, 'after_flush')
+def collect_room_changes(session, flush_context):
+    """Note searchable room changes; they reach the index only if the transaction commits"""
+    changes = session.info.setdefault('room_search_changes', {})
+    for instance in session.new:
+        if isinstance(instance, Room):
+            changes[instance.id] = (instance.name, instance.description, instance.language,
+                                    instance.is_active, instance.is_private)
+    for instance in session.dirty:
+        if isinstance(instance, Room):
+            state = inspect(instance)
+            if any(state.attrs[field].history.has_changes() for field in INDEXED_FIELDS):
+                changes[instance.id] = (instance.name, instance.description, instance.language,
+                                        instance.is_active, instance.is_private)
+    for instance in session.deleted:
+        if isinstance(instance, Room):
+            changes[instance.id] = None
+
+@event.listens_for(Session, 'after_commit')
+def apply_room_changes(session):
+    changes = session.info.pop('room_search_changes', None)
+    if not changes or _index is None:
+        return  # an index built later reads the committed rows itself
+    for room_id, fields in changes.items():
+        if fields is None or not fields[3] or fields[4]:
+            _index.remove(room_id)
+        else:
+            _index.add(room_id, fields[0], fields[1], fields[2])
+
+@event.listens_for(Session, 'after_rollback')
+def discard_room_changes(session):
+    session.info.pop('room_search_changes', None)
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_room_search_index() -> RoomSearchIndex:
+    """Return the process-wide room search index, building it on first use"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            index = RoomSearchIndex(current_app.config['ROOM_SEARCH_MIN_SIMILARITY'])
+            index.load()
+            _index = index
+    return _index
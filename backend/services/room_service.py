@@ -1,14 +1,56 @@
 from flask import current_app
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import secrets
 import string
 
+from sqlalchemy.orm import joinedload, load_only
+
 from models import db, Room, RoomParticipant, User, Message, Execution
+from services.room_search import get_room_search_index
+from services.room_stats import RoomStatsService
+from services.trending import RANKED, TrendingTracker, get_trending_tracker
 
 class RoomService:
     """Service for room-related operations"""
     
+    @staticmethod
+    def serialize_rooms(rooms: List[Room], include_participants: bool = True) -> List[Dict[str, Any]]:
+        """Serialize a page of rooms with owner info and stats in a fixed number of queries
+        
+        Same output as room.to_dict() plus owner_name / owner_picture and the
+        room's running `stats`, but the active participants (with their
+        users), the owners and the stats of every room are loaded with one
+        query each rather than per room.
+        """
+        if not rooms:
+            return []
+        
+        room_ids = [room.id for room in rooms]
+        owners = {user.id: user for user in User.query.filter(User.id.in_({room.created_by for room in rooms}))}
+        stats = RoomStatsService.for_rooms(rooms)
+        
+        participants = {}
+        if include_participants:
+            for participant in RoomParticipant.query.options(joinedload(RoomParticipant.user))\
+                    .filter(RoomParticipant.room_id.in_(room_ids), RoomParticipant.is_active == True):
+                participants.setdefault(participant.room_id, []).append(participant.to_dict())
+        
+        results = []
+        for room in rooms:
+            room_dict = room.to_dict(include_participants=False)
+            room_dict['stats'] = stats[room.id]
+            if include_participants:
+                room_dict['participants'] = participants.get(room.id, [])
+            
+            owner = owners.get(room.created_by)
+            if owner:
+                room_dict['owner_name'] = owner.name
+                room_dict['owner_picture'] = owner.picture
+            
+            results.append(room_dict)
+        return results
+    
     @staticmethod
     def cleanup_inactive_rooms():
         """Clean up inactive rooms and participants"""
@@ -68,7 +110,7 @@ class RoomService:
     def validate_room_access(room_id: str, user_id: str) -> bool:
         """Check if user has access to room"""
         try:
-            room = Room.query.filter_by(id=room_id, is_active=True).first()
+            room = Room.query.options(load_only(Room.is_private)).filter_by(id=room_id, is_active=True).first()
             if not room:
                 return False
             
@@ -128,44 +170,28 @@ class RoomService:
     
     @staticmethod
     def get_room_statistics(room_id: str) -> Dict[str, Any]:
-        """Get detailed room statistics"""
+        """Get detailed room statistics
+        
+        Totals come from the room_stats counters and the last 24 hours of
+        messages from the trending tracker, so no rows are counted per call.
+        """
         try:
             room = Room.query.get(room_id)
             if not room:
                 return {}
             
-            # Get participant stats
-            total_participants = RoomParticipant.query.filter_by(room_id=room_id).count()
-            active_participants = RoomParticipant.query.filter_by(
-                room_id=room_id, 
-                is_active=True
-            ).count()
-            
-            # Get message stats
-            total_messages = Message.query.filter_by(room_id=room_id).count()
-            recent_messages = Message.query.filter_by(room_id=room_id).filter(
-                Message.created_at >= datetime.utcnow() - timedelta(hours=24)
-            ).count()
+            stats = RoomStatsService.for_rooms([room])[room.id]
+            total_executions = stats['total_executions']
+            successful_executions = stats['successful_executions']
             
-            # Get execution stats
-            total_executions = Execution.query.filter_by(room_id=room_id).count()
-            successful_executions = Execution.query.filter_by(
-                room_id=room_id, 
-                status='completed'
-            ).count()
-            
-            return {
-                'room_id': room_id,
-                'total_participants_ever': total_participants,
-                'current_active_participants': active_participants,
-                'total_messages': total_messages,
-                'messages_last_24h': recent_messages,
-                'total_executions': total_executions,
-                'successful_executions': successful_executions,
-                'success_rate': (successful_executions / total_executions * 100) if total_executions > 0 else 0,
-                'room_age_hours': (datetime.utcnow() - room.created_at).total_seconds() / 3600,
-                'last_activity': room.last_activity.isoformat() if room.last_activity else None
-            }
+            return dict(
+                stats,
+                room_id=room_id,
+                messages_last_24h=get_trending_tracker().recent_activity(room_id)['message'],
+                success_rate=(successful_executions / total_executions * 100) if total_executions > 0 else 0,
+                room_age_hours=(datetime.utcnow() - room.created_at).total_seconds() / 3600,
+                last_activity=room.last_activity.isoformat() if room.last_activity else None
+            )
             
         except Exception as e:
             current_app.logger.error(f"Failed to get room statistics: {str(e)}")
@@ -173,99 +199,96 @@ class RoomService:
     
     @staticmethod
     def get_trending_rooms(limit: int = 10) -> List[Dict[str, Any]]:
-        """Get trending public rooms based on activity"""
+        """Get trending public rooms, best first, by exponentially decayed activity
+        
+        Scores are kept up to date by the trending tracker as messages,
+        executions and joins happen; the serialized list is rebuilt only when
+        the tracker re-sorts its ranking, so most calls touch no database.
+        """
         try:
-            # Calculate trending score based on recent activity
-            recent_time = datetime.utcnow() - timedelta(hours=24)
-            
-            rooms = db.session.query(Room).filter(
-                Room.is_active == True,
-                Room.is_private == False,
-                Room.last_activity >= recent_time
-            ).order_by(
-                Room.current_participants.desc(),
-                Room.last_activity.desc()
-            ).limit(limit).all()
-            
-            trending_data = []
-            for room in rooms:
-                room_dict = room.to_dict()
-                
-                # Add trending metrics
-                recent_messages = Message.query.filter_by(room_id=room.id).filter(
-                    Message.created_at >= recent_time
-                ).count()
-                
-                recent_executions = Execution.query.filter_by(room_id=room.id).filter(
-                    Execution.created_at >= recent_time
-                ).count()
-                
-                room_dict['trending_score'] = (
-                    room.current_participants * 10 +
-                    recent_messages * 2 +
-                    recent_executions * 5
-                )
-                room_dict['recent_activity'] = {
-                    'messages': recent_messages,
-                    'executions': recent_executions
-                }
-                
-                # Add owner info
-                owner = User.query.get(room.created_by)
-                if owner:
-                    room_dict['owner_name'] = owner.name
-                    room_dict['owner_picture'] = owner.picture
-                
-                trending_data.append(room_dict)
-            
-            return trending_data
+            tracker = get_trending_tracker()
+            return tracker.memo(('rooms', limit), lambda: RoomService._build_trending_rooms(tracker, limit))
             
         except Exception as e:
             current_app.logger.error(f"Failed to get trending rooms: {str(e)}")
             return []
     
     @staticmethod
-    def search_rooms(query: str, language: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
-        """Search rooms by name, description, or language"""
-        try:
-            room_query = Room.query.filter(
+    def _build_trending_rooms(tracker: TrendingTracker, limit: int) -> List[Dict[str, Any]]:
+        # Private and closed rooms are ranked too, so walk down until enough public ones are found.
+        # One snapshot of the ranking, so a re-sort part way down can't skip or repeat rooms
+        ranking = tracker.top(RANKED)
+        picked = []
+        start = 0
+        while len(picked) < limit:
+            ranked = ranking[start:start + limit * 2]
+            if not ranked:
+                break
+            start += len(ranked)
+            
+            rooms = {room.id: room for room in Room.query.filter(
+                Room.id.in_([room_id for room_id, _ in ranked]),
                 Room.is_active == True,
                 Room.is_private == False
+            )}
+            picked.extend((rooms[room_id], score) for room_id, score in ranked if room_id in rooms)
+        picked = picked[:limit]
+        
+        trending_data = []
+        for (room, score), room_dict in zip(picked, RoomService.serialize_rooms([room for room, _ in picked])):
+            room_dict['trending_score'] = round(score, 2)
+            room_dict['recent_activity'] = tracker.recent_activity(room.id)
+            trending_data.append(room_dict)
+        return trending_data
+    
+    @staticmethod
+    def find_public_rooms(query: str, language: Optional[str], offset: int, limit: int,
+                          tiebreak=Room.last_activity) -> Tuple[List[Room], int, bool, Dict[str, int]]:
+        """One page of public rooms matching a search, the pageable total, whether matches were capped, and language facets
+        
+        Matches come from the in-memory trigram index, best first; equally
+        relevant rooms are ordered by `tiebreak`, descending. Only the best
+        ROOM_SEARCH_MAX_RANKED matches are ranked and paged through, so the
+        total never exceeds it.
+        """
+        index = get_room_search_index()
+        matches, facets = index.search(query, language)
+        max_ranked = current_app.config['ROOM_SEARCH_MAX_RANKED']
+        ranked = matches[:max_ranked]
+        
+        sort_keys = dict(db.session.query(Room.id, tiebreak).filter(
+            Room.id.in_([room_id for room_id, _ in ranked]),
+            Room.is_active == True,
+            Room.is_private == False
+        ).all())
+        
+        # Rooms hidden without going through the ORM; drop them from the index and its counts
+        stale = [room_id for room_id, _ in ranked if room_id not in sort_keys]
+        if stale:
+            for room_language, count in index.evict(stale).items():
+                facets[room_language] -= count
+                if facets[room_language] <= 0:
+                    del facets[room_language]
+        ranked = [match for match in ranked if match[0] in sort_keys]
+        ranked.sort(key=lambda match: (sort_keys[match[0]] is not None, sort_keys[match[0]] or 0), reverse=True)
+        ranked.sort(key=lambda match: match[1], reverse=True)
+        
+        page_ids = [room_id for room_id, _ in ranked[offset:offset + limit]]
+        rooms = {room.id: room for room in Room.query.filter(Room.id.in_(page_ids))}
+        return [rooms[room_id] for room_id in page_ids if room_id in rooms], len(ranked), len(matches) > max_ranked, facets
+    
+    @staticmethod
+    def search_rooms(query: str, language: Optional[str] = None, limit: int = 20) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+        """Search public rooms by name or description (prefix and typo tolerant); returns rooms and language facets"""
+        try:
+            rooms, _, _, facets = RoomService.find_public_rooms(
+                query, language, 0, limit, tiebreak=Room.current_participants
             )
-            
-            if query:
-                room_query = room_query.filter(
-                    db.or_(
-                        Room.name.ilike(f'%{query}%'),
-                        Room.description.ilike(f'%{query}%')
-                    )
-                )
-            
-            if language:
-                room_query = room_query.filter(Room.language == language)
-            
-            rooms = room_query.order_by(
-                Room.current_participants.desc(),
-                Room.last_activity.desc()
-            ).limit(limit).all()
-            
-            results = []
-            for room in rooms:
-                room_dict = room.to_dict()
-                
-                # Add owner info
-                owner = User.query.get(room.created_by)
-                if owner:
-                    room_dict['owner_name'] = owner.name
-                    room_dict['owner_picture'] = owner.picture
-                
-                results.append(room_dict)
-            
-            return results
+            return RoomService.serialize_rooms(rooms), facets
             
         except Exception as e:
             current_app.logger.error(f"Failed to search rooms: {str(e)}")
-            return []
+            return [], {}
     
     @staticmethod
     def transfer_room_ownership(room_id: str, current_owner_id: str, new_owner_id: str) -> bool:
@@ -0,0 +1,116 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from models import db, Execution, Message, MessageArchiveSegment, Room, RoomParticipant, RoomStats
+
+class RoomStatsService:
+    """Per-room statistics read from the room_stats running totals"""
+
+    @staticmethod
+    def for_rooms(rooms: List[Room]) -> Dict[str, Dict[str, int]]:
+        """Totals of every room in one query; rooms without a row yet are recounted first"""
+        room_ids = [room.id for room in rooms]
+        totals = {stats.room_id: stats.to_dict() for stats in RoomStats.query.filter(RoomStats.room_id.in_(room_ids))}
+
+        missing = [room_id for room_id in room_ids if room_id not in totals]
+        if missing:
+            totals.update(RoomStatsService.recount(missing))
+
+        return {room.id: {
+            'total_participants_ever': totals[room.id]['participants_ever'],
+            'current_active_participants': room.current_participants,
+            'total_messages': totals[room.id]['messages'],
+            'total_executions': totals[room.id]['executions'],
+            'successful_executions': totals[room.id]['successful_executions']
+        } for room in rooms}
+
+    @staticmethod
+    def recount(room_ids: List[str], fix_participants: bool = False) -> Dict[str, Dict[str, int]]:
+        """Count some rooms' totals from their rows and store them, in a transaction of its own
+
+        Each room's result also carries its `active_participants`; with
+        `fix_participants` that count is written to rooms.current_participants.
+        """
+        participants = RoomParticipant.__table__
+        executions = Execution.__table__
+        messages = Message.__table__
+        segments = MessageArchiveSegment.__table__
+        rooms = Room.__table__
+
+        with db.engine.begin() as connection:
+            # Hold concurrent increments back until the recount is stored
+            connection.execute(
+                db.select(RoomStats.__table__.c.room_id)
+                .where(RoomStats.__table__.c.room_id.in_(room_ids))
+                .with_for_update()
+            ).all()
+
+            totals = {room_id: dict.fromkeys(RoomStats.COUNTERS, 0) for room_id in room_ids}
+            for room_id, joined, still_active in connection.execute(
+                db.select(
+                    participants.c.room_id,
+                    db.func.count(),
+                    db.func.sum(db.case((participants.c.is_active == True, 1), else_=0))
+                ).where(participants.c.room_id.in_(room_ids)).group_by(participants.c.room_id)
+            ):
+                totals[room_id]['participants_ever'] = joined
+                totals[room_id]['active_participants'] = int(still_active or 0)
+            for room_id, runs, completed in connection.execute(
+                db.select(
+                    executions.c.room_id,
+                    db.func.count(),
+                    db.func.sum(db.case((executions.c.status == 'completed', 1), else_=0))
+                ).where(executions.c.room_id.in_(room_ids)).group_by(executions.c.room_id)
+            ):
+                totals[room_id]['executions'] = runs
+                totals[room_id]['successful_executions'] = int(completed or 0)
+            for room_id, stored in connection.execute(
+                db.select(messages.c.room_id, db.func.count())
+                .where(messages.c.room_id.in_(room_ids)).group_by(messages.c.room_id)
+            ):
+                totals[room_id]['messages'] += stored
+            for room_id, archived in connection.execute(
+                db.select(segments.c.room_id, db.func.sum(segments.c.message_count))
+                .where(segments.c.room_id.in_(room_ids)).group_by(segments.c.room_id)
+            ):
+                totals[room_id]['messages'] += int(archived or 0)
+
+            now = datetime.utcnow()
+            RoomStats.store(connection, [
+                dict({field: counters[field] for field in RoomStats.COUNTERS}, room_id=room_id, reconciled_at=now)
+                for room_id, counters in totals.items()
+            ])
+            if fix_participants:
+                connection.execute(
+                    rooms.update().where(rooms.c.id == db.bindparam('active_room_id'))
+                    .values(current_participants=db.bindparam('active_count')),
+                    [{'active_room_id': room_id, 'active_count': counters.get('active_participants', 0)}
+                     for room_id, counters in totals.items()]
+                )
+
+        return totals
+
+    @staticmethod
+    def reconcile(batch_size: int = 500) -> int:
+        """Recount every room's totals and participant count; returns how many rooms had drifted"""
+        drifted = 0
+        last_id: Optional[str] = None
+        while True:
+            query = db.session.query(Room.id, Room.current_participants).order_by(Room.id)
+            if last_id:
+                query = query.filter(Room.id > last_id)
+            batch = query.limit(batch_size).all()
+            if not batch:
+                return drifted
+            last_id = batch[-1][0]
+
+            room_ids = [room_id for room_id, _ in batch]
+            stored = {stats.room_id: stats.to_dict() for stats in RoomStats.query.filter(RoomStats.room_id.in_(room_ids))}
+            db.session.rollback()
+
+            totals = RoomStatsService.recount(room_ids, fix_participants=True)
+            for room_id, current_participants in batch:
+                counters = totals[room_id]
+                if (stored.get(room_id) != {field: counters[field] for field in RoomStats.COUNTERS}
+                        or current_participants != counters.get('active_participants', 0)):
+                    drifted += 1
@@ -0,0 +1,199 @@
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, Execution, Message, RoomParticipant
+
+# Points per event, as in the original trending formula
+WEIGHTS = {'message': 2, 'execution': 5, 'join': 10}
+
+EPOCH = datetime(1970, 1, 1)
+REBASE_AFTER = 64  # half-lives of growth before stored scores are scaled back down
+MIN_SCORE = 0.01  # rooms decayed below this, with no recent events, are forgotten
+RANKED = 1000  # rooms kept in the sorted ranking; trending pages never reach further
+
+def timestamp(at: datetime) -> float:
+    """Seconds since the epoch of a naive UTC datetime, as the models store them"""
+    return (at - EPOCH).total_seconds()
+
+class RoomActivity:
+    """Decayed score and hourly event counts of one room"""
+    __slots__ = ('score', 'buckets')
+
+    def __init__(self):
+        self.score = 0.0  # sum of weight * 2 ** ((event time - landmark) / half_life)
+        self.buckets = {}  # hour since the epoch -> {event kind: count}
+
+class TrendingTracker:
+    """Exponentially decayed activity scores of rooms
+
+    Every message, execution and join adds its weight to its room's score,
+    and scores halve every `half_life` seconds. Scores are stored relative
+    to a fixed landmark time (forward decay), so recording an event is O(1),
+    never touches other rooms, and decay alone never changes the order. The
+    ranking is re-sorted at most every `refresh_interval` seconds; reading
+    the top K is a slice of it. Hourly counts over the last `window_hours`
+    back each room's `recent_activity`.
+    Assumes a single server process, as the Socket.IO deployment does.
+    """
+
+    def __init__(self, half_life: float, window_hours: int, refresh_interval: float):
+        self.half_life = half_life
+        self.window_hours = window_hours
+        self.refresh_interval = refresh_interval
+
+        self._rooms = {}  # room_id -> RoomActivity
+        self._landmark = time.time()
+        self._ranking = []  # (room_id, stored score), best first
+        self._ranked_at = None
+        self._pruned_hour = None  # first hour of the window when cold rooms were last dropped
+        self._version = 0  # bumped on every re-sort
+        self._memo = {}  # key -> value built from the current version's ranking
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Replay the last `window_hours` of messages, executions and joins"""
+        since = datetime.utcnow() - timedelta(hours=self.window_hours)
+        sources = (
+            ('message', db.session.query(Message.room_id, Message.created_at)
+             .filter(Message.created_at >= since, Message.message_type != 'system')),
+            ('execution', db.session.query(Execution.room_id, Execution.created_at)
+             .filter(Execution.created_at >= since)),
+            ('join', db.session.query(RoomParticipant.room_id, RoomParticipant.joined_at)
+             .filter(RoomParticipant.joined_at >= since)),
+        )
+        for kind, query in sources:
+            for room_id, at in query.yield_per(1000):
+                with self._lock:
+                    self._add(room_id, kind, timestamp(at))
+
+    def record(self, room_id: str, kind: str, at: datetime):
+        """Count one event of `kind` ('message', 'execution' or 'join')"""
+        with self._lock:
+            self._add(room_id, kind, timestamp(at))
+
+    def top(self, count: int, start: int = 0) -> List[Tuple[str, float]]:
+        """(room_id, current score) pairs at ranks start..start + count of the current ranking"""
+        with self._lock:
+            self._refresh_if_due()
+            scale = 2 ** ((self._landmark - time.time()) / self.half_life)
+            return [(room_id, score * scale) for room_id, score in self._ranking[start:start + count]]
+
+    def recent_activity(self, room_id: str) -> Dict[str, int]:
+        """The room's event counts over the last `window_hours`"""
+        first_hour = int(time.time() // 3600) - self.window_hours + 1
+        counts = dict.fromkeys(WEIGHTS, 0)
+        with self._lock:
+            activity = self._rooms.get(room_id)
+            for hour, bucket in (activity.buckets.items() if activity else ()):
+                if hour >= first_hour:
+                    for kind, count in bucket.items():
+                        counts[kind] += count
+        return counts
+
+    def memo(self, key: Hashable, build: Callable[[], Any]) -> Any:
+        """`build()`'s result, reused until the ranking is next re-sorted"""
+        with self._lock:
+            self._refresh_if_due()
+            version = self._version
+            if key in self._memo:
+                return self._memo[key]
+
+        value = build()
+        with self._lock:
+            if self._version == version:
+                self._memo[key] = value
+        return value
+
+    def _add(self, room_id: str, kind: str, at: float):
+        """Caller holds the lock"""
+        exponent = (at - self._landmark) / self.half_life
+        if exponent > REBASE_AFTER:
+            self._rebase(at)
+            exponent = 0.0
+
+        activity = self._rooms.get(room_id)
+        if activity is None:
+            activity = self._rooms[room_id] = RoomActivity()
+        activity.score += WEIGHTS[kind] * 2 ** exponent
+
+        bucket = activity.buckets.setdefault(int(at // 3600), dict.fromkeys(WEIGHTS, 0))
+        bucket[kind] += 1
+
+    def _rebase(self, landmark: float):
+        """Move the landmark forward so stored scores stay within float range; caller holds the lock"""
+        factor = 2 ** ((self._landmark - landmark) / self.half_life)
+        for activity in self._rooms.values():
+            activity.score *= factor
+        self._landmark = landmark
+        self._ranked_at = None
+
+    def _refresh_if_due(self):
+        """Re-sort the ranking once it is older than refresh_interval; caller holds the lock"""
+        now = time.monotonic()
+        if self._ranked_at is not None and now - self._ranked_at < self.refresh_interval:
+            return
+
+        # Buckets only expire on the hour, so cold rooms are dropped once an hour
+        first_hour = int(time.time() // 3600) - self.window_hours + 1
+        if first_hour != self._pruned_hour:
+            cutoff = MIN_SCORE * 2 ** ((time.time() - self._landmark) / self.half_life)
+            for room_id in list(self._rooms):
+                activity = self._rooms[room_id]
+                for hour in [hour for hour in activity.buckets if hour < first_hour]:
+                    del activity.buckets[hour]
+                if activity.score < cutoff and not activity.buckets:
+                    del self._rooms[room_id]
+            self._pruned_hour = first_hour
+
+        self._ranking = heapq.nlargest(RANKED, ((room_id, activity.score) for room_id, activity in self._rooms.items()),
+                                       key=lambda entry: entry[1])
+        self._ranked_at = now
+        self._version += 1
+        self._memo = {}
+
+@event.listens_for(Session, 'after_flush')
+def collect_room_events(session, flush_context):
+    """Note new executions and joins; they are counted only if the transaction commits"""
+    events = session.info.setdefault('trending_events', [])
+    for instance in session.new:
+        if isinstance(instance, Execution):
+            events.append((instance.room_id, 'execution'))
+        elif isinstance(instance, RoomParticipant):
+            events.append((instance.room_id, 'join'))
+
+@event.listens_for(Session, 'after_commit')
+def record_room_events(session):
+    events = session.info.pop('trending_events', None)
+    if not events or _tracker is None:
+        return  # a tracker built later replays the committed rows itself
+    now = datetime.utcnow()
+    for room_id, kind in events:
+        _tracker.record(room_id, kind, now)
+
+@event.listens_for(Session, 'after_rollback')
+def discard_room_events(session):
+    session.info.pop('trending_events', None)
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+def get_trending_tracker() -> TrendingTracker:
+    """Return the process-wide trending tracker, replaying recent activity on first use"""
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            tracker = TrendingTracker(
+                current_app.config['TRENDING_HALF_LIFE'],
+                current_app.config['TRENDING_WINDOW_HOURS'],
+                current_app.config['TRENDING_REFRESH_INTERVAL']
+            )
+            tracker.load()
+            _tracker = tracker
+    return _tracker
@@ -4,8 +4,16 @@ from flask import current_app, request
 from datetime import datetime
 import json
 
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import undefer_group
 from models import db, Room, RoomParticipant, User, Message, Execution
 from services.room_service import RoomService
+from services.message_service import MessageService
+from services.recent_messages import get_recent_messages
+from services.read_markers import get_read_markers
+from services.execution_service import ExecutionService
+from services.interactive_service import InteractiveService
+from services.execution_scheduler import SchedulerOverloaded
 
 from services.auth_service import AuthService
 from flask import session
@@ -62,6 +70,7 @@ def create_socket_handlers(socketio: SocketIO):
                 if current_room:
                     # Leave current room
                     leave_room(current_room)
+                    ExecutionService.cancel_auto_run(current_room, user_id)
                     
                     # Update participant status
                     RoomService.update_participant_activity(current_room, user_id)
@@ -111,13 +120,15 @@ def create_socket_handlers(socketio: SocketIO):
             # Join new room
             join_room(room_id)
             connection_info['current_room'] = room_id
+            get_recent_messages().load(room_id)
+            get_read_markers().mark(user_id, room_id)
             
             # Update participant activity
             RoomService.update_participant_activity(room_id, user_id)
             RoomService.update_room_activity(room_id)
             
             # Get room and user info
-            room = Room.query.get(room_id)
+            room = Room.query.options(undefer_group('content')).get(room_id)
             user = User.query.get(user_id)
             
             if room and user:
@@ -154,6 +165,7 @@ def create_socket_handlers(socketio: SocketIO):
             
             if room_id:
                 leave_room(room_id)
+                ExecutionService.cancel_auto_run(room_id, user_id)
                 
                 # Update participant activity
                 RoomService.update_participant_activity(room_id, user_id)
@@ -223,6 +235,10 @@ def create_socket_handlers(socketio: SocketIO):
                         'version': room.content_version,
                         'success': True
                     })
+                    
+                    # Run the document once this user's edits pause
+                    if room.auto_run:
+                        ExecutionService.schedule_auto_run(room_id, user_id)
                 else:
                     # Version conflict - send current content
                     emit('code_conflict', {
@@ -280,32 +296,68 @@ def create_socket_handlers(socketio: SocketIO):
             
             content = data.get('content', '').strip()
             message_type = data.get('type', 'text')
+            client_msg_id = data.get('client_msg_id')
             
             if not content or len(content) > current_app.config['MAX_MESSAGE_LENGTH']:
                 emit('error', {'message': 'Invalid message content'})
                 return
             
-            # Create message
-            message = Message(
-                room_id=room_id,
-                user_id=user_id,
-                content=content,
-                message_type=message_type
-            )
-            
-            db.session.add(message)
-            db.session.commit()
-            
-            # Update room activity
-            RoomService.update_room_activity(room_id)
+            if client_msg_id is not None and (not isinstance(client_msg_id, str) or not client_msg_id
+                                              or len(client_msg_id) > current_app.config['MAX_CLIENT_MSG_ID_LENGTH']):
+                emit('error', {'message': 'Invalid client_msg_id'})
+                return
             
-            # Broadcast message to all participants
-            emit('new_message', message.to_dict(), room=room_id)
+            # Broadcast right away; the write is group-committed with other messages.
+            # A resend of an accepted message is only acknowledged again
+            message, stored, duplicate = MessageService.post(room_id, user_id, content, message_type,
+                                                             client_msg_id=client_msg_id)
+            if not duplicate:
+                emit('new_message', message, room=room_id)
+            
+            # Tell the sender once the message is durable, or that it was lost
+            app = current_app._get_current_object()
+            sid = request.sid
+            ack = {'id': message['id'], 'client_msg_id': client_msg_id}
+            def acknowledge(future):
+                error = future.exception()
+                if isinstance(error, IntegrityError) and client_msg_id:
+                    # A resend racing its original; the unique constraint kept the original
+                    with app.app_context():
+                        original = MessageService.find_sent(room_id, user_id, client_msg_id)
+                    if original:
+                        socketio.emit('message_saved', dict(ack, id=original['id']), to=sid)
+                        return
+                if error:
+                    socketio.emit('message_failed', ack, to=sid)
+                else:
+                    socketio.emit('message_saved', ack, to=sid)
+            stored.add_done_callback(acknowledge)
             
         except Exception as e:
             current_app.logger.error(f'Send message error: {str(e)}')
             emit('error', {'message': 'Failed to send message'})
     
+    @socketio.on('mark_read')
+    def handle_mark_read(data):
+        """Move the user's read marker in the current room forward"""
+        try:
+            connection_info = active_connections.get(request.sid)
+            if not connection_info:
+                emit('error', {'message': 'Not authenticated'})
+                return
+            
+            room_id = connection_info.get('current_room')
+            if not room_id:
+                emit('error', {'message': 'Not in a room'})
+                return
+            
+            # Coalesced and written in batches; without a message_id the whole room is read
+            get_read_markers().mark(connection_info['user_id'], room_id, (data or {}).get('message_id'))
+            
+        except Exception as e:
+            current_app.logger.error(f'Mark read error: {str(e)}')
+            emit('error', {'message': 'Failed to mark messages read'})
+    
     @socketio.on('execute_code')
     def handle_execute_code(data):
         """Handle code execution requests"""
@@ -334,6 +386,14 @@ def create_socket_handlers(socketio: SocketIO):
                 emit('error', {'message': 'Code too long'})
                 return
             
+            use_local_executor = ExecutionService.uses_local_executor(language)
+            if use_local_executor:
+                try:
+                    ExecutionService.check_admission(user_id)
+                except SchedulerOverloaded as e:
+                    emit('error', {'message': str(e), 'code': 429, 'retry_after': e.retry_after})
+                    return
+            
             # Create execution record
             execution = Execution(
                 room_id=room_id,
@@ -357,6 +417,14 @@ def create_socket_handlers(socketio: SocketIO):
                 'language': language
             }, room=room_id)
             
+            # Run locally when possible; output streams back as execution_output
+            if use_local_executor:
+                execution.status = 'queued'
+                db.session.commit()
+                
+                ExecutionService.run_local_async(execution)
+                return
+            
             # TODO: Implement actual code execution with Judge0 API
             # For now, just simulate execution
             emit('execution_queued', {
@@ -368,6 +436,126 @@ def create_socket_handlers(socketio: SocketIO):
             current_app.logger.error(f'Execute code error: {str(e)}')
             emit('error', {'message': 'Failed to execute code'})
     
+    @socketio.on('start_interactive')
+    def handle_start_interactive(data):
+        """Handle starting an interactive session whose stdin comes over the socket"""
+        try:
+            connection_info = active_connections.get(request.sid)
+            if not connection_info:
+                emit('error', {'message': 'Not authenticated'})
+                return
+            
+            user_id = connection_info['user_id']
+            room_id = connection_info.get('current_room')
+            
+            if not room_id:
+                emit('error', {'message': 'Not in a room'})
+                return
+            
+            source_code = data.get('source_code', '').strip()
+            language = data.get('language', 'javascript')
+            
+            if not source_code:
+                emit('error', {'message': 'No code to execute'})
+                return
+            
+            if len(source_code) > current_app.config['MAX_CODE_LENGTH']:
+                emit('error', {'message': 'Code too long'})
+                return
+            
+            if not ExecutionService.uses_local_executor(language):
+                emit('error', {'message': f'Interactive mode is not available for {language}'})
+                return
+            
+            execution = Execution(
+                room_id=room_id,
+                user_id=user_id,
+                language=language,
+                source_code=source_code,
+                mode='interactive',
+                status='queued'
+            )
+            
+            db.session.add(execution)
+            db.session.commit()
+            
+            error = InteractiveService.start(execution)
+            if error:
+                execution.status = 'failed'
+                execution.error_output = error
+                db.session.commit()
+                emit('error', {'message': error})
+                return
+            
+            # Update room activity
+            RoomService.update_room_activity(room_id)
+            
+            emit('execution_started', {
+                'execution_id': execution.id,
+                'user_id': user_id,
+                'language': language,
+                'mode': 'interactive'
+            }, room=room_id)
+            
+        except Exception as e:
+            current_app.logger.error(f'Start interactive error: {str(e)}')
+            emit('error', {'message': 'Failed to start interactive session'})
+    
+    @socketio.on('interactive_input')
+    def handle_interactive_input(data):
+        """Handle input for a running interactive session"""
+        try:
+            connection_info = active_connections.get(request.sid)
+            if not connection_info:
+                emit('error', {'message': 'Not authenticated'})
+                return
+            
+            text = data.get('data', '')
+            if not isinstance(text, str) or len(text) > current_app.config['INTERACTIVE_MAX_INPUT']:
+                emit('error', {'message': 'Invalid input'})
+                return
+            
+            # Only the session's owner can type into it
+            if not InteractiveService.send_input(
+                data.get('execution_id'),
+                connection_info['user_id'],
+                text,
+                bool(data.get('eof', False))
+            ):
+                emit('error', {'message': 'No running interactive session'})
+            
+        except Exception as e:
+            current_app.logger.error(f'Interactive input error: {str(e)}')
+            emit('error', {'message': 'Failed to send input'})
+    
+    @socketio.on('cancel_execution')
+    def handle_cancel_execution(data):
+        """Handle cancelling a queued or running execution"""
+        try:
+            connection_info = active_connections.get(request.sid)
+            if not connection_info:
+                emit('error', {'message': 'Not authenticated'})
+                return
+            
+            user_id = connection_info['user_id']
+            execution = Execution.query.get(data.get('execution_id'))
+            
+            if not execution:
+                emit('error', {'message': 'Execution not found'})
+                return
+            
+            # Only the author or the room owner may cancel a run
+            if execution.user_id != user_id and execution.room.created_by != user_id:
+                emit('error', {'message': 'Access denied'})
+                return
+            
+            if not ExecutionService.cancel(execution.id):
+                emit('error', {'message': 'Execution already finished'})
+            
+        except Exception as e:
+            current_app.logger.error(f'Cancel execution error: {str(e)}')
+            emit('error', {'message': 'Failed to cancel execution'})
+    
     @socketio.on('get_room_state')
     def handle_get_room_state(data):
         """Get current room state"""
@@ -383,7 +571,7 @@ def create_socket_handlers(socketio: SocketIO):
                 emit('error', {'message': 'No room specified'})
                 return
             
-            room = Room.query.get(room_id)
+            room = Room.query.options(undefer_group('content')).get(room_id)
             if not room or not room.is_active:
                 emit('error', {'message': 'Room not found'})
                 return
@@ -394,17 +582,15 @@ def create_socket_handlers(socketio: SocketIO):
                 is_active=True
             ).join(User).all()
             
-            # Get recent messages
-            recent_messages = Message.query.filter_by(room_id=room_id)\
-                .order_by(Message.created_at.desc())\
-                .limit(50).all()
+            # Recent messages come from the room's in-memory buffer
+            recent_messages, _ = MessageService.get_page(room_id, 50)
             
             emit('room_state', {
                 'room': room.to_dict(),
                 'content': room.current_content,
                 'version': room.content_version,
                 'participants': [p.to_dict() for p in participants],
-                'recent_messages': [m.to_dict() for m in reversed(recent_messages)]
+                'recent_messages': recent_messages
             })
             
         except Exception as e:
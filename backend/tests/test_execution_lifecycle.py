@@ -0,0 +1,93 @@
+"""
+A cancel racing the end of a run, and blob reference counts across an execution's life
+
+    cd backend && python -m pytest -q tests
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+database_dir = tempfile.mkdtemp(prefix='codechill-tests-')
+os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(database_dir, 'executions.db')}"
+
+from app import app
+from models import db, Blob, Execution, User, Room
+from services.execution_service import ExecutionService
+
+FINISHED = {'status': {'id': 3, 'description': 'Accepted'}, 'stdout': 'done\n', 'time': '0.01'}
+
+@pytest.fixture(scope='module')
+def room():
+    """A private room, so the public room listings other tests count stay unchanged"""
+    with app.app_context():
+        user = User(auth0_id='test|executor', email='executor@example.com', name='executor')
+        db.session.add(user)
+        db.session.flush()
+        room = Room(name='Execution fixture', created_by=user.id, language='python', current_content='',
+                    is_private=True)
+        db.session.add(room)
+        db.session.commit()
+        return room.id, user.id
+
+def start_execution(room, source_code='print("done")'):
+    """A running execution, as the run that will complete it loaded it"""
+    room_id, user_id = room
+    execution = Execution(room_id=room_id, user_id=user_id, language='python', source_code=source_code,
+                          status='queued')
+    db.session.add(execution)
+    db.session.commit()
+    return ExecutionService.mark_running(execution.id)
+
+def refs(text):
+    blob = db.session.get(Blob, Blob.digest(text))
+    db.session.refresh(blob)
+    return blob.ref_count
+
+def test_cancel_before_complete_drops_the_result(room):
+    with app.app_context():
+        execution = start_execution(room)
+
+        assert ExecutionService.cancel(execution.id)
+        assert not ExecutionService.complete(execution, FINISHED)
+
+        db.session.expire_all()
+        stored = db.session.get(Execution, execution.id)
+        assert stored.status == 'cancelled'
+        assert stored.output is None
+
+def test_complete_before_cancel_keeps_the_result(room):
+    with app.app_context():
+        execution = start_execution(room)
+
+        assert ExecutionService.complete(execution, FINISHED)
+        assert not ExecutionService.cancel(execution.id)
+
+        db.session.expire_all()
+        stored = db.session.get(Execution, execution.id)
+        assert stored.status == 'completed'
+        assert stored.output == 'done\n'
+
+def test_blob_references_follow_executions(room):
+    source_code = 'print("shared by two runs")'
+    with app.app_context():
+        first = start_execution(room, source_code)
+        second = start_execution(room, source_code)
+        assert refs(source_code) == 2
+
+        second.source_code = 'print("edited")'
+        db.session.commit()
+        assert refs(source_code) == 1
+        assert refs('print("edited")') == 1
+
+        db.session.delete(first)
+        db.session.commit()
+        assert refs(source_code) == 0
+        assert Blob.collect_garbage() >= 1
+        assert db.session.get(Blob, Blob.digest(source_code)) is None
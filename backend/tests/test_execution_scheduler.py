@@ -0,0 +1,111 @@
+"""
+Admission control and shedding of the fair-queuing execution scheduler
+
+    cd backend && python -m pytest -q tests
+"""
+
+import logging
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from services.execution_scheduler import ExecutionScheduler, SchedulerOverloaded, PRIORITY_BATCH
+
+MAX_QUEUE_WAIT = 10
+
+@pytest.fixture
+def release():
+    """Event the blocking jobs wait on; set at teardown so worker threads finish"""
+    event = threading.Event()
+    yield event
+    event.set()
+
+def make_scheduler(workers, room_concurrency, max_queued_per_user=5):
+    return ExecutionScheduler(workers, room_concurrency, max_queued_per_user, MAX_QUEUE_WAIT,
+                              logging.getLogger(__name__))
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'scheduler did not reach the expected state'
+        time.sleep(0.01)
+
+def age(scheduler, seconds):
+    """Pretend every queued job has waited `seconds` already"""
+    with scheduler._condition:
+        for job in scheduler._jobs.values():
+            job.enqueued_at -= seconds
+
+def test_jobs_blocked_by_their_room_do_not_refuse_other_rooms(release):
+    scheduler = make_scheduler(workers=4, room_concurrency=2)
+    for index in range(4):
+        scheduler.submit(f'busy-{index}', 'busy-room', 'heavy-user', release.wait)
+    wait_until(lambda: scheduler.stats()['running'] == 2)
+
+    # Two runs wait on busy-room's cap far past the SLO while two workers idle
+    age(scheduler, MAX_QUEUE_WAIT * 10)
+
+    scheduler.check_admission('other-user')
+    assert scheduler.stats()['estimated_wait'] < MAX_QUEUE_WAIT
+
+def test_backlog_waiting_for_workers_is_shed(release):
+    scheduler = make_scheduler(workers=1, room_concurrency=1)
+    scheduler.submit('running', 'first-room', 'first-user', release.wait)
+    wait_until(lambda: scheduler.stats()['running'] == 1)
+    scheduler.submit('queued', 'second-room', 'second-user', release.wait)
+
+    scheduler.check_admission('third-user')
+
+    age(scheduler, MAX_QUEUE_WAIT * 2)
+    with pytest.raises(SchedulerOverloaded) as refused:
+        scheduler.check_admission('third-user')
+    assert refused.value.retry_after >= 1
+
+def test_batch_backlog_does_not_refuse_interactive_runs(release):
+    scheduler = make_scheduler(workers=1, room_concurrency=1)
+    scheduler.submit('running', 'first-room', 'first-user', release.wait)
+    wait_until(lambda: scheduler.stats()['running'] == 1)
+    scheduler.submit('judging', 'second-room', 'second-user', release.wait, PRIORITY_BATCH)
+    age(scheduler, MAX_QUEUE_WAIT * 2)
+
+    scheduler.check_admission('third-user')
+    with pytest.raises(SchedulerOverloaded):
+        scheduler.check_admission('third-user', PRIORITY_BATCH)
+
+def test_queued_runs_per_user_are_capped(release):
+    scheduler = make_scheduler(workers=1, room_concurrency=1, max_queued_per_user=2)
+    scheduler.submit('running', 'room', 'user', release.wait)
+    wait_until(lambda: scheduler.stats()['running'] == 1)
+    scheduler.submit('first', 'room', 'user', release.wait)
+    scheduler.check_admission('user')
+    scheduler.submit('second', 'room', 'user', release.wait)
+
+    with pytest.raises(SchedulerOverloaded):
+        scheduler.check_admission('user')
+
+    assert scheduler.cancel('second')
+    scheduler.check_admission('user')
+
+def test_multi_slot_job_waits_for_its_slots_without_being_starved(release):
+    scheduler = make_scheduler(workers=3, room_concurrency=3)
+    first_done = threading.Event()
+    scheduler.submit('single', 'first-room', 'first-user', first_done.wait, PRIORITY_BATCH)
+    wait_until(lambda: scheduler.stats()['running'] == 1)
+
+    # A judge run's three case threads need every worker; later single runs queue behind it
+    scheduler.submit('judging', 'second-room', 'second-user', release.wait, PRIORITY_BATCH, slots=3)
+    scheduler.submit('later', 'third-room', 'third-user', release.wait, PRIORITY_BATCH)
+    time.sleep(0.1)
+    assert scheduler.stats()['running'] == 1
+    assert scheduler.stats()['busy_slots'] == 1
+
+    first_done.set()
+    wait_until(lambda: scheduler.stats()['busy_slots'] == 3)
+    assert scheduler.stats()['running'] == 1
+    assert scheduler.stats()['queued'] == 1
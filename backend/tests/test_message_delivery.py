@@ -0,0 +1,76 @@
+"""
+Resent chat messages are stored and broadcast once, whether or not the client_msg_id index still remembers them
+
+    cd backend && python -m pytest -q tests
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+database_dir = tempfile.mkdtemp(prefix='codechill-tests-')
+os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(database_dir, 'messages.db')}"
+
+from flask_jwt_extended import create_access_token
+from app import app
+from models import db, Message, User, Room, RoomParticipant
+from services.client_message_ids import get_client_message_index
+
+@pytest.fixture(scope='module')
+def chat():
+    """A private room with one member, so the public room listings other tests count stay unchanged"""
+    app.config['RATELIMIT_ENABLED'] = False
+    with app.app_context():
+        user = User(auth0_id='test|chatter', email='chatter@example.com', name='chatter')
+        db.session.add(user)
+        db.session.flush()
+        room = Room(name='Chat fixture', created_by=user.id, language='python', current_content='',
+                    is_private=True, current_participants=1)
+        db.session.add(room)
+        db.session.flush()
+        db.session.add(RoomParticipant(room_id=room.id, user_id=user.id, role='owner'))
+        db.session.commit()
+        headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+        return app.test_client(), room.id, headers
+
+def send(chat, content, client_msg_id):
+    client, room_id, headers = chat
+    return client.post(f'/api/chat/room/{room_id}/messages',
+                       json={'content': content, 'client_msg_id': client_msg_id}, headers=headers)
+
+def stored_copies(client_msg_id):
+    with app.app_context():
+        return Message.query.filter_by(client_msg_id=client_msg_id).count()
+
+def test_resend_returns_the_original(chat):
+    first = send(chat, 'hello', 'resend-1')
+    assert first.status_code == 201
+
+    again = send(chat, 'hello', 'resend-1')
+    assert again.status_code == 200
+    assert again.get_json()['data']['id'] == first.get_json()['data']['id']
+    assert stored_copies('resend-1') == 1
+
+def test_resend_after_the_index_forgot_it_returns_the_original(chat):
+    first = send(chat, 'hello again', 'resend-2')
+    assert first.status_code == 201
+
+    index = get_client_message_index()
+    with index._lock:
+        index._sent.clear()
+
+    again = send(chat, 'hello again', 'resend-2')
+    assert again.status_code == 200
+    assert again.get_json()['data']['id'] == first.get_json()['data']['id']
+    assert stored_copies('resend-2') == 1
+
+def test_distinct_ids_are_distinct_messages(chat):
+    assert send(chat, 'same text', 'distinct-1').status_code == 201
+    assert send(chat, 'same text', 'distinct-2').status_code == 201
+    assert stored_copies('distinct-1') == stored_copies('distinct-2') == 1
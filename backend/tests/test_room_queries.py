@@ -0,0 +1,97 @@
+"""
+Room listings must issue the same number of SQL statements however many rooms they return
+
+    cd backend && python -m pytest -q tests
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+from sqlalchemy import event
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+database_dir = tempfile.mkdtemp(prefix='codechill-tests-')
+os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(database_dir, 'rooms.db')}"
+
+from flask_jwt_extended import create_access_token
+from app import app
+from models import db, User, Room, RoomParticipant
+from services.trending import get_trending_tracker
+
+ENDPOINTS = [
+    '/api/rooms/?per_page=50',
+    '/api/rooms/my-rooms',
+    '/api/users/rooms',
+    '/api/rooms/search?q=room&limit=50',
+    '/api/rooms/trending?limit=50',
+]
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+def create_rooms(owner_id, member_ids, count, start):
+    """Rooms owned by `owner_id`, each joined by every member"""
+    for number in range(start, start + count):
+        room = Room(name=f'Room {number}', description='Query count fixture', created_by=owner_id,
+                    language='python', current_content='')
+        db.session.add(room)
+        db.session.flush()
+        db.session.add(RoomParticipant(room_id=room.id, user_id=owner_id, role='owner'))
+        for member_id in member_ids:
+            db.session.add(RoomParticipant(room_id=room.id, user_id=member_id))
+        room.current_participants = 1 + len(member_ids)
+    db.session.commit()
+
+@pytest.fixture(scope='module')
+def statement_counts():
+    """Statements per endpoint, measured at 5 rooms and again at 40"""
+    app.config['RATELIMIT_ENABLED'] = False
+    client = app.test_client()
+
+    with app.app_context():
+        users = [User(auth0_id=f'test|{name}', email=f'{name}@example.com', name=name)
+                 for name in ('owner', 'first', 'second')]
+        db.session.add_all(users)
+        db.session.commit()
+        owner_id, member_ids = users[0].id, [user.id for user in users[1:]]
+        headers = {'Authorization': f'Bearer {create_access_token(identity=owner_id)}'}
+        get_trending_tracker().refresh_interval = 0  # rebuild the trending list on every request
+
+        counter = StatementCounter()
+        event.listen(db.engine, 'before_cursor_execute', counter)
+
+        def measure(room_count):
+            counts = {}
+            for endpoint in ENDPOINTS:
+                # The first call builds the process-wide search index
+                client.get(endpoint, headers=headers)
+                counter.count = 0
+                response = client.get(endpoint, headers=headers)
+                assert response.status_code == 200, response.get_json()
+                assert len(response.get_json()['rooms']) == room_count, endpoint
+                counts[endpoint] = counter.count
+            return counts
+
+        try:
+            create_rooms(owner_id, member_ids, 5, 0)
+            few = measure(5)
+            create_rooms(owner_id, member_ids, 35, 5)
+            many = measure(40)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', counter)
+
+    return few, many
+
+@pytest.mark.parametrize('endpoint', ENDPOINTS)
+def test_statement_count_does_not_grow_with_rooms(statement_counts, endpoint):
+    few, many = statement_counts
+    assert few[endpoint] == many[endpoint]